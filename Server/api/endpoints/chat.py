@@ -2,11 +2,20 @@ from fastapi import APIRouter, HTTPException, Depends
 from typing import Dict, Any
 import logging
 
-from Server.core.models.schemas import ChatMessage, ChatResponse
-from Server.core.agents.raton_perez import process_chat_message, get_family_status as get_family_status_service
+from Server.core.models.schemas import ChatMessage, ChatResponse, BatchChatRequest, BatchChatResponse
+from Server.core.agents.raton_perez import (
+    process_chat_message,
+    process_chat_batch,
+    get_family_status as get_family_status_service
+)
 from Server.core.models.database import Database
 from Server.api.dependencies import get_db
-from Server.core.security.dependencies import get_current_user, AuthenticatedUser, require_family_ownership
+from Server.core.security.dependencies import (
+    get_current_user,
+    AuthenticatedUser,
+    require_family_ownership,
+    require_families_ownership
+)
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 logger = logging.getLogger(__name__)
@@ -42,6 +51,38 @@ async def chat_endpoint(
         logger.error(f"Error en endpoint chat: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/batch", response_model=BatchChatResponse)
+async def chat_batch_endpoint(
+    batch_data: BatchChatRequest,
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    db: Database = Depends(get_db)
+):
+    """
+    Envía mensajes de varias familias en una sola petición (guía con grupo).
+    Las familias deben pertenecer al usuario autenticado.
+    """
+    try:
+        family_ids = list(dict.fromkeys(m.family_id for m in batch_data.messages))
+
+        # Verificar propiedad de todas las familias con una sola consulta
+        require_families_ownership(family_ids, current_user, db)
+
+        results = await process_chat_batch([m.model_dump() for m in batch_data.messages], db=db)
+
+        logger.info(f"✅ Chat batch procesado: {len(results)} mensajes de {len(family_ids)} familias "
+                    f"de usuario {current_user.id}")
+        return {
+            "results": results,
+            "total_families": len(family_ids),
+            "successful": sum(1 for r in results if r.get("success"))
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error en endpoint chat batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/family/{family_id}/status")
 async def get_family_status(
     family_id: int, 
@@ -3,7 +3,9 @@ import time
 from typing import Any, Dict
 
 import requests
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+from Server.core.security.dependencies import AuthenticatedUser, require_admin
 
 
 router = APIRouter(prefix="/debug", tags=["debug"])
@@ -39,6 +41,57 @@ def debug_pinecone():
         return {"available": False, "error": str(e)}
 
 
+@router.get("/reduced-index")
+def debug_reduced_index():
+    from Server.core.services.reduced_index import reduced_index
+
+    return reduced_index.get_stats()
+
+
+@router.post("/reduced-index")
+def set_reduced_index(dimension: int = Query(..., ge=0, description="0 = Pinecone a dimensión completa"),
+                      method: str = Query(None, description="'pca' o 'truncate'"),
+                      admin: AuthenticatedUser = Depends(require_admin)):
+    """
+    Cambia en caliente la dimensión de búsqueda (y el método, que obliga a reconstruir)
+    Solo administradores: altera la recuperación de todas las familias y puede recodificar
+    los pasajes. Una dimensión mayor que el rango del corpus (comprobado tras reconstruir
+    si hace falta) se rechaza con 400 y el índice queda como estaba
+    """
+    from Server.core.agents.madrid_knowledge import build_reduced_index
+    from Server.core.services.reduced_index import REDUCTION_METHODS, reduced_index
+
+    def reject(detail: str):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+    if method and method not in REDUCTION_METHODS:
+        reject(f"Método de reducción desconocido: {method} (usar {', '.join(REDUCTION_METHODS)})")
+    previous_method, previous_dimension = reduced_index.method, reduced_index.requested_dimension
+    new_method = method or previous_method
+    rebuild = new_method != previous_method or reduced_index.max_dimension == 0
+    # Cota conocida antes de reconstruir: la actual, o pasajes - 1 si se pasa a PCA
+    passages = reduced_index.get_stats()["passages"]
+    limit = reduced_index.max_dimension if not rebuild else (passages - 1 if new_method == "pca" and passages else 0)
+    if dimension and limit and dimension > limit:
+        reject(f"El corpus solo admite hasta {limit} dimensiones con {new_method}")
+
+    try:
+        reduced_index.set_dimension(dimension, new_method)
+        if rebuild and dimension:
+            build_reduced_index()
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail=f"Error reconstruyendo el índice reducido: {e}")
+    if dimension and reduced_index.capped:
+        # El rango real solo se conoce tras reconstruir: se deshace el cambio
+        limit = reduced_index.max_dimension
+        reduced_index.set_dimension(previous_dimension, previous_method)
+        if new_method != previous_method and previous_dimension:
+            build_reduced_index()
+        reject(f"El corpus solo admite hasta {limit} dimensiones con {new_method}")
+    return reduced_index.get_stats()
+
+
 @router.get("/wiki")
 def debug_wikipedia(title: str = Query(..., description="Page title, e.g., 'Plaza Mayor'")):
     try:
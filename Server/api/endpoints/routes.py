@@ -3,8 +3,8 @@ import logging
 
 from Server.core.models.database import Database
 from Server.api.dependencies import get_db
-from Server.core.agents.raton_perez import get_next_destination
-from Server.core.agents.location_helper import RATON_PEREZ_ROUTE
+from Server.core.agents.raton_perez import get_next_destination, schedule_arrival_prefetch
+from Server.core.agents.location_helper import RATON_PEREZ_ROUTE, arrival_announcement
 from Server.core.security.dependencies import get_current_user, AuthenticatedUser, require_family_ownership
 
 router = APIRouter(prefix="/routes", tags=["routes"])
@@ -89,6 +89,7 @@ async def advance_to_next_poi(
             
             # Guardar contexto actualizado
             await save_family_context(context, db)
+            schedule_arrival_prefetch(context, db)
             
             return {
                 "success": True,
@@ -140,6 +141,9 @@ async def advance_to_next_poi(
         # Guardar contexto actualizado
         await save_family_context(context, db)
         
+        # Precalcular en background lo que el front pedirá justo después (llegada y /next)
+        schedule_arrival_prefetch(context, db)
+        
         logger.info(f"✅ Familia {family_id} avanzada a POI {next_index}: {next_poi['name']}")
         
         return {
@@ -155,7 +159,7 @@ async def advance_to_next_poi(
             "progress": f"{next_index + 1}/{len(RATON_PEREZ_ROUTE)}",
             "points_earned": arrival_points,
             "total_points": context.total_points,
-            "arrival_message": f"¡Acabamos de llegar a {next_poi['name']}! 🐭✨"
+            "arrival_message": arrival_announcement(next_poi)
         }
         
     except HTTPException:
@@ -34,6 +34,72 @@ class LangChainSettings(BaseSettings):
     temperature: float = 0.7
     max_tokens: int = 1500
 
+    # Backend LLM: "groq" (producción) o "local" (sustituto determinista para pruebas de carga).
+    # groq_base_url permite apuntar ChatGroq al servidor HTTP del sustituto (scripts/llm_standin_server.py)
+    llm_backend: str = "groq"
+    groq_base_url: Optional[str] = None
+    llm_standin_latency_p50: float = 0.4  # segundos hasta el primer token (mediana)
+    llm_standin_latency_sigma: float = 0.5  # dispersión log-normal de la latencia
+    llm_standin_tokens_per_second: float = 500.0
+    llm_standin_error_rate: float = 0.0
+    llm_standin_rate_limit_rate: float = 0.0  # fracción de llamadas que devuelven 429
+    llm_standin_requests_per_minute: int = 0  # límite RPM simulado (0 = sin límite)
+    llm_standin_seed: Optional[int] = None
+
+    # Resiliencia de las llamadas al LLM: reintentos con backoff (respetando Retry-After),
+    # hedging opcional tras el p95 observado y deadline global por llamada
+    llm_max_attempts: int = 3
+    llm_backoff_base: float = 0.5  # segundos
+    llm_backoff_max: float = 8.0
+    llm_deadline: float = 25.0  # segundos, reintentos incluidos
+    llm_hedge_enabled: bool = False  # duplica cuota en la cola lenta: activar con margen de RPM
+    llm_hedge_delay: Optional[float] = None  # None = p95 de las latencias recientes
+    llm_hedge_min_delay: float = 1.0
+    # Scheduler de llamadas: máximo en vuelo, presupuesto de tokens por minuto (0 = el que
+    # anuncie Groq en x-ratelimit-limit-tokens) y espera máxima en cola antes de descartar
+    llm_max_in_flight: int = 16
+    llm_tokens_per_minute: int = 0
+    llm_max_queue_wait: float = 10.0
+    # Enrutado de modelos: modelo por tipo de situación (lo no listado va a agent_model) y
+    # pool de claves para failover. Los prompts de más de llm_large_prompt_tokens van al principal
+    llm_model_routes: dict = {
+        "general_conversation": "openai/gpt-oss-20b",
+    }
+    llm_large_prompt_tokens: int = 1500
+    groq_api_keys: Optional[str] = None  # claves extra separadas por comas
+    llm_failure_threshold: int = 3  # errores seguidos antes de apartar una entrada del pool
+    llm_failover_cooldown: float = 30.0  # segundos apartada
+    llm_model_prices: dict = {}  # {modelo: (USD/M tokens entrada, USD/M tokens salida)}, ver llm_router
+    usage_flush_interval: float = 10.0  # segundos entre volcados a la tabla llm_usage
+    usage_flush_batch_size: int = 200
+
+    # Presupuesto de tokens del prompt (entrada) y límites de salida por situación.
+    # gpt-oss cuenta el razonamiento dentro de max_tokens: no bajar demasiado estos límites.
+    prompt_input_token_budget: int = 1800
+    tokenizer_encoding: Optional[str] = None  # por defecto o200k_base
+    tokenizer_cache_dir: str = ""  # directorio con el BPE de tiktoken ya descargado (workers sin red)
+    situation_max_tokens: dict = {
+        "poi_arrival": 400,
+        "location_question": 500,
+        "poi_question": 400,
+        "general_conversation": 300
+    }
+
+    # Clasificador de intención por embeddings (location_question vs conversación general).
+    # Desactivado: se usan keywords hasta medir los umbrales con scripts/evaluate_intent_classifier.py
+    intent_classifier_enabled: bool = False
+    intent_classifier_min_similarity: float = 0.75
+    intent_classifier_margin: float = 0.02
+
+    # Tope del mensaje del usuario dentro del prompt, por situación (un mensaje larguísimo
+    # no debe comerse el presupuesto de entrada ni la ventana de contexto)
+    user_message_max_tokens: dict = {
+        "poi_arrival": 100,
+        "location_question": 200,
+        "poi_question": 200,
+        "general_conversation": 200
+    }
+
     # Personalidad del Ratoncito Pérez
     agent_name: str = "Ratoncito Pérez"
     agent_language: str = "es"
@@ -48,23 +114,57 @@ class LangChainSettings(BaseSettings):
     
     # Configuración de embeddings
     embedding_cache_size: int = 1000
-    embedding_model_warm_up: bool = True
+    embedding_dtype: str = "float32"  # "float16" divide a la mitad la memoria del caché
+    embedding_store_path: str = ""  # directorio del caché persistente (mmap + SQLite); vacío = desactivado
+    embedding_backend: str = "sentence_transformers"  # "onnx" = ONNX Runtime en CPU
+    embedding_onnx_path: str = ""  # directorio de scripts/export_embedding_onnx.py (por defecto models/<modelo>-onnx)
+    embedding_onnx_quantized: bool = True  # usar model.int8.onnx (cuantización dinámica int8)
+    embedding_onnx_threads: int = 0  # hilos intra-op de ONNX Runtime; 0 = los que elija ORT
+    embedding_reduced_dimension: int = 0  # >0 = búsqueda local a esa dimensión en vez de Pinecone (1024)
+    embedding_reduction_method: str = "pca"  # "pca" (ajustada a los pasajes) o "truncate"
+    embedding_sidecar_socket: str = ""  # socket Unix de scripts/embedding_sidecar.py; vacío = modelo en proceso
+    embedding_sidecar_timeout: float = 30.0
+    embedding_sidecar_fallback_local: bool = False  # cargar el modelo en el worker si el sidecar no responde
+    embedding_bulk_workers: int = 0  # procesos para la ingesta masiva; 0 = núcleos disponibles
+    embedding_bulk_batch_size: int = 32
+    embedding_model_warm_up: bool = True  # cargar el modelo en background al arrancar la API
+    embedding_model_retry_s: float = 60.0  # reintento de la carga tras un fallo
     embedding_batch_size: int = 32
+    embedding_microbatch_enabled: bool = True  # agrupar consultas concurrentes en una sola pasada
+    embedding_microbatch_max_size: int = 32
+    embedding_microbatch_wait_ms: float = 5.0
     
     # Configuración de Pinecone optimizado
     pinecone_cache_enabled: bool = True
     pinecone_cache_ttl: int = 3600  # 1 hora
     pinecone_batch_upsert_size: int = 100
     
+    # Caché semántico de respuestas del LLM
+    response_cache_enabled: bool = True
+    response_cache_threshold: float = 0.92  # similitud coseno mínima entre consultas
+    response_cache_ttl: int = 86400  # 24 horas
+    response_cache_max_entries: int = 500
+    
     # Configuración de inicialización background
     background_init_enabled: bool = True
     background_init_timeout: int = 300  # 5 minutos
     knowledge_base_preload: bool = True
+    poi_content_refresh_interval: int = 3600  # segundos
+    poi_content_negative_ttl: float = 60.0  # segundos que se recuerda un POI ausente en Pinecone
+    poi_content_snapshot_path: Optional[str] = None  # por defecto Server/data/poi_content_snapshot.json
     
     # Configuración de rendimiento
     max_concurrent_embeddings: int = 5
     vector_search_timeout: int = 10  # segundos
+    batch_chat_max_concurrency: int = 4  # llamadas LLM simultáneas en /chat/batch
+    retrieval_deadline: float = 3.0  # segundos, deadline compartido de recuperación por mensaje
+    prefetch_enabled: bool = True  # precalcular llegada y /next tras avanzar de POI
+    prefetch_ttl: int = 300  # segundos que vive lo precalculado
+    prefetch_wait_timeout: float = 3.0  # espera máxima a un prefetch en curso antes de generar en vivo
+    arrival_narratives_enabled: bool = True  # narraciones de llegada pregeneradas (scripts/generate_arrival_narratives.py)
+    arrival_narratives_path: Optional[str] = None  # por defecto Server/data/arrival_narratives.json
     fallback_mode_enabled: bool = True
+    admin_emails: Optional[str] = None  # emails con acceso a /api/stats/usage y depuración, separados por comas
     
     # Configuración de logging para servicios optimizados
     embedding_service_log_level: str = "INFO"
@@ -159,4 +259,8 @@ try:
         
 except Exception as e:
     print(f"❌ Error cargando configuración: {e}")
-    langchain_settings = None
\ No newline at end of file
+    # Sin .env válido (tests, scripts) las credenciales quedan vacías, así que Groq y Pinecone no
+    # validan y se desactivan; el resto de ajustes conserva los valores por defecto de esta clase
+    langchain_settings = LangChainSettings.model_construct(**{
+        name: field.annotation() for name, field in LangChainSettings.model_fields.items() if field.is_required()
+    })
\ No newline at end of file
@@ -52,6 +52,18 @@ class FamilyContext:
         self.conversation_history = conv_data.get("memory", [])
         self.current_speaker = conv_data.get("current_speaker")
 
+    @property
+    def context_version(self) -> tuple:
+        """Versión de los datos que aparecen en el prompt; cambia cuando cambian puntos, visitas o miembros"""
+        return (
+            self.family_name,
+            tuple(self.child_names),
+            tuple(self.child_ages),
+            tuple(self.adult_names),
+            self.total_points,
+            len(self.visited_pois),
+        )
+
     def _process_members(self, members_data: List[Dict]) -> List[FamilyMember]:
         return [
             FamilyMember(
@@ -74,6 +86,16 @@ class FamilyContext:
     def get_oldest_child_age(self) -> Optional[int]:
         return max(self.child_ages) if self.child_ages else None
 
+    def get_age_band(self, age_groups: Dict[str, tuple]) -> str:
+        """Franja de edad del niño más pequeño según child_age_groups ("adultos" si no hay niños)"""
+        youngest = self.get_youngest_age()
+        if youngest is None:
+            return "adultos"
+        for band, (_, max_age) in sorted(age_groups.items(), key=lambda item: item[1][1]):
+            if youngest <= max_age:
+                return band
+        return "adultos"
+
     def get_personalized_greeting(self) -> str:
         if not self.all_names:
             return f"familia {self.family_name}" if self.family_name else "familia"
@@ -244,6 +266,67 @@ async def save_family_context(context: FamilyContext, db):
     context_data = context.to_dict()
     await _save_to_database(context.family_id, context_data, db)
 
+async def load_family_contexts(family_ids: List[int], db) -> Dict[int, FamilyContext]:
+    """
+    Carga varios contextos familiares con una consulta por tabla (en lugar de tres por familia).
+    Las familias inexistentes no aparecen en el resultado.
+    """
+    contexts = {fid: _context_cache[fid] for fid in family_ids if fid in _context_cache}
+    missing = [fid for fid in family_ids if fid not in contexts]
+    if missing:
+        for family_id, family_data in (await _load_many_from_database(missing, db)).items():
+            context = FamilyContext(family_data)
+            _context_cache[family_id] = context
+            contexts[family_id] = context
+    return contexts
+
+
+def _build_family_data(family_row: Dict[str, Any], members_rows: List[Dict[str, Any]],
+                       progress_row: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    family_data = {
+        "id": family_row["id"],
+        "name": family_row["name"],
+        "preferred_language": family_row["preferred_language"] or "es",
+    }
+
+    # miembros
+    family_data["members"] = [
+        {"name": m["name"], "age": m["age"], "member_type": m["member_type"]} for m in members_rows
+    ]
+
+    # progreso
+    if progress_row:
+        current_location = progress_row["current_location"]
+        if isinstance(current_location, str):
+            try:
+                current_location = json.loads(current_location)
+            except (json.JSONDecodeError, TypeError):
+                current_location = {}
+        elif current_location is None:
+            current_location = {}
+        family_data["route_progress"] = {
+            "current_poi_index": progress_row["current_poi_index"],
+            "points_earned": progress_row["points_earned"],
+            "current_location": current_location,
+        }
+    else:
+        family_data["route_progress"] = {"current_poi_index": 0, "points_earned": 0, "current_location": {}}
+
+    # conversación y visited_pois
+    conv_context = family_row.get("conversation_context")
+    if conv_context:
+        if isinstance(conv_context, str):
+            try:
+                conv_context = json.loads(conv_context)
+            except (json.JSONDecodeError, TypeError):
+                conv_context = {"memory": [], "current_speaker": None}
+    else:
+        conv_context = {"memory": [], "current_speaker": None}
+    family_data["conversation_context"] = conv_context
+    family_data["visited_pois"] = conv_context.get("visited_pois", [])
+
+    return family_data
+
 async def _load_from_database(family_id: int, db) -> Optional[Dict[str, Any]]:
     try:
         family_query = """
@@ -255,58 +338,54 @@ async def _load_from_database(family_id: int, db) -> Optional[Dict[str, Any]]:
         if not family_result:
             return None
 
-        family_data = {
-            "id": family_result[0]["id"],
-            "name": family_result[0]["name"],
-            "preferred_language": family_result[0]["preferred_language"] or "es",
-        }
-
-        # miembros
         members_query = "SELECT name, age, member_type FROM family_members WHERE family_id = %s"
         members_result = db.execute_query(members_query, (family_id,))
-        family_data["members"] = [
-            {"name": m["name"], "age": m["age"], "member_type": m["member_type"]} for m in members_result
-        ] if members_result else []
 
-        # progreso
         progress_query = "SELECT current_poi_index, points_earned, current_location FROM family_route_progress WHERE family_id = %s"
         progress_result = db.execute_query(progress_query, (family_id,))
-        if progress_result:
-            current_location = progress_result[0]["current_location"]
-            if isinstance(current_location, str):
-                try:
-                    current_location = json.loads(current_location)
-                except (json.JSONDecodeError, TypeError):
-                    current_location = {}
-            elif current_location is None:
-                current_location = {}
-            family_data["route_progress"] = {
-                "current_poi_index": progress_result[0]["current_poi_index"],
-                "points_earned": progress_result[0]["points_earned"],
-                "current_location": current_location,
-            }
-        else:
-            family_data["route_progress"] = {"current_poi_index": 0, "points_earned": 0, "current_location": {}}
-
-        # conversación y visited_pois
-        conv_context = family_result[0].get("conversation_context")
-        if conv_context:
-            if isinstance(conv_context, str):
-                try:
-                    conv_context = json.loads(conv_context)
-                except (json.JSONDecodeError, TypeError):
-                    conv_context = {"memory": [], "current_speaker": None}
-        else:
-            conv_context = {"memory": [], "current_speaker": None}
-        family_data["conversation_context"] = conv_context
-        family_data["visited_pois"] = conv_context.get("visited_pois", [])
 
-        return family_data
+        return _build_family_data(
+            family_result[0],
+            members_result or [],
+            progress_result[0] if progress_result else None,
+        )
     except Exception as e:
         logger.error(f"Error cargando familia {family_id}: {e}")
         return None
 
 
+async def _load_many_from_database(family_ids: List[int], db) -> Dict[int, Dict[str, Any]]:
+    try:
+        family_query = """
+            SELECT id, name, preferred_language, conversation_context 
+            FROM families 
+            WHERE id = ANY(%s)
+        """
+        family_result = db.execute_query(family_query, (family_ids,)) or []
+
+        members_query = "SELECT family_id, name, age, member_type FROM family_members WHERE family_id = ANY(%s)"
+        members_by_family: Dict[int, List[Dict[str, Any]]] = {}
+        for m in db.execute_query(members_query, (family_ids,)) or []:
+            members_by_family.setdefault(m["family_id"], []).append(m)
+
+        progress_query = """
+            SELECT family_id, current_poi_index, points_earned, current_location 
+            FROM family_route_progress 
+            WHERE family_id = ANY(%s)
+        """
+        progress_by_family = {p["family_id"]: p for p in db.execute_query(progress_query, (family_ids,)) or []}
+
+        return {
+            row["id"]: _build_family_data(
+                row, members_by_family.get(row["id"], []), progress_by_family.get(row["id"])
+            )
+            for row in family_result
+        }
+    except Exception as e:
+        logger.error(f"Error cargando familias {family_ids}: {e}")
+        return {}
+
+
 async def _save_to_database(family_id: int, context_data: Dict[str, Any], db):
     try:
         progress_data = context_data["route_progress"]
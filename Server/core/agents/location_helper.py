@@ -128,3 +128,22 @@ def get_poi_by_index(index: int) -> Optional[Dict[str, Any]]:
 def get_total_pois() -> int:
     """Devuelve el número total de POIs"""
     return len(RATON_PEREZ_ROUTE)
+
+
+def arrival_announcement(poi: Dict[str, Any]) -> str:
+    """Mensaje de llegada que devuelve /advance y que el front reenvía al chat"""
+    return f"¡Acabamos de llegar a {poi['name']}! 🐭✨"
+
+
+def is_arrival_announcement(message: str, poi: Dict[str, Any]) -> bool:
+    """
+    Detecta el mensaje de llegada al POI: el de /advance, o uno equivalente del usuario
+    solo si no pregunta nada ("Hemos llegado, ¿quién construyó esto?" es una pregunta y
+    no debe contestarse con la narración de llegada)
+    """
+    if message.strip() == arrival_announcement(poi):
+        return True
+    if "?" in message or "¿" in message:
+        return False
+    message_lower = message.lower()
+    return any(phrase in message_lower for phrase in ("acabamos de llegar", "hemos llegado", "ya estamos en"))
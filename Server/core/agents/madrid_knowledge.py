@@ -9,6 +9,7 @@ import logging
 import requests
 import os
 import random  # <-- añadido para elegir User-Agent aleatorio
+from concurrent.futures import ThreadPoolExecutor
 
 # Configuración
 USE_PINECONE = True
@@ -33,6 +34,9 @@ except ImportError as e:
     embedding_service = None
     USE_PINECONE = False
 
+from Server.core.services.poi_content_store import poi_content_store
+from Server.core.services.reduced_index import reduced_index
+
 
 # POIs de la ruta (solo IDs y nombres)
 RATON_PEREZ_POIS = [
@@ -89,10 +93,14 @@ def fetch_wikipedia_content(poi_name: str) -> Dict[str, str]:
 
 
 # Funciones principales
-def initialize_madrid_knowledge():
+def initialize_madrid_knowledge(workers: Optional[int] = 1, batch_size: Optional[int] = None, progress=None):
     """
     Inicializa la base de conocimiento obteniendo datos de Wikipedia y subiéndolos a Pinecone
     OPTIMIZADO: Verifica qué POIs ya tienen embeddings para evitar reprocesamiento
+    
+    Los pasajes se codifican juntos (generate_embeddings_bulk: lotes ordenados por longitud);
+    workers > 1 (o None = núcleos disponibles) reparte los lotes en un pool de procesos.
+    En el arranque de la API se queda en 1 para no cargar el modelo en cada proceso hijo
     """
     if not USE_PINECONE or not pinecone_service or not pinecone_service.is_available():
         logger.warning("⚠️ Pinecone no disponible, usando modo offline")
@@ -106,40 +114,49 @@ def initialize_madrid_knowledge():
     
     existing_vectors = _get_existing_vectors()
     success_count = 0
+    pending = []
     
     for poi in ALL_POIS:
-        poi_id = poi["id"]
-        poi_name = poi["name"]
-        vector_id = f"{poi_id}_basic_info"
-        
-        if vector_id in existing_vectors:
-            logger.info(f"⏭️ {poi_name} ya existe en Pinecone, saltando...")
+        if f"{poi['id']}_basic_info" in existing_vectors:
+            logger.info(f"⏭️ {poi['name']} ya existe en Pinecone, saltando...")
             success_count += 1
-            continue
-        
-        logger.info(f"📍 Procesando {poi_name}...")
-        wiki_content = fetch_wikipedia_content(poi_name)
-        
+        else:
+            pending.append(poi)
+    
+    # Wikipedia es E/S: las peticiones van en paralelo con hilos
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        contents = list(pool.map(lambda poi: fetch_wikipedia_content(poi["name"]), pending))
+    
+    passages = []
+    for poi, wiki_content in zip(pending, contents):
         if wiki_content.get("basic_info"):
-            embedding = embedding_service.generate_single_embedding(wiki_content["basic_info"], "passage")
+            passages.append((poi, wiki_content["basic_info"]))
+        else:
+            logger.warning(f"⚠️ No se obtuvo contenido para {poi['name']}")
+    
+    if passages:
+        logger.info(f"📍 Codificando {len(passages)} pasajes...")
+        embeddings = embedding_service.generate_embeddings_bulk(
+            [text for _, text in passages], "passage", workers=workers, batch_size=batch_size, progress=progress)
+        
+        for (poi, text), embedding in zip(passages, embeddings):
+            if not len(embedding):
+                logger.error(f"❌ No se pudo generar embedding para {poi['name']}")
+                continue
             
-            if embedding:
-                success = pinecone_service.upsert_madrid_content(
-                    poi_id=poi_id,
-                    content_type="basic_info",
-                    text=wiki_content["basic_info"],
-                    embedding=embedding
-                )
-                
-                if success:
-                    success_count += 1
-                    logger.info(f"✅ {poi_name} subido a Pinecone")
-                else:
-                    logger.error(f"❌ Error subiendo {poi_name} a Pinecone")
+            success = pinecone_service.upsert_madrid_content(
+                poi_id=poi["id"],
+                content_type="basic_info",
+                text=text,
+                embedding=embedding
+            )
+            
+            if success:
+                success_count += 1
+                poi_content_store.put(poi["id"], "basic_info", text[:1000])
+                logger.info(f"✅ {poi['name']} subido a Pinecone")
             else:
-                logger.error(f"❌ No se pudo generar embedding para {poi_name}")
-        else:
-            logger.warning(f"⚠️ No se obtuvo contenido para {poi_name}")
+                logger.error(f"❌ Error subiendo {poi['name']} a Pinecone")
     
     logger.info(f"🎯 Inicialización completada: {success_count}/{len(ALL_POIS)} POIs procesados")
     return success_count > 0
@@ -152,21 +169,36 @@ def _get_existing_vectors() -> set:
         logger.error(f"❌ Error verificando vectores existentes: {e}")
         return set()
 
+def initialize_poi_content() -> int:
+    """
+    Precarga el contenido de todos los POIs en memoria (un fetch por ID en batch)
+    y arranca el refresco periódico en background
+    """
+    poi_ids = [poi["id"] for poi in ALL_POIS]
+    loaded = poi_content_store.preload(poi_ids)
+    poi_content_store.start_background_refresh(poi_ids)
+    return loaded
+
+def build_reduced_index() -> int:
+    """
+    Indexa en local el contenido de los POIs con embeddings de dimensión reducida
+    (embedding_reduced_dimension > 0); search_madrid_content lo usa en lugar de Pinecone
+    """
+    if not reduced_index.requested_dimension or not embedding_service:
+        return 0
+    items = []
+    for poi in ALL_POIS:
+        text = poi_content_store.get(poi["id"], "basic_info")
+        if text:
+            items.append((f"{poi['id']}_basic_info", text, {"poi_id": poi["id"], "text": text}))
+    return reduced_index.build(items, embedding_service.generate_passage_embeddings)
+
 def get_location_info(poi_id: str, info_type: str = "basic_info") -> str:
-    if USE_PINECONE and pinecone_service and pinecone_service.is_available() and embedding_service:
-        dummy_query = f"información sobre {poi_id}"
-        query_embedding = embedding_service.generate_query_embedding(dummy_query)
-        
-        if query_embedding:
-            results = pinecone_service.search_madrid_content(
-                query_embedding=query_embedding,
-                poi_id=poi_id,
-                content_type=info_type,
-                top_k=1
-            )
-            
-            if results and len(results) > 0:
-                return results[0].get("metadata", {}).get("text", "Información no disponible")
+    # El contenido de los POIs es estático: se sirve desde memoria
+    if USE_PINECONE:
+        text = poi_content_store.get(poi_id, info_type)
+        if text:
+            return text
     
     poi_name = _get_poi_name_by_id(poi_id)
     if poi_name:
@@ -175,15 +207,22 @@ def get_location_info(poi_id: str, info_type: str = "basic_info") -> str:
     
     return f"Lo siento, no tengo información específica sobre '{poi_id}' en este momento."
 
-def search_madrid_content(query: str) -> str:
-    if USE_PINECONE and pinecone_service and pinecone_service.is_available() and embedding_service:
-        query_embedding = embedding_service.generate_query_embedding(query)
+def search_madrid_content(query: str, query_embedding: Optional[List[float]] = None) -> str:
+    use_reduced = reduced_index.ready
+    use_pinecone = USE_PINECONE and pinecone_service and pinecone_service.is_available()
+    if (use_reduced or use_pinecone) and embedding_service:
+        if query_embedding is None:
+            query_embedding = embedding_service.generate_query_embedding(query)
         
-        if query_embedding:
-            results = pinecone_service.search_madrid_content(
-                query_embedding=query_embedding,
-                top_k=3
-            )
+        if query_embedding is not None and len(query_embedding):
+            # Índice local de dimensión reducida si está activo; si no, Pinecone a 1024
+            if use_reduced:
+                results = reduced_index.search(query_embedding, top_k=3)
+            else:
+                results = pinecone_service.search_madrid_content(
+                    query_embedding=query_embedding,
+                    top_k=3
+                )
             
             if results:
                 combined_info = []
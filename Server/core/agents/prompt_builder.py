@@ -0,0 +1,230 @@
+"""
+Prompt Builder - Ensamblado del prompt del Ratoncito Pérez
+Persona estática como prefijo compartido (reutilizable por el caché de prompts del proveedor),
+bloque familiar cacheado por versión de contexto, mensajes de historial reutilizados entre turnos
+y reparto de un presupuesto de tokens de entrada por prioridad de sección
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
+
+from langchain_core.messages import HumanMessage, AIMessage
+
+from Server.core.agents.family_context import FamilyContext
+from Server.core.services.tokenizer import tokenizer
+
+logger = logging.getLogger(__name__)
+
+# Prefijo estático idéntico para todas las familias: va primero para aprovechar el prompt caching
+PERSONA_PROMPT = """Eres el Ratoncito Pérez, guía mágico y educativo de Madrid.
+
+PERSONALIDAD:
+- Mágico pero conciso
+- Respuestas de 1-2 oraciones máximo
+- Directo al grano pero amigable
+- Una pregunta ocasional, no siempre
+
+OBJETIVOS:
+- Información útil y breve
+- Mantener la magia sin rollo
+- Puntos claros sobre Madrid
+- Crear momentos memorables"""
+
+SITUATION_TEMPLATE = """SITUACIÓN ACTUAL:
+{situation_context}
+
+Responde como el Ratoncito Pérez, mágico y amigable, adaptado a la familia.
+Usa la información proporcionada para dar respuestas educativas y entretenidas."""
+
+DEGRADED_NOTICE = "\n[MODO DEGRADADO: Servicios de IA limitados]"
+
+ARRIVAL_TEMPLATE = """LLEGADA A: {poi_name}
+
+INFORMACIÓN DEL LUGAR:
+{poi_info}"""
+
+
+def count_tokens(text: str) -> int:
+    """Tokens del texto según el tokenizador del modelo"""
+    return tokenizer.count(text)
+
+
+@dataclass(frozen=True)
+class PromptPiece:
+    """Fragmento de prompt con su recuento de tokens calculado una sola vez"""
+    text: str
+    tokens: int
+
+    @classmethod
+    def of(cls, text: str) -> "PromptPiece":
+        return cls(text=text, tokens=count_tokens(text))
+
+
+@dataclass
+class AssembledPrompt:
+    system_prompt: str
+    sections: Dict[str, int]
+    history_messages: List[Any] = field(default_factory=list)
+    trimmed: List[str] = field(default_factory=list)
+    user_message: str = ""  # el del usuario, ya recortado a su tope
+
+    @property
+    def tokens(self) -> int:
+        return sum(self.sections.values())
+
+
+@lru_cache(maxsize=1)
+def persona_piece() -> PromptPiece:
+    """Persona con su recuento de tokens (se calcula una vez, al primer uso)"""
+    return PromptPiece.of(PERSONA_PROMPT)
+
+
+class PromptBuilder:
+    """Ensambla el system prompt reutilizando las piezas que no cambian entre turnos"""
+
+    def __init__(self, max_families: int = 1000):
+        self._max_families = max_families
+        self._family_pieces: "OrderedDict[Tuple[Any, ...], PromptPiece]" = OrderedDict()
+        self._history_messages: "OrderedDict[int, Dict[str, Tuple[HumanMessage, AIMessage, int]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    # ---------- Bloque familiar ----------
+    def family_piece(self, context: FamilyContext, degraded: bool = False) -> PromptPiece:
+        """Bloque de la familia, recalculado solo cuando cambia la versión del contexto"""
+        key = (context.family_id, context.context_version, degraded)
+        with self._lock:
+            piece = self._family_pieces.get(key)
+            if piece is not None:
+                self._family_pieces.move_to_end(key)
+                self._hits += 1
+                return piece
+            self._misses += 1
+
+        piece = PromptPiece.of(self._render_family_block(context, degraded))
+        with self._lock:
+            # Las versiones anteriores de la misma familia ya no se usarán
+            for stale_key in [k for k in self._family_pieces if k[0] == context.family_id]:
+                del self._family_pieces[stale_key]
+            self._family_pieces[key] = piece
+            while len(self._family_pieces) > self._max_families:
+                self._family_pieces.popitem(last=False)
+        return piece
+
+    @staticmethod
+    def _render_family_block(context: FamilyContext, degraded: bool) -> str:
+        family_info = []
+        if context.family_name:
+            family_info.append(f"Familia: {context.family_name}")
+        if context.child_names:
+            ages_info = [f"{name} ({age} años)" for name, age in zip(context.child_names, context.child_ages)]
+            family_info.append(f"Niños: {', '.join(ages_info)}")
+        if context.adult_names:
+            family_info.append(f"Adultos: {', '.join(context.adult_names)}")
+
+        family_context_str = "\n".join(family_info) if family_info else "Una familia aventurera"
+        service_status = DEGRADED_NOTICE if degraded else ""
+
+        return f"""FAMILIA QUE VISITAS:
+{family_context_str}
+Puntos mágicos acumulados: {context.total_points}
+POIs visitados: {len(context.visited_pois)}/10{service_status}"""
+
+    # ---------- Prompt completo ----------
+    def build(self, context: FamilyContext, situation_context: str, user_message: str = "",
+              degraded: bool = False, budget: Optional[int] = None,
+              max_user_tokens: Optional[int] = None) -> AssembledPrompt:
+        """
+        Ensambla system prompt + historial dentro de `budget` tokens de entrada.
+        Prioridad: persona, familia y mensaje del usuario (siempre, recortado a max_user_tokens)
+        > contexto de la situación (se recorta) > historial (se descartan primero los más antiguos)
+        """
+        persona = persona_piece()
+        family = self.family_piece(context, degraded)
+        history = self._history_pairs(context, context.get_conversation_history())
+        trimmed = []
+        user_tokens = count_tokens(user_message)
+        if max_user_tokens is not None and user_tokens > max_user_tokens:
+            user_message = tokenizer.truncate(user_message, max_user_tokens)
+            user_tokens = count_tokens(user_message)
+            trimmed.append("user")
+        wrapper_tokens = count_tokens(SITUATION_TEMPLATE.format(situation_context=""))
+        situation_tokens = count_tokens(situation_context)
+
+        if budget is not None:
+            remaining = budget - persona.tokens - family.tokens - user_tokens - wrapper_tokens
+            if situation_tokens > max(remaining, 0):
+                situation_context = tokenizer.truncate(situation_context, max(remaining, 0))
+                situation_tokens = count_tokens(situation_context)
+                trimmed.append("situation")
+            remaining -= situation_tokens
+
+            kept = []
+            for pair in reversed(history):
+                if pair[2] > remaining:
+                    break
+                kept.insert(0, pair)
+                remaining -= pair[2]
+            if len(kept) < len(history):
+                trimmed.append(f"history:{len(history) - len(kept)}")
+            history = kept
+
+        situation_text = SITUATION_TEMPLATE.format(situation_context=situation_context)
+        return AssembledPrompt(
+            system_prompt=f"{persona.text}\n\n{family.text}\n\n{situation_text}",
+            sections={
+                "persona": persona.tokens,
+                "family": family.tokens,
+                "situation": wrapper_tokens + situation_tokens,
+                "history": sum(pair[2] for pair in history),
+                "user": user_tokens,
+            },
+            history_messages=[message for pair in history for message in pair[:2]],
+            trimmed=trimmed,
+            user_message=user_message,
+        )
+
+    # ---------- Historial ----------
+    def _history_pairs(self, context: FamilyContext,
+                       exchanges: List[Dict[str, Any]]) -> List[Tuple[HumanMessage, AIMessage, int]]:
+        """
+        Intercambios del historial reciente como (HumanMessage, AIMessage, tokens); cada
+        intercambio se envuelve y se cuenta una sola vez y se reutiliza en los turnos siguientes
+        """
+        with self._lock:
+            cached = self._history_messages.pop(context.family_id, {})
+            pairs, kept = [], {}
+            for exchange in exchanges:
+                key = exchange.get("timestamp") or f"{exchange.get('user_message')}|{exchange.get('agent_response')}"
+                pair = cached.get(key)
+                if pair is None:
+                    user_text = exchange.get("user_message", "")
+                    agent_text = exchange.get("agent_response", "")
+                    pair = (HumanMessage(content=user_text), AIMessage(content=agent_text),
+                            count_tokens(user_text) + count_tokens(agent_text))
+                kept[key] = pair
+                pairs.append(pair)
+            self._history_messages[context.family_id] = kept
+            while len(self._history_messages) > self._max_families:
+                self._history_messages.popitem(last=False)
+        return pairs
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self._hits + self._misses
+        return {
+            "cached_families": len(self._family_pieces),
+            "family_piece_hits": self._hits,
+            "family_piece_misses": self._misses,
+            "hit_rate": round(self._hits / total, 3) if total else 0.0,
+            "persona_tokens": persona_piece().tokens,
+            "exact_tokenizer": tokenizer.is_exact,
+        }
+
+
+# Instancia global del builder
+prompt_builder = PromptBuilder()
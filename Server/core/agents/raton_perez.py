@@ -4,8 +4,9 @@ Integrado con búsquedas vectoriales y conocimiento dinámico de Madrid
 Usa servicios de embeddings y Pinecone
 """
 
-from typing import Dict, Any, Optional
-import sys, os, logging
+from typing import Dict, Any, List, Optional, Callable
+from contextlib import nullcontext
+import sys, os, logging, asyncio, contextvars
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +18,7 @@ from core.services.groq_service import groq_service
 from Server.core.agents.family_context import (
     FamilyContext,
     load_family_context,
+    load_family_contexts,
     save_family_context
 )
 from Server.core.agents.points_system import evaluate_points
@@ -25,11 +27,35 @@ from Server.core.agents.madrid_knowledge import (
     search_madrid_content,
     get_location_summary
 )
-from Server.core.agents.location_helper import RATON_PEREZ_ROUTE
+from Server.core.agents.location_helper import (
+    RATON_PEREZ_ROUTE,
+    get_poi_by_index,
+    arrival_announcement,
+    is_arrival_announcement
+)
+from Server.core.agents.prompt_builder import prompt_builder, ARRIVAL_TEMPLATE
+from Server.core.agents.retrieval_context import (
+    RetrievalContext,
+    SharedSearches,
+    intent_classifier,
+    keyword_is_location_question
+)
 
 # Importar servicios optimizados
 from Server.core.services.embedding_service import embedding_service
 from Server.core.services.pinecone_service import pinecone_service
+from Server.core.services.response_cache import response_cache
+from Server.core.services.prefetch_cache import prefetch_cache
+from Server.core.services.arrival_narratives import arrival_narratives
+from Server.core.services.tracing import stage, get_current_trace, start_trace
+
+# Situaciones cuya respuesta depende solo del POI y la pregunta (cacheables).
+# poi_question no: es la respuesta del usuario a una pregunta nuestra ("¡el rey!") y sin
+# el turno anterior del agente en la clave se serviría la respuesta a otra pregunta
+CACHEABLE_SITUATIONS = ("location_question",)
+
+# Elementos que se precalculan al avanzar de POI
+PREFETCH_KINDS = ("poi_summary", "next_destination", "arrival_draft")
 
 class RatonPerez:
     """Orquestador principal del Ratoncito Pérez con búsquedas vectoriales optimizadas"""
@@ -37,15 +63,16 @@ class RatonPerez:
     def __init__(self, db):
         self.settings = langchain_settings
         self.db = db
+        self._prefetch_tasks: Dict[int, asyncio.Task] = {}
         
         # Verificar disponibilidad de servicios optimizados
-        self._embedding_available = embedding_service and embedding_service.is_available()
+        # (los embeddings se consultan en cada uso: el modelo termina de cargar en background)
         self._pinecone_available = pinecone_service and pinecone_service.is_available()
         
         if self._embedding_available:
             logger.info("✅ Servicio de embeddings optimizado disponible")
         else:
-            logger.warning("⚠️ Servicio de embeddings no disponible - modo degradado")
+            logger.warning("⚠️ Modelo de embeddings aún no listo - búsqueda por keywords hasta que cargue")
             
         if self._pinecone_available:
             logger.info("✅ Servicio de Pinecone optimizado disponible")
@@ -54,53 +81,162 @@ class RatonPerez:
         
         # NO inicializar base de conocimiento aquí - se hace en background en main.py
         logger.info("✅ Ratoncito Pérez inicializado (modo optimizado)")
+    
+    @property
+    def _embedding_available(self) -> bool:
+        """No bloquea: False mientras el modelo carga o si falló (se degrada a keywords)"""
+        return bool(embedding_service) and embedding_service.is_available()
 
     async def chat(self, family_id: int, message: str,
                    location: Optional[Dict[str, float]] = None,
                    speaker_name: Optional[str] = None) -> Dict[str, Any]:
+        trace = get_current_trace() or start_trace()
         try:
-            family_context = await load_family_context(family_id, self.db)
+            with stage("context_load"):
+                family_context = await load_family_context(family_id, self.db)
 
-            # Detectar situación
-            situation = await self._analyze_situation(message, location, family_context)
+            result = await self._respond(family_context, message, location, speaker_name)
 
-            # Evaluar puntos según la situación detectada
-            points_result = evaluate_points(family_context, message, situation)
+            logger.info(f"⏱️ chat_stages family={family_id} situation={result['situation']} {trace.log_line()}")
+            return result
+        except Exception as e:
+            logger.error(f"❌ Error en chat: {e}")
+            return self._error_result(e)
 
-            # Generar respuesta del agente usando búsquedas vectoriales optimizadas
-            response = await self._generate_contextual_response(
-                family_context, message, situation, points_result
-            )
+    async def chat_batch(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Procesa mensajes de varias familias (visitas guiadas en grupo):
+        contextos cargados en una sola consulta, contenido de cada POI y búsqueda de cada
+        (POI, pregunta) recuperados una vez, y llamadas al LLM concurrentes con un límite
+        configurable (solo la llamada: guardar el contexto no espera turno).
+        Los mensajes de una misma familia se procesan en orden.
+        """
+        trace = get_current_trace() or start_trace()
+        family_ids = list(dict.fromkeys(m["family_id"] for m in messages))
+
+        with stage("context_load"):
+            contexts = await load_family_contexts(family_ids, self.db)
+
+        # Recuperación compartida: una vez por POI distinto del grupo
+        poi_ids = {ctx.get_current_poi_id() or "plaza_oriente" for ctx in contexts.values()}
+        poi_summaries = {}
+        if poi_ids and self._embedding_available and self._pinecone_available:
+            with stage("retrieval"):
+                summaries = await self._run_retrieval({
+                    poi_id: (lambda poi_id=poi_id: get_location_summary(poi_id)) for poi_id in poi_ids
+                })
+            poi_summaries = {poi_id: summary for poi_id, summary in summaries.items() if "error" not in summary}
+
+        shared_searches = SharedSearches()
+        llm_slots = asyncio.Semaphore(self.settings.batch_chat_max_concurrency)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(messages)
+
+        async def _process_family(family_id: int):
+            for index, item in enumerate(messages):
+                if item["family_id"] != family_id:
+                    continue
+                context = contexts.get(family_id)
+                if context is None:
+                    results[index] = {**self._error_result(ValueError(f"Familia {family_id} no encontrada")),
+                                      "family_id": family_id}
+                    continue
+                try:
+                    result = await self._respond(
+                        context, item["message"], item.get("location"), item.get("speaker_name"),
+                        poi_summaries=poi_summaries, shared_searches=shared_searches, llm_slots=llm_slots
+                    )
+                except Exception as e:
+                    logger.error(f"❌ Error en chat batch para familia {family_id}: {e}")
+                    result = self._error_result(e)
+                results[index] = {**result, "family_id": family_id}
+
+        await asyncio.gather(*(_process_family(fid) for fid in family_ids))
+
+        logger.info(f"⏱️ chat_batch_stages families={len(family_ids)} messages={len(messages)} "
+                    f"pois={len(poi_ids)} searches={len(shared_searches)} {trace.log_line()}")
+        return results
+
+    async def _respond(self, family_context: FamilyContext, message: str,
+                       location: Optional[Dict[str, float]] = None,
+                       speaker_name: Optional[str] = None,
+                       poi_summaries: Optional[Dict[str, Dict[str, str]]] = None,
+                       shared_searches: Optional[SharedSearches] = None,
+                       llm_slots: Optional[asyncio.Semaphore] = None) -> Dict[str, Any]:
+        """
+        Turno completo de conversación sobre un contexto ya cargado
+        (chat batch pasa lo compartido por el grupo y el límite de llamadas al LLM)
+        """
+        # Embedding del mensaje compartido por clasificador, caché y búsqueda (se calcula una vez)
+        retrieval = RetrievalContext(message, enabled=bool(self._embedding_available))
+
+        # Detectar situación
+        with stage("situation"):
+            situation = await self._analyze_situation(message, location, family_context, retrieval)
+        situation["retrieval"] = retrieval
+        situation["shared_searches"] = shared_searches
+        situation["llm_slots"] = llm_slots
+
+        # Contenido del POI ya recuperado para el grupo (chat batch) o precalculado al avanzar
+        if poi_summaries and situation.get("current_poi_id") in poi_summaries:
+            situation["poi_summary"] = poi_summaries[situation["current_poi_id"]]
+        elif self._prefetch_enabled():
+            prefetched = prefetch_cache.get(family_context.family_id, "poi_summary", situation.get("current_poi_id"))
+            if prefetched:
+                situation["poi_summary"] = prefetched
+
+        # Evaluar puntos según la situación detectada
+        points_result = evaluate_points(family_context, message, situation)
+
+        # Generar respuesta del agente usando búsquedas vectoriales optimizadas
+        response = await self._generate_contextual_response(
+            family_context, message, situation, points_result
+        )
+
+        # Actualizar contexto
+        await self._update_context(family_context, message, response, speaker_name, points_result, situation)
 
-            # Actualizar contexto
-            await self._update_context(family_context, message, response, speaker_name, points_result, situation)
+        return {
+            "success": True,
+            "response": response,
+            "points_earned": points_result.get("points_earned", 0),
+            "total_points": family_context.total_points,
+            "situation": situation["type"],
+            "achievements": points_result.get("achievements", []),
+            "sources": situation.get("sources", [])
+        }
 
-            return {
-                "success": True,
-                "response": response,
-                "points_earned": points_result.get("points_earned", 0),
-                "total_points": family_context.total_points,
-                "situation": situation["type"],
-                "achievements": points_result.get("achievements", [])
-            }
-        except Exception as e:
-            logger.error(f"❌ Error en chat: {e}")
-            return {
-                "success": False,
-                "response": "¡Ups! El Ratoncito Pérez se ha despistado un momento. 🐭✨",
-                "points_earned": 0,
-                "total_points": 0,
-                "situation": "error",
-                "achievements": [],
-                "error": str(e)
-            }
+    @staticmethod
+    def _error_result(error: Exception) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "response": "¡Ups! El Ratoncito Pérez se ha despistado un momento. 🐭✨",
+            "points_earned": 0,
+            "total_points": 0,
+            "situation": "error",
+            "achievements": [],
+            "error": str(error)
+        }
 
-    async def _analyze_situation(self, message: str, location: Optional[Dict], context: FamilyContext) -> Dict[str, Any]:
+    async def _analyze_situation(self, message: str, location: Optional[Dict], context: FamilyContext,
+                                 retrieval: Optional[RetrievalContext] = None) -> Dict[str, Any]:
         """
         Detecta tipo de situación y determina si es una pregunta sobre lugares
         """
         current_poi_id = context.get_current_poi_id() or "plaza_oriente"
 
+        # Mensaje de llegada al POI actual (el front reenvía el de /advance)
+        current_poi = get_poi_by_index(context.current_poi_index)
+        if current_poi and is_arrival_announcement(message, current_poi):
+            return {
+                "type": "poi_arrival",
+                "current_poi_id": current_poi_id,
+                "data": {
+                    "poi_id": current_poi["id"],
+                    "poi_name": current_poi["name"],
+                    "poi_index": current_poi["index"]
+                }
+            }
+
         # Verifica si el último mensaje del agente incluía una pregunta
         recent_msgs = context.get_recent_messages(1)
         if recent_msgs and "?" in recent_msgs[-1].get("agent_response", ""):
@@ -110,15 +246,19 @@ class RatonPerez:
                 "data": {"query": message}
             }
 
-        # Detectar si es una pregunta sobre lugares (keywords típicas)
-        location_keywords = [
-            "dónde", "donde", "qué es", "que es", "cuéntame", "cuentame", 
-            "historia", "arquitectura", "curiosidad", "interesante",
-            "plaza", "calle", "museo", "palacio", "teatro", "mercado",
-            "madrid", "lugar", "sitio", "edificio"
-        ]
-        
-        is_location_question = any(keyword in message.lower() for keyword in location_keywords)
+        # Clasificación por embedding (reutiliza el embedding del turno) si está activada;
+        # keywords por defecto y como fallback
+        is_location_question = None
+        query_embedding = None
+        if retrieval and self.settings.intent_classifier_enabled:
+            query_embedding = await retrieval.get_embedding()
+        if query_embedding is not None:
+            try:
+                is_location_question = intent_classifier.is_location_question(query_embedding)
+            except Exception as e:
+                logger.warning(f"⚠️ Error en clasificador de intención, usando keywords: {e}")
+        if is_location_question is None:
+            is_location_question = keyword_is_location_question(message)
         
         if is_location_question:
             return {
@@ -138,36 +278,85 @@ class RatonPerez:
                                             situation: Dict[str, Any],
                                             points_result: Dict[str, Any]) -> str:
         
-        # Construir el prompt base
-        base_prompt = self._build_family_prompt(context)
+        # Narración de llegada pregenerada offline para el POI y la franja de edad (sin LLM)
+        if situation["type"] == "poi_arrival":
+            narrative = self._pregenerated_arrival(context, situation)
+            if narrative:
+                situation["sources"] = ["arrival_narratives"]
+                return narrative
+
+        # Borrador de llegada precalculado al avanzar (se sirve una sola vez)
+        if situation["type"] == "poi_arrival" and self._prefetch_enabled():
+            # Si el prefetch sigue en curso se espera (acotado) en lugar de repetir la generación;
+            # si no termina a tiempo se genera en vivo
+            pending = self._prefetch_tasks.get(context.family_id)
+            if pending and not pending.done():
+                with stage("prefetch_wait"):
+                    await asyncio.wait({pending}, timeout=self.settings.prefetch_wait_timeout)
+            draft = prefetch_cache.pop(context.family_id, "arrival_draft", self._arrival_draft_key(context, situation))
+            if draft:
+                situation["sources"] = ["prefetch"]
+                return draft
+
+        # Caché semántico: preguntas casi idénticas en el mismo POI reutilizan la respuesta
+        cache_key = None
+        if (situation["type"] in CACHEABLE_SITUATIONS and self._embedding_available
+                and self.settings.response_cache_enabled):
+            query_embedding = await situation["retrieval"].get_embedding() if situation.get("retrieval") else None
+            if query_embedding is not None:
+                age_groups = self.settings.child_age_groups
+                cache_key = (situation.get("current_poi_id"), situation["type"], context.get_age_band(age_groups))
+                with stage("cache_lookup"):
+                    template = response_cache.lookup(*cache_key, query_embedding)
+                if template:
+                    situation["sources"] = ["response_cache"]
+                    return response_cache.render(template, context.get_personalized_greeting())
 
         # Preparar contexto específico según situación (optimizado)
-        situation_context = await self._build_situation_context(situation, message, context)
-
-        # Prompt completo (sin celebración de puntos)
-        prompt = f"""{base_prompt}
-
-SITUACIÓN ACTUAL:
-{situation_context}
-
-Responde como el Ratoncito Pérez, mágico y amigable, adaptado a la familia.
-Usa la información proporcionada para dar respuestas educativas y entretenidas."""
+        with stage("retrieval"):
+            situation_context = await self._build_situation_context(situation, message, context)
 
         try:
-            # Preparar historial de conversación
-            conversation_history = []
-            for msg in context.get_conversation_history():
-                conversation_history.append({"role": "user", "content": msg.get("user_message", "")})
-                conversation_history.append({"role": "assistant", "content": msg.get("agent_response", "")})
-
-            # Generar respuesta
-            messages = groq_service.create_messages(prompt, message, conversation_history)
-            return await groq_service.generate_response(messages)
+            response = await self._complete(context, message, situation, situation_context)
+
+            if cache_key and not groq_service.is_fallback_response(response):
+                names = context.all_names + [context.family_name]
+                response_cache.store(*cache_key, situation["retrieval"].query_embedding,
+                                     response_cache.to_template(response, names))
+            return response
             
         except Exception as e:
             logger.error(f"❌ Error generando respuesta: {e}")
             return "¡Hola, exploradores! 🐭✨ Estoy aquí para contaros cosas maravillosas sobre Madrid."
 
+    async def _complete(self, context: FamilyContext, message: str, situation: Dict[str, Any],
+                        situation_context: str, priority: Optional[str] = None) -> str:
+        """Ensambla el prompt y llama al LLM (priority: cola del scheduler, por defecto el tipo de situación)"""
+        # Prompt completo: persona estática + bloque familiar cacheado + situación actual
+        # recortado por prioridad para caber en el presupuesto de tokens de entrada
+        assembled = prompt_builder.build(
+            context, situation_context, message,
+            degraded=self._is_degraded(),
+            budget=self.settings.prompt_input_token_budget,
+            max_user_tokens=self.settings.user_message_max_tokens.get(situation["type"])
+        )
+        situation["prompt_tokens"] = assembled.sections
+        if assembled.trimmed:
+            logger.info(f"✂️ Prompt recortado para familia {context.family_id}: {assembled.trimmed} "
+                        f"({assembled.tokens} tokens)")
+
+        # Generar respuesta (historial ya ajustado al presupuesto)
+        messages = groq_service.create_messages_with_history(
+            assembled.system_prompt, assembled.user_message, assembled.history_messages
+        )
+        with stage("groq"):
+            async with situation.get("llm_slots") or nullcontext():
+                return await groq_service.generate_response(
+                    messages, max_tokens=self._max_tokens_for(situation["type"]),
+                    priority=priority or situation["type"], situation=situation["type"],
+                    tags={"family_id": context.family_id, "poi_id": situation.get("current_poi_id")}
+                )
+
     async def _build_situation_context(self, situation: Dict[str, Any], message: str, context: FamilyContext) -> str:
         """
         Construye el contexto específico según la situación detectada
@@ -185,41 +374,46 @@ Usa la información proporcionada para dar respuestas educativas y entretenidas.
             if self._embedding_available and self._pinecone_available:
                 try:
                     poi_info = get_location_info(poi_id, "basic_info")
+                    situation["sources"] = ["poi_info"]
                 except Exception as e:
                     logger.warning(f"⚠️ Error obteniendo info de {poi_id}, usando fallback: {e}")
                     poi_info = f"Información sobre {poi_name} - un lugar especial en Madrid."
             else:
                 poi_info = f"Información sobre {poi_name} - un lugar especial en Madrid."
             
-            return f"""LLEGADA A: {poi_name}
-
-INFORMACIÓN DEL LUGAR:
-{poi_info}"""
+            return ARRIVAL_TEMPLATE.format(poi_name=poi_name, poi_info=poi_info)
 
         elif situation_type in ["location_question", "poi_question"]:
             # Pregunta sobre lugares
             query = situation["data"]["query"]
             current_poi_id = situation.get("current_poi_id")
             
-            # Buscar información relevante usando búsquedas vectoriales optimizadas
-            search_results = ""
+            # Lanzar búsqueda vectorial e info del POI actual en paralelo bajo un deadline común
+            retrieval = {}
             if self._embedding_available and self._pinecone_available:
-                try:
-                    search_results = search_madrid_content(query)
-                except Exception as e:
-                    logger.warning(f"⚠️ Error en búsqueda vectorial, usando fallback: {e}")
-                    search_results = "Información general sobre Madrid disponible."
+                retrieval_context = situation.get("retrieval")
+                query_embedding = await retrieval_context.get_embedding() if retrieval_context else None
+                shared_summary = situation.get("poi_summary")
+                search = lambda: search_madrid_content(query, query_embedding)
+                shared_searches = situation.get("shared_searches")
+                if shared_searches is not None:
+                    steps = {"madrid_search": lambda: shared_searches.run(current_poi_id, query, search)}
+                else:
+                    steps = {"madrid_search": search}
+                if current_poi_id and not shared_summary:
+                    steps["poi_info"] = lambda: get_location_info(current_poi_id, "basic_info")
+                retrieval = await self._run_retrieval(steps)
+                if shared_summary and shared_summary.get("basic_info"):
+                    retrieval["poi_info"] = shared_summary["basic_info"]
+                situation["sources"] = list(retrieval.keys())
+                search_results = retrieval.get("madrid_search", "Información general sobre Madrid disponible.")
             else:
                 search_results = "Madrid es una ciudad llena de historia y lugares fascinantes."
             
-            # Información específica del POI actual si es relevante
+            # Información específica del POI actual si llegó a tiempo
             current_poi_info = ""
-            if current_poi_id and self._embedding_available and self._pinecone_available:
-                try:
-                    poi_data = get_location_info(current_poi_id, 'basic_info')
-                    current_poi_info = f"\nINFORMACIÓN DEL LUGAR ACTUAL:\n{poi_data}"
-                except Exception as e:
-                    logger.warning(f"⚠️ Error obteniendo info del POI actual: {e}")
+            if retrieval.get("poi_info"):
+                current_poi_info = f"\nINFORMACIÓN DEL LUGAR ACTUAL:\n{retrieval['poi_info']}"
             
             return f"""PREGUNTA SOBRE MADRID: {query}
 
@@ -232,7 +426,8 @@ INFORMACIÓN RELEVANTE:
             current_poi_id = situation.get("current_poi_id")
             if current_poi_id and self._embedding_available and self._pinecone_available:
                 try:
-                    poi_summary = get_location_summary(current_poi_id)
+                    poi_summary = situation.get("poi_summary") or get_location_summary(current_poi_id)
+                    situation["sources"] = ["poi_summary"]
                     return f"""CONVERSACIÓN GENERAL
 
 CONTEXTO DEL LUGAR ACTUAL:
@@ -254,44 +449,135 @@ PREGUNTA PARA MANTENER EL INTERÉS:
         else:
             return "El Ratoncito Pérez está aquí para ayudar con cualquier pregunta sobre Madrid."
 
-    def _build_family_prompt(self, context: FamilyContext) -> str:
+    async def _run_retrieval(self, steps: Dict[str, Callable[[], str]]) -> Dict[str, str]:
         """
-        Construye el prompt base adaptado a la familia
+        Ejecuta los pasos de recuperación en paralelo con un deadline compartido.
+        Devuelve solo los resultados que llegaron a tiempo y sin error.
         """
-        family_info = []
-        if context.family_name:
-            family_info.append(f"Familia: {context.family_name}")
-        if context.child_names:
-            ages_info = [f"{name} ({age} años)" for name, age in zip(context.child_names, context.child_ages)]
-            family_info.append(f"Niños: {', '.join(ages_info)}")
-        if context.adult_names:
-            family_info.append(f"Adultos: {', '.join(context.adult_names)}")
-        
-        family_context_str = "\n".join(family_info) if family_info else "Una familia aventurera"
-        
-        # Información sobre disponibilidad de servicios (para debugging)
-        service_status = ""
-        if not self._embedding_available or not self._pinecone_available:
-            service_status = "\n[MODO DEGRADADO: Servicios de IA limitados]"
-        
-        return f"""Eres el Ratoncito Pérez, guía mágico y educativo de Madrid.
-
-FAMILIA QUE VISITAS:
-{family_context_str}
-Puntos mágicos acumulados: {context.total_points}
-POIs visitados: {len(context.visited_pois)}/10{service_status}
-
-PERSONALIDAD:
-- Mágico pero conciso
-- Respuestas de 1-2 oraciones máximo
-- Directo al grano pero amigable
-- Una pregunta ocasional, no siempre
+        deadline = self.settings.retrieval_deadline
+        tasks = {
+            asyncio.ensure_future(asyncio.to_thread(fn)): name
+            for name, fn in steps.items()
+        }
+        done, pending = await asyncio.wait(tasks.keys(), timeout=deadline)
+
+        for task in pending:
+            task.cancel()
+            logger.warning(f"⏱️ Recuperación '{tasks[task]}' superó el deadline de {deadline}s")
+
+        results = {}
+        for task in done:
+            name = tasks[task]
+            try:
+                result = task.result()
+            except Exception as e:
+                logger.warning(f"⚠️ Error en recuperación '{name}', usando fallback: {e}")
+                continue
+            if result:
+                results[name] = result
+        # Mantener el orden declarado de las fuentes
+        return {name: results[name] for name in steps if name in results}
+
+    def _max_tokens_for(self, situation_type: str) -> Optional[int]:
+        """Límite de salida según la situación (la persona pide respuestas de 1-2 oraciones)"""
+        limits = self.settings.situation_max_tokens
+        return limits.get(situation_type, self.settings.max_tokens)
+
+    def _is_degraded(self) -> bool:
+        """Servicios de IA limitados (se indica en el prompt para debugging)"""
+        return not self._embedding_available or not self._pinecone_available
+
+    def _prefetch_enabled(self) -> bool:
+        return self.settings.prefetch_enabled
+
+    def _has_pregenerated_arrival(self, context: FamilyContext, situation: Dict[str, Any]) -> bool:
+        if not self.settings.arrival_narratives_enabled:
+            return False
+        poi_id, age_band = self._arrival_draft_key(context, situation)
+        return arrival_narratives.has(poi_id, age_band)
+
+    def _pregenerated_arrival(self, context: FamilyContext, situation: Dict[str, Any]) -> Optional[str]:
+        if not self.settings.arrival_narratives_enabled:
+            return None
+        poi_id, age_band = self._arrival_draft_key(context, situation)
+        return arrival_narratives.get(poi_id, age_band, context.get_personalized_greeting())
+
+    def _arrival_draft_key(self, context: FamilyContext, situation: Dict[str, Any]):
+        age_groups = self.settings.child_age_groups
+        return situation["data"]["poi_id"], context.get_age_band(age_groups)
+
+    def schedule_prefetch(self, context: FamilyContext) -> Optional[asyncio.Task]:
+        """
+        Lanza en background el prefetch del POI al que acaba de llegar la familia
+        (sin heredar la traza del request que lo dispara)
+        """
+        if not self._prefetch_enabled():
+            return None
+        family_id = context.family_id
+        # Lo precalculado para el POI anterior ya no sirve
+        for kind in PREFETCH_KINDS:
+            prefetch_cache.invalidate(family_id, kind)
+        previous = self._prefetch_tasks.get(family_id)
+        if previous:
+            previous.cancel()
+
+        task = asyncio.get_running_loop().create_task(self._prefetch_arrival(context), context=contextvars.Context())
+        self._prefetch_tasks[family_id] = task
+        task.add_done_callback(
+            lambda t: self._prefetch_tasks.pop(family_id, None) if self._prefetch_tasks.get(family_id) is t else None
+        )
+        return task
+
+    async def _prefetch_arrival(self, context: FamilyContext):
+        """Contenido del POI, payload de /next y borrador de llegada para la franja de edad"""
+        family_id = context.family_id
+        poi = get_poi_by_index(context.current_poi_index)
+        try:
+            with stage("prefetch"):
+                summary = None
+                if poi and self._embedding_available and self._pinecone_available:
+                    summary = await asyncio.to_thread(get_location_summary, poi["id"])
+                    if "error" in summary:
+                        summary = None
+                    else:
+                        prefetch_cache.put(family_id, "poi_summary", summary, poi["id"])
+                prefetch_cache.put(family_id, "next_destination", self._next_destination_payload(context, summary))
+                if not poi:
+                    return
+
+                message = arrival_announcement(poi)
+                situation = {
+                    "type": "poi_arrival",
+                    "current_poi_id": poi["id"],
+                    "data": {"poi_id": poi["id"], "poi_name": poi["name"], "poi_index": poi["index"]}
+                }
+                # Con narración pregenerada el borrador no hace falta
+                if self._has_pregenerated_arrival(context, situation):
+                    return
+                situation_context = await self._build_situation_context(situation, message, context)
+                draft = await self._complete(context, message, situation, situation_context, priority="prefetch")
+                if not groq_service.is_fallback_response(draft):
+                    prefetch_cache.put(family_id, "arrival_draft", draft, self._arrival_draft_key(context, situation))
+            logger.info(f"🔮 Prefetch listo para familia {family_id} en {poi['id']}")
+        except Exception as e:
+            logger.warning(f"⚠️ Error en prefetch para familia {family_id}: {e}")
 
-OBJETIVOS:
-- Información útil y breve
-- Mantener la magia sin rollo
-- Puntos claros sobre Madrid
-- Crear momentos memorables"""
+    def _next_destination_payload(self, context: FamilyContext,
+                                  dynamic_info: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Respuesta de /next para el índice actual de la familia"""
+        next_index = context.current_poi_index
+        if next_index < len(RATON_PEREZ_ROUTE):
+            next_poi = RATON_PEREZ_ROUTE[next_index]
+            return {
+                **next_poi,
+                "dynamic_info": dynamic_info or {},
+                "progress": f"{next_index + 1}/{len(RATON_PEREZ_ROUTE)}"
+            }
+        return {
+            "completed": True,
+            "message": "¡Habéis completado toda la ruta del Ratoncito Pérez! 🎉",
+            "total_points": context.total_points
+        }
 
     async def _update_context(self, context: FamilyContext, user_message: str, agent_response: str,
                               speaker_name: Optional[str], points_result: Dict[str, Any],
@@ -307,8 +593,8 @@ OBJETIVOS:
         if points:
             context.total_points += points
 
-        # Si es llegada a POI, actualizar progreso
-        if situation["type"] == "poi_arrival":
+        # Si es llegada a POI, actualizar progreso (/advance ya la registra al avanzar)
+        if situation["type"] == "poi_arrival" and not context.get_poi_by_id(situation["data"]["poi_id"]):
             poi = situation["data"]
             context.add_visited_poi({
                 "poi_id": poi["poi_id"],
@@ -316,10 +602,12 @@ OBJETIVOS:
                 "poi_index": poi["poi_index"],
                 "points": points
             })
-            context.current_poi_index = max(context.current_poi_index, poi["poi_index"] + 1)
+            context.current_poi_index = max(context.current_poi_index, poi["poi_index"])
+            prefetch_cache.invalidate(context.family_id, "next_destination")
 
         # Guardar contexto
-        await save_family_context(context, self.db)
+        with stage("db_save"):
+            await save_family_context(context, self.db)
 
 
 # Instancia global
@@ -335,6 +623,12 @@ async def process_chat_message(family_id: int, message: str,
         raton_perez = RatonPerez(db)
     return await raton_perez.chat(family_id, message, location, speaker_name)
 
+async def process_chat_batch(messages: List[Dict[str, Any]], db=None) -> List[Dict[str, Any]]:
+    global raton_perez
+    if not raton_perez:
+        raton_perez = RatonPerez(db)
+    return await raton_perez.chat_batch(messages)
+
 async def get_family_status(family_id: int, db) -> Dict[str, Any]:
     global raton_perez
     if not raton_perez:
@@ -362,32 +656,34 @@ async def get_next_destination(family_id: int, db) -> Dict[str, Any]:
         raton_perez = RatonPerez(db)
     
     try:
+        # Precalculado al avanzar (válido hasta el siguiente /advance)
+        if raton_perez._prefetch_enabled():
+            prefetched = prefetch_cache.get(family_id, "next_destination")
+            if prefetched:
+                return prefetched
+
         context = await load_family_context(family_id, db)
         next_index = context.current_poi_index
         
-        if next_index < len(RATON_PEREZ_ROUTE):
+        # Enriquecer con información dinámica si los servicios están disponibles
+        dynamic_info = {}
+        if next_index < len(RATON_PEREZ_ROUTE) and raton_perez._embedding_available and raton_perez._pinecone_available:
             next_poi = RATON_PEREZ_ROUTE[next_index]
-            
-            # Enriquecer con información dinámica si los servicios están disponibles
-            dynamic_info = {}
-            if raton_perez._embedding_available and raton_perez._pinecone_available:
-                try:
-                    dynamic_info = get_location_summary(next_poi["id"])
-                except Exception as e:
-                    logger.warning(f"⚠️ Error obteniendo info dinámica para {next_poi['id']}: {e}")
-                    dynamic_info = {"basic_info": "Información no disponible temporalmente"}
-            
-            return {
-                **next_poi,
-                "dynamic_info": dynamic_info,
-                "progress": f"{next_index + 1}/{len(RATON_PEREZ_ROUTE)}"
-            }
-        else:
-            return {
-                "completed": True, 
-                "message": "¡Habéis completado toda la ruta del Ratoncito Pérez! 🎉",
-                "total_points": context.total_points
-            }
+            try:
+                dynamic_info = get_location_summary(next_poi["id"])
+            except Exception as e:
+                logger.warning(f"⚠️ Error obteniendo info dinámica para {next_poi['id']}: {e}")
+                dynamic_info = {"basic_info": "Información no disponible temporalmente"}
+        
+        return raton_perez._next_destination_payload(context, dynamic_info)
     except Exception as e:
         logger.error(f"Error obteniendo siguiente destino: {e}")
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
+
+
+def schedule_arrival_prefetch(context: FamilyContext, db) -> Optional[asyncio.Task]:
+    """Prefetch tras /advance: contenido, borrador de llegada y payload de /next"""
+    global raton_perez
+    if not raton_perez:
+        raton_perez = RatonPerez(db)
+    return raton_perez.schedule_prefetch(context)
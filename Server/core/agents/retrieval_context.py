@@ -0,0 +1,167 @@
+"""
+Retrieval Context - Estado de recuperación de un turno de chat
+El embedding del mensaje del usuario se calcula una sola vez y se comparte entre
+el clasificador de situación, el caché semántico y la búsqueda en Pinecone.
+En chat batch, SharedSearches comparte además la búsqueda entre mensajes iguales del grupo
+"""
+
+import os
+import sys
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Añadir el directorio raíz al path para importar config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from config import langchain_settings
+
+from Server.core.services.embedding_cache import normalize_text
+from Server.core.services.embedding_service import embedding_service
+
+logger = logging.getLogger(__name__)
+
+# Frases prototipo para distinguir preguntas sobre lugares de la conversación general
+LOCATION_PROTOTYPES = [
+    "¿Qué es este lugar?",
+    "Cuéntame la historia de esta plaza",
+    "¿Dónde está el Palacio Real?",
+    "¿Quién construyó este edificio y cuándo?",
+    "¿Qué curiosidades tiene esta calle de Madrid?",
+    "¿Por qué es famoso este sitio?",
+    "¿Qué hay en el museo?",
+]
+
+GENERAL_PROTOTYPES = [
+    "Hola, ¿cómo estás?",
+    "Gracias, eres genial",
+    "Tenemos hambre y estamos cansados",
+    "¡Qué divertido!",
+    "Me gusta mucho jugar contigo",
+    "¿Cuántos puntos tenemos?",
+    "Sí, vale, de acuerdo",
+]
+
+# Baseline previo (y fallback sin modelo): palabras típicas de preguntas sobre lugares
+LOCATION_KEYWORDS = [
+    "dónde", "donde", "qué es", "que es", "cuéntame", "cuentame",
+    "historia", "arquitectura", "curiosidad", "interesante",
+    "plaza", "calle", "museo", "palacio", "teatro", "mercado",
+    "madrid", "lugar", "sitio", "edificio"
+]
+
+
+def keyword_is_location_question(message: str) -> bool:
+    message = message.lower()
+    return any(keyword in message for keyword in LOCATION_KEYWORDS)
+
+
+@dataclass
+class RetrievalContext:
+    """Contexto de recuperación por turno: consulta del usuario y su embedding (lazy, una vez)"""
+    query: str
+    enabled: bool = True
+    query_embedding: Optional[np.ndarray] = None
+    _computed: bool = field(default=False, repr=False)
+    _lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+
+    async def get_embedding(self) -> Optional[np.ndarray]:
+        """Devuelve el embedding de la consulta, calculándolo solo la primera vez"""
+        if not self.enabled:
+            return None
+        async with self._lock:
+            if not self._computed:
+                try:
+                    embedding = await embedding_service.agenerate_query_embedding(self.query)
+                    self.query_embedding = embedding if len(embedding) else None
+                except Exception as e:
+                    logger.warning(f"⚠️ Error generando embedding de la consulta: {e}")
+                    self.query_embedding = None
+                self._computed = True
+        return self.query_embedding
+
+
+class SharedSearches:
+    """
+    Búsquedas de un lote de mensajes (chat batch): una sola por (POI, consulta normalizada).
+    Se llama desde los hilos de _run_retrieval; quien llega tarde espera el resultado del primero
+    """
+
+    def __init__(self, timeout: float = 10.0):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._futures: Dict[Tuple[str, str], Future] = {}
+
+    def run(self, poi_id: Optional[str], query: str, search: Callable[[], str]) -> str:
+        key = (poi_id or "", normalize_text(query).lower())
+        with self._lock:
+            future = self._futures.get(key)
+            leader = future is None
+            if leader:
+                future = self._futures[key] = Future()
+        if not leader:
+            return future.result(timeout=self.timeout)
+        try:
+            result = search()
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        future.set_result(result)
+        return result
+
+    def __len__(self) -> int:
+        return len(self._futures)
+
+
+class IntentClassifier:
+    """Clasificador por similitud con frases prototipo (sustituye a la lista de keywords)"""
+
+    def __init__(self, margin: float = 0.02, min_similarity: float = 0.75):
+        self.margin = margin
+        self.min_similarity = min_similarity
+        self._location = None
+        self._general = None
+        self._failed_state = None  # estado del modelo en el último intento fallido
+        self._lock = threading.Lock()
+
+    def _prototypes(self):
+        if self._location is None:
+            # Sin modelo no se reintenta en cada mensaje: solo cuando cambie su estado
+            state = (embedding_service.state, embedding_service.is_available())
+            if state == self._failed_state:
+                return None, None
+            with self._lock:
+                if self._location is None:
+                    location = embedding_service.generate_embeddings(LOCATION_PROTOTYPES, "query")
+                    general = embedding_service.generate_embeddings(GENERAL_PROTOTYPES, "query") if len(location) else []
+                    if len(location) and len(general):
+                        self._general = np.asarray(general, dtype=np.float32)
+                        self._location = np.asarray(location, dtype=np.float32)
+                        self._failed_state = None
+                    else:
+                        self._failed_state = state
+        return self._location, self._general
+
+    def is_location_question(self, query_embedding: List[float]) -> Optional[bool]:
+        """
+        True/False según el prototipo más parecido; None si no hay prototipos
+        disponibles (el llamador debe usar el fallback por keywords)
+        """
+        location, general = self._prototypes()
+        if location is None:
+            return None
+        query = np.asarray(query_embedding, dtype=np.float32)
+        location_score = float(np.max(location @ query))
+        general_score = float(np.max(general @ query))
+        return location_score >= self.min_similarity and location_score >= general_score + self.margin
+
+
+# Instancia global del clasificador (solo se usa con intent_classifier_enabled)
+intent_classifier = IntentClassifier(
+    margin=langchain_settings.intent_classifier_margin,
+    min_similarity=langchain_settings.intent_classifier_min_similarity,
+)
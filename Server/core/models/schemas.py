@@ -34,8 +34,21 @@ class ChatResponse(BaseModel):
     total_points: int = 0
     situation: Optional[str] = None
     achievements: List[str] = []
+    sources: List[str] = []
     error: Optional[str] = None
 
+class BatchChatRequest(BaseModel):
+    """Mensajes de varias familias de un mismo guía (visita en grupo)"""
+    messages: List[ChatMessage] = Field(..., min_length=1, max_length=20)
+
+class BatchChatResult(ChatResponse):
+    family_id: int
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchChatResult]
+    total_families: int
+    successful: int
+
 class LocationUpdate(BaseModel):
     family_id: int
     latitude: float
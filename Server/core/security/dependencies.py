@@ -5,13 +5,19 @@ Middleware y decoradores para proteger rutas
 
 from fastapi import HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import Optional
+from typing import Optional, List
 import logging
+import os
+import sys
 
 from Server.core.security.auth import auth_manager
 from Server.core.models.database import Database
 from Server.api.dependencies import get_db
 
+# Añadir el directorio raíz al path para importar config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from config import langchain_settings
+
 logger = logging.getLogger(__name__)
 
 # Esquema de seguridad Bearer Token con auto_error=True para lanzar 401 automáticamente
@@ -112,6 +118,24 @@ async def get_optional_user(
     except HTTPException:
         return None
 
+def admin_emails() -> set:
+    """Emails con acceso a estadísticas y depuración (ADMIN_EMAILS, separados por comas)"""
+    raw = langchain_settings.admin_emails or ""
+    return {email.strip().lower() for email in raw.split(",") if email.strip()}
+
+async def require_admin(current_user: AuthenticatedUser = Depends(get_current_user)) -> AuthenticatedUser:
+    """
+    Dependencia para endpoints de operación (uso del LLM, depuración)
+    Sin ADMIN_EMAILS configurado nadie es administrador
+    """
+    if (current_user.email or "").lower() not in admin_emails():
+        logger.warning(f"🔒 Acceso de administrador denegado a {current_user.email}")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Acceso restringido a administradores"
+        )
+    return current_user
+
 def require_family_ownership(family_id: int, current_user: AuthenticatedUser, db: Database) -> bool:
     """
     Verificar que el usuario actual es propietario de la familia
@@ -146,4 +170,37 @@ def require_family_ownership(family_id: int, current_user: AuthenticatedUser, db
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error interno del servidor"
-        )
\ No newline at end of file
+        )
+
+def require_families_ownership(family_ids: List[int], current_user: AuthenticatedUser, db: Database) -> bool:
+    """
+    Versión batch de require_family_ownership: verifica varias familias con una sola consulta
+    """
+    try:
+        family_query = "SELECT id, user_id FROM families WHERE id = ANY(%s)"
+        family_result = db.execute_query(family_query, (list(family_ids),)) or []
+        owners = {row["id"]: row["user_id"] for row in family_result}
+
+        missing = [fid for fid in family_ids if fid not in owners]
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Familias no encontradas: {missing}"
+            )
+
+        if any(owner_id != current_user.id for owner_id in owners.values()):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="No tienes permiso para acceder a alguna de estas familias"
+            )
+
+        return True
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error verificando propiedad de familias {family_ids}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno del servidor"
+        )
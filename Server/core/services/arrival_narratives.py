@@ -0,0 +1,145 @@
+"""
+Arrival Narratives - Narraciones de llegada pregeneradas por POI y franja de edad
+Las genera offline scripts/generate_arrival_narratives.py en un artefacto JSON versionado;
+en la llegada solo se sustituye el nombre de la familia (sin LLM). Al cargar se compara la
+huella del texto de cada POI con el contenido vivo: si cambió, ese POI vuelve a generación en vivo
+"""
+
+import os
+import sys
+import json
+import random
+import hashlib
+import logging
+import threading
+from typing import Callable, Dict, Any, List, Optional
+
+# Añadir el directorio raíz al path para importar config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from config import langchain_settings
+
+from Server.core.services.poi_content_store import poi_content_store
+from Server.core.services.response_cache import NAME_PLACEHOLDER
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 1
+
+DEFAULT_ARTIFACT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "arrival_narratives.json"
+)
+
+
+def content_version(model: str, prompt: str, poi_texts: Dict[str, str]) -> str:
+    """Huella del modelo, el prompt y el contenido de los POIs usados para generar el artefacto"""
+    payload = json.dumps({"model": model, "prompt": prompt, "pois": poi_texts}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def poi_fingerprint(text: str) -> str:
+    """Huella del texto de un POI; el artefacto guarda una por POI para detectar contenido desfasado"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+
+
+class ArrivalNarratives:
+    """Artefacto de narraciones {poi_id: {franja: [plantillas]}} cargado de forma lazy"""
+
+    def __init__(self, artifact_path: Optional[str] = None,
+                 content_source: Optional[Callable[[str], Optional[str]]] = None):
+        self._artifact_path = artifact_path or DEFAULT_ARTIFACT_PATH
+        # Texto vivo de un POI (None si no se conoce); por defecto, el de poi_content_store
+        self._content_source = content_source or (lambda poi_id: poi_content_store.get(poi_id))
+        self._narratives: Dict[str, Dict[str, List[str]]] = {}
+        self._metadata: Dict[str, Any] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def load(self, force: bool = False) -> int:
+        """Carga el artefacto si existe. Devuelve el número de plantillas disponibles"""
+        with self._lock:
+            if self._loaded and not force:
+                return self._count()
+            self._loaded = True
+            try:
+                if not os.path.exists(self._artifact_path):
+                    logger.info("ℹ️ Sin narraciones de llegada pregeneradas: se usará generación en vivo")
+                    return 0
+                with open(self._artifact_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("schema_version") != SCHEMA_VERSION:
+                    logger.warning(f"⚠️ Artefacto de narraciones con esquema {data.get('schema_version')} "
+                                   f"(se esperaba {SCHEMA_VERSION}), ignorado")
+                    return 0
+                self._metadata = {k: v for k, v in data.items() if k != "narratives"}
+                self._narratives = self._current(data.get("narratives", {}))
+                logger.info(f"📜 Narraciones de llegada cargadas: versión {self._metadata.get('version')}, "
+                            f"{self._count()} plantillas")
+            except Exception as e:
+                logger.warning(f"⚠️ Error cargando narraciones de llegada: {e}")
+                self._narratives = {}
+            return self._count()
+
+    def _current(self, narratives: Dict[str, Dict[str, List[str]]]) -> Dict[str, Dict[str, List[str]]]:
+        """
+        Descarta los POIs cuyo texto ya no es el que se usó al generar el artefacto.
+        Si el contenido vivo no se conoce (p. ej. Pinecone caído) no hay con qué comparar y se conservan
+        """
+        recorded = self._metadata.get("poi_versions") or {}
+        current = {}
+        for poi_id, bands in narratives.items():
+            live = self._content_source(poi_id)
+            if poi_id not in recorded or (live is not None and poi_fingerprint(live) != recorded[poi_id]):
+                logger.warning(f"⚠️ Narraciones de llegada de {poi_id} desfasadas respecto al contenido del POI: "
+                               f"se usará generación en vivo")
+                continue
+            current[poi_id] = bands
+        return current
+
+    def _count(self) -> int:
+        return sum(len(variants) for bands in self._narratives.values() for variants in bands.values())
+
+    def has(self, poi_id: str, age_band: str) -> bool:
+        self.load()
+        return bool(self._narratives.get(poi_id, {}).get(age_band))
+
+    def get(self, poi_id: str, age_band: str, greeting: str) -> Optional[str]:
+        """Una de las variantes para el POI y la franja, personalizada; None si no hay"""
+        self.load()
+        variants = self._narratives.get(poi_id, {}).get(age_band)
+        with self._lock:
+            if not variants:
+                self._misses += 1
+                return None
+            self._hits += 1
+        return random.choice(variants).replace(NAME_PLACEHOLDER, greeting)
+
+    def save(self, narratives: Dict[str, Dict[str, List[str]]], metadata: Dict[str, Any]):
+        """Escribe el artefacto de forma atómica (lo usa el job offline)"""
+        data = {"schema_version": SCHEMA_VERSION, **metadata, "narratives": narratives}
+        os.makedirs(os.path.dirname(self._artifact_path), exist_ok=True)
+        tmp_path = f"{self._artifact_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._artifact_path)
+        with self._lock:
+            self._narratives = narratives
+            self._metadata = {k: v for k, v in data.items() if k != "narratives"}
+            self._loaded = True
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self._hits + self._misses
+        return {
+            "version": self._metadata.get("version"),
+            "generated_at": self._metadata.get("generated_at"),
+            "model": self._metadata.get("model"),
+            "templates": self._count(),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / total, 3) if total else 0.0,
+        }
+
+
+# Instancia global de las narraciones
+arrival_narratives = ArrivalNarratives(langchain_settings.arrival_narratives_path)
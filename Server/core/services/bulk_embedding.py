@@ -0,0 +1,151 @@
+"""
+Bulk Embedding - Codificación masiva de pasajes para la ingesta de conocimiento
+Ordena los pasajes por longitud en tokens (lotes con poco relleno), los agrupa en lotes de
+tamaño configurable y los reparte entre un pool de procesos del tamaño de los núcleos
+disponibles; cada proceso carga el modelo una vez. Los lotes más largos se envían primero
+para que ningún proceso se quede con la cola larga al final. Informa del progreso.
+
+Con workers=1 no hay pool: los lotes se codifican en proceso con encode_fn (por defecto el
+de EmbeddingService). Con sidecar configurado tampoco: el modelo ya vive en el sidecar y
+cada hijo cargaría otra copia completa. Un lote que falla no aborta la ingesta: sus filas
+quedan a NaN y el resto sigue
+"""
+
+import os
+import sys
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, List, Optional
+
+import numpy as np
+
+# Añadir el directorio raíz al path para importar config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from config import langchain_settings
+
+from Server.core.services.tokenizer import tokenizer
+
+logger = logging.getLogger(__name__)
+
+ProgressCallback = Callable[[int, int, float], None]
+
+# Codificador del proceso hijo (uno por proceso, cargado en el initializer del pool)
+_WORKER_ENCODER = None
+
+
+def default_encoder_factory():
+    """Mismo modelo y backend que EmbeddingService, cargado en el proceso hijo"""
+    from Server.core.services.embedding_backends import build_encoder
+    from Server.core.services.embedding_service import embedding_service
+    return build_encoder(langchain_settings, embedding_service.model_name)
+
+
+def _init_worker(encoder_factory: Callable[[], Any], threads: int):
+    global _WORKER_ENCODER
+    if threads:
+        # Repartir los núcleos: N procesos con todos los hilos cada uno se pisan entre sí
+        os.environ["OMP_NUM_THREADS"] = str(threads)
+        try:
+            import torch
+            torch.set_num_threads(threads)
+        except ImportError:
+            pass
+    _WORKER_ENCODER = encoder_factory()
+
+
+def _encode_in_worker(texts: List[str], text_type: str) -> np.ndarray:
+    prepared = [f"{text_type}: {text}" for text in texts]
+    return np.asarray(_WORKER_ENCODER.encode(prepared, normalize_embeddings=True), dtype=np.float32)
+
+
+def length_sorted_batches(texts: List[str], batch_size: int) -> List[List[int]]:
+    """Índices agrupados en lotes de longitud parecida, del lote más largo al más corto"""
+    order = sorted(range(len(texts)), key=lambda i: tokenizer.count(texts[i]), reverse=True)
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+def bulk_encode(texts: List[str], text_type: str = "passage", workers: Optional[int] = None,
+                batch_size: Optional[int] = None, progress: Optional[ProgressCallback] = None,
+                encode_fn: Optional[Callable[[List[str], str], Any]] = None,
+                encoder_factory: Optional[Callable[[], Any]] = None,
+                start_method: str = "spawn") -> np.ndarray:
+    """
+    Codifica todos los textos y devuelve una matriz float32 (n, dim) en el orden original;
+    las filas de los lotes que fallaron quedan a NaN (dim = 0 si fallaron todos)
+
+    Args:
+        workers: procesos del pool (None/0 = núcleos disponibles; 1 = en proceso con encode_fn)
+        batch_size: textos por lote (por defecto embedding_bulk_batch_size)
+        progress: callback(hechos, total, segundos) tras cada lote
+        encode_fn: codificador en proceso para workers=1, recibe (textos, tipo)
+        encoder_factory: función de nivel de módulo (picklable) que crea el modelo en cada hijo
+    """
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+    batch_size = batch_size or langchain_settings.embedding_bulk_batch_size
+    workers = workers or langchain_settings.embedding_bulk_workers or os.cpu_count() or 1
+    batches = length_sorted_batches(texts, batch_size)
+    workers = min(workers, len(batches))
+    if workers > 1 and encoder_factory is None and langchain_settings.embedding_sidecar_socket:
+        workers = 1
+
+    out: Optional[np.ndarray] = None
+    failed: List[int] = []
+    done, start = 0, time.perf_counter()
+
+    def collect(indices: List[int], vectors: Optional[np.ndarray], error: Optional[BaseException] = None):
+        nonlocal out, done
+        if error is not None:
+            logger.error(f"❌ Lote de {len(indices)} textos sin codificar: {error}")
+            failed.extend(indices)
+        else:
+            vectors = np.asarray(vectors, dtype=np.float32)
+            if out is None:
+                out = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            out[indices] = vectors
+        done += len(indices)
+        if progress:
+            progress(done, len(texts), time.perf_counter() - start)
+
+    def result() -> np.ndarray:
+        if out is None:
+            return np.empty((len(texts), 0), dtype=np.float32)
+        if failed:
+            logger.warning(f"⚠️ Codificación masiva: {len(failed)}/{len(texts)} textos fallidos")
+            out[failed] = np.nan
+        return out
+
+    if workers <= 1:
+        if encode_fn is None:
+            from Server.core.services.embedding_service import embedding_service
+            encode_fn = embedding_service._encode
+        for indices in batches:
+            try:
+                collect(indices, encode_fn([texts[i] for i in indices], text_type))
+            except Exception as e:
+                collect(indices, None, e)
+        return result()
+
+    threads = max(1, (os.cpu_count() or workers) // workers)
+    logger.info(f"⚙️ Codificación masiva: {len(texts)} textos, {len(batches)} lotes, "
+                f"{workers} procesos x {threads} hilos")
+    context = multiprocessing.get_context(start_method)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(encoder_factory or default_encoder_factory, threads)) as pool:
+        futures = {pool.submit(_encode_in_worker, [texts[i] for i in indices], text_type): indices
+                   for indices in batches}
+        for future in as_completed(futures):
+            try:
+                collect(futures[future], future.result())
+            except Exception as e:
+                collect(futures[future], None, e)
+    return result()
+
+
+def log_progress(done: int, total: int, elapsed: float):
+    """Callback de progreso por defecto: una línea de log con ritmo y tiempo restante"""
+    rate = done / elapsed if elapsed > 0 else 0.0
+    remaining = (total - done) / rate if rate else 0.0
+    logger.info(f"📦 {done}/{total} pasajes ({rate:.1f}/s, quedan ~{remaining:.0f}s)")
@@ -0,0 +1,108 @@
+"""
+Embedding Backends - Codificadores intercambiables para EmbeddingService
+Todos exponen encode(texts, normalize_embeddings=True) -> np.ndarray float32 (n, dim),
+la misma firma que SentenceTransformer, de modo que el servicio no distingue entre ellos.
+
+- "sentence_transformers": el modelo en PyTorch (comportamiento original)
+- "onnx": el modelo exportado a ONNX y ejecutado con ONNX Runtime en CPU, opcionalmente
+  con cuantización dinámica int8 (model.int8.onnx). No carga PyTorch ni transformers:
+  solo onnxruntime y tokenizers (pip install onnxruntime tokenizers)
+
+El directorio ONNX se genera con scripts/export_embedding_onnx.py
+"""
+
+import os
+import logging
+from typing import Any, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_INT8_MODEL_FILE = "model.int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+
+class SentenceTransformerEncoder:
+    """Envoltorio fino sobre SentenceTransformer (PyTorch)"""
+
+    backend = "sentence_transformers"
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model_name = model_name
+        self._model = SentenceTransformer(model_name)
+
+    def encode(self, texts: List[str], normalize_embeddings: bool = True) -> np.ndarray:
+        return np.asarray(self._model.encode(texts, normalize_embeddings=normalize_embeddings),
+                          dtype=np.float32)
+
+
+class OnnxEncoder:
+    """e5 en ONNX Runtime: tokenización rápida + mean pooling con máscara de atención, como e5"""
+
+    backend = "onnx"
+
+    def __init__(self, model_dir: str, quantized: bool = True, threads: int = 0, max_length: int = 512):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_dir = model_dir
+        self.quantized = quantized
+        model_path = os.path.join(model_dir, ONNX_INT8_MODEL_FILE if quantized else ONNX_MODEL_FILE)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"No existe {model_path}: ejecuta scripts/export_embedding_onnx.py")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self._session = ort.InferenceSession(model_path, sess_options=options,
+                                             providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self._session.get_inputs()}
+
+        self._tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self._tokenizer.enable_truncation(max_length=max_length)
+        self._tokenizer.enable_padding()
+
+    def encode(self, texts: List[str], normalize_embeddings: bool = True) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        encodings = self._tokenizer.encode_batch(list(texts))
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        hidden = self._session.run(None, {k: v for k, v in feeds.items() if k in self._input_names})[0]
+        # Mean pooling sobre los tokens reales (el pooling de e5 en sentence-transformers)
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if normalize_embeddings:
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32, copy=False)
+
+
+def encoder_id(settings: Any, model_name: str) -> str:
+    """Identificador del espacio vectorial: los vectores int8 no se mezclan con los de PyTorch"""
+    if settings.embedding_backend != "onnx":
+        return model_name
+    return f"{model_name}@onnx-int8" if settings.embedding_onnx_quantized else f"{model_name}@onnx"
+
+
+def build_encoder(settings: Any, model_name: str, backend: Optional[str] = None):
+    """Construye el codificador indicado en la configuración (embedding_backend)"""
+    backend = backend or settings.embedding_backend
+    if backend == "onnx":
+        model_dir = settings.embedding_onnx_path or os.path.join(
+            "models", model_name.replace("/", "__") + "-onnx")
+        return OnnxEncoder(
+            model_dir,
+            quantized=settings.embedding_onnx_quantized,
+            threads=settings.embedding_onnx_threads,
+        )
+    if backend != "sentence_transformers":
+        logger.warning(f"⚠️ Backend de embeddings desconocido '{backend}', usando sentence_transformers")
+    return SentenceTransformerEncoder(model_name)
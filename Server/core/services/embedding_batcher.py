@@ -0,0 +1,105 @@
+"""
+Embedding Batcher - Micro-batching de embeddings concurrentes
+Las peticiones que llegan a la vez (desde hilos o desde el event loop) se agrupan durante
+unos milisegundos o hasta max_batch textos y se codifican en una sola pasada del modelo;
+cada llamador recibe solo su vector
+"""
+
+import time
+import queue
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """Cola + hilo trabajador: agrupa hasta max_batch textos o max_wait_ms y llama a encode_fn una vez"""
+
+    def __init__(self, encode_fn: Callable[[List[str], str], List[Any]], max_batch: int = 32,
+                 max_wait_ms: float = 5.0):
+        self._encode_fn = encode_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue[Tuple[str, str, Future]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "batches": 0, "encoded": 0, "deduplicated": 0, "errors": 0,
+                       "max_batch_seen": 0}
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            with self._lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._worker.start()
+
+    def submit(self, text: str, text_type: str = "query") -> Future:
+        future: Future = Future()
+        with self._lock:
+            self._stats["requests"] += 1
+        self._ensure_worker()
+        self._queue.put((text, text_type, future))
+        return future
+
+    def embed(self, text: str, text_type: str = "query", timeout: Optional[float] = None):
+        """Versión bloqueante (para llamadores en hilos)"""
+        return self.submit(text, text_type).result(timeout=timeout)
+
+    async def aembed(self, text: str, text_type: str = "query"):
+        """Versión async: espera el lote sin ocupar un hilo del pool"""
+        return await asyncio.wrap_future(self.submit(text, text_type))
+
+    def _collect(self) -> List[Tuple[str, str, Future]]:
+        """Bloquea hasta el primer elemento y sigue recogiendo hasta llenar el lote o agotar la espera"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            by_type: Dict[str, Dict[str, List[Future]]] = {}
+            for text, text_type, future in batch:
+                if future.set_running_or_notify_cancel():
+                    by_type.setdefault(text_type, {}).setdefault(text, []).append(future)
+
+            for text_type, waiters in by_type.items():
+                texts = list(waiters.keys())
+                try:
+                    vectors = self._encode_fn(texts, text_type)
+                    if len(vectors) != len(texts):
+                        raise RuntimeError(f"encode devolvió {len(vectors)} vectores para {len(texts)} textos")
+                except Exception as e:
+                    with self._lock:
+                        self._stats["errors"] += 1
+                    for futures in waiters.values():
+                        for future in futures:
+                            future.set_exception(e)
+                    continue
+                for text, vector in zip(texts, vectors):
+                    for future in waiters[text]:
+                        future.set_result(vector)
+                with self._lock:
+                    self._stats["batches"] += 1
+                    self._stats["encoded"] += len(texts)
+                    self._stats["deduplicated"] += sum(len(f) for f in waiters.values()) - len(texts)
+                    self._stats["max_batch_seen"] = max(self._stats["max_batch_seen"], len(texts))
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["avg_batch_size"] = round(stats["encoded"] / stats["batches"], 2) if stats["batches"] else 0.0
+        stats["queue_depth"] = self._queue.qsize()
+        stats["max_batch"] = self.max_batch
+        stats["max_wait_ms"] = self.max_wait * 1000
+        return stats
@@ -0,0 +1,117 @@
+"""
+Embedding Cache - LRU thread-safe para embeddings
+Clave = (tipo de texto, texto normalizado): sin hashes MD5, una sola normalización por texto.
+Todas las operaciones son O(1) y se cuentan aciertos, fallos, expulsiones y bytes ocupados.
+Los vectores se guardan como arrays NumPy contiguos (float32 o float16) de solo lectura;
+se convierten a listas únicamente en la frontera con el SDK de Pinecone (to_sdk_values)
+"""
+
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+
+EMBEDDING_DTYPES = {"float32": np.float32, "float16": np.float16}
+
+
+def normalize_text(text: str) -> str:
+    """Unicode NFC y espacios colapsados: "Plaza  Mayor\\n" y "Plaza Mayor" comparten entrada"""
+    # is_normalized es mucho más barato que normalize en el caso habitual (texto ya NFC)
+    if not unicodedata.is_normalized("NFC", text):
+        text = unicodedata.normalize("NFC", text)
+    return " ".join(text.split())
+
+
+def cache_key(text: str, text_type: str = "passage") -> Tuple[str, str]:
+    return text_type, normalize_text(text)
+
+
+def resolve_dtype(name: Optional[str]) -> np.dtype:
+    """float32 por defecto; float16 divide la memoria a la mitad a costa de ~3 decimales"""
+    return np.dtype(EMBEDDING_DTYPES.get((name or "float32").lower(), np.float32))
+
+
+def to_vector(values: Sequence[float], dtype: np.dtype = np.dtype(np.float32)) -> np.ndarray:
+    """Copia propia, contiguo y de solo lectura: se comparte entre llamadores sin riesgo"""
+    vector = np.array(values, dtype=dtype, copy=True, order="C")
+    vector.flags.writeable = False
+    return vector
+
+
+def to_sdk_values(values: Optional[Sequence[float]]) -> Optional[list]:
+    """Lista de floats de Python para el SDK de Pinecone (float16 se promociona a float32)"""
+    if values is None:
+        return None
+    if isinstance(values, np.ndarray):
+        return values.astype(np.float32, copy=False).tolist()
+    return list(values)
+
+
+def _nbytes(value: Any) -> int:
+    return int(getattr(value, "nbytes", 0))
+
+
+class EmbeddingCache:
+    """LRU acotado por número de entradas, protegido por un lock"""
+
+    def __init__(self, max_size: int = 1000):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._bytes = 0
+
+    def get(self, key: Hashable, count_miss: bool = True) -> Optional[Any]:
+        """count_miss=False para consultas previas que, si fallan, repetirá el camino normal"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                if count_miss:
+                    self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is not None:
+                self._bytes -= _nbytes(previous)
+                self._entries.move_to_end(key)
+            self._entries[key] = value
+            self._bytes += _nbytes(value)
+            while len(self._entries) > self.max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= _nbytes(evicted)
+                self._evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "cache_size": len(self._entries),
+                "max_cache_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": round(self._hits / total, 3) if total else 0.0,
+                # Bytes reales de los vectores (nbytes), no una estimación por str()
+                "memory_bytes": self._bytes,
+                "memory_mb": round(self._bytes / (1024 * 1024), 3),
+            }
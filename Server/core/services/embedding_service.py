@@ -4,15 +4,39 @@ Evita la recarga del modelo en cada request y mantiene caché de embeddings
 """
 
 import os
+import sys
 import logging
+import time
+import asyncio
 import threading
 from typing import List, Dict, Optional, Any
-from functools import lru_cache
-import hashlib
-import json
+
+import numpy as np
+
+# Añadir el directorio raíz al path para importar config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from config import langchain_settings
+
+from Server.core.services.tracing import stage
+from Server.core.services.embedding_batcher import EmbeddingBatcher
+from Server.core.services.embedding_cache import EmbeddingCache, cache_key, resolve_dtype, to_vector
+from Server.core.services.embedding_store import EmbeddingStore
+from Server.core.services.embedding_backends import build_encoder, encoder_id
+from Server.core.services.embedding_sidecar import EmbeddingSidecarClient, SidecarError
 
 logger = logging.getLogger(__name__)
 
+# Estados de carga del modelo local
+MODEL_COLD = "cold"          # nadie ha pedido el modelo todavía
+MODEL_LOADING = "loading"    # cargando en un hilo de fondo
+MODEL_READY = "ready"
+MODEL_FAILED = "failed"      # se reintenta en background pasado embedding_model_retry_s
+
+
+class EmbeddingModelNotReady(RuntimeError):
+    """El modelo se está cargando (o falló): el llamador debe usar su camino sin embeddings"""
+
+
 class EmbeddingService:
     """Servicio singleton para manejar embeddings de forma eficiente"""
     
@@ -33,116 +57,278 @@ class EmbeddingService:
         self._initialized = True
         self._model = None
         self._model_name = os.getenv("PINECONE_EMBEDDING_MODEL", "intfloat/e5-large-v2")
-        self._embedding_cache = {}  # Cache en memoria para embeddings frecuentes
-        self._max_cache_size = 1000
-        self._is_loading = False
+        # LRU en memoria para embeddings frecuentes (compartido entre hilos)
+        self._embedding_cache = EmbeddingCache(langchain_settings.embedding_cache_size)
+        # Vectores como arrays contiguos (4 KB en float32 para 1024 dims, frente a ~33 KB como lista)
+        self._dtype = resolve_dtype(langchain_settings.embedding_dtype)
+        # Máquina de estados de la carga (cold -> loading -> ready | failed)
+        self._state = MODEL_COLD
+        self._load_error: Optional[str] = None
+        self._load_seconds: Optional[float] = None
+        self._failed_at = 0.0
+        self._settled = threading.Event()  # se activa al terminar cada intento de carga
+        
+        # Las consultas concurrentes se codifican juntas en una sola pasada del modelo
+        self._batcher: Optional[EmbeddingBatcher] = None
+        if langchain_settings.embedding_microbatch_enabled:
+            self._batcher = EmbeddingBatcher(
+                lambda texts, text_type: self.generate_embeddings(texts, text_type),
+                max_batch=langchain_settings.embedding_microbatch_max_size,
+                max_wait_ms=langchain_settings.embedding_microbatch_wait_ms,
+            )
         
         # Ajustar modelo si es necesario
         if self._model_name == "llama-text-embed-v2":
             self._model_name = "intfloat/e5-large-v2"
         
+        # Con sidecar, el modelo vive en otro proceso compartido por todos los workers del host
+        self._sidecar: Optional[EmbeddingSidecarClient] = None
+        sidecar_socket = langchain_settings.embedding_sidecar_socket
+        if sidecar_socket:
+            self._sidecar = EmbeddingSidecarClient(
+                sidecar_socket, timeout=langchain_settings.embedding_sidecar_timeout)
+            self._sidecar.refresh_health()
+            logger.info(f"🧩 Embeddings vía sidecar en {sidecar_socket}")
+        
+        # Caché persistente en disco (mmap + SQLite): los arranques en caliente no recodifican
+        self._store: Optional[EmbeddingStore] = None
+        store_path = langchain_settings.embedding_store_path
+        if store_path:
+            try:
+                # Clave por backend además de modelo: int8 y PyTorch no dan exactamente el mismo vector
+                self._store = EmbeddingStore(store_path, encoder_id(langchain_settings, self._model_name))
+                logger.info(f"💾 Caché persistente de embeddings en {store_path} ({len(self._store)} vectores)")
+            except Exception as e:
+                logger.warning(f"⚠️ Caché persistente de embeddings no disponible: {e}")
+        
         logger.info(f"🚀 EmbeddingService inicializado con modelo: {self._model_name}")
     
-    def _get_model(self):
-        """Carga el modelo de embeddings de forma lazy y thread-safe"""
-        if self._model is None:
+    @property
+    def model_name(self) -> str:
+        return self._model_name
+    
+    @property
+    def state(self) -> str:
+        return MODEL_READY if self._model is not None else self._state
+    
+    def start_loading(self) -> str:
+        """
+        Lanza la carga del modelo en un hilo de fondo y vuelve al momento (idempotente).
+        Mientras carga, las peticiones no esperan: reciben EmbeddingModelNotReady y degradan
+        """
+        with self._lock:
+            if self.state in (MODEL_COLD, MODEL_FAILED):
+                self._state = MODEL_LOADING
+                self._settled.clear()
+                threading.Thread(target=self._load_model, name="embedding-model-loader", daemon=True).start()
+        return self.state
+    
+    def _load_model(self):
+        start = time.perf_counter()
+        try:
+            logger.info(f"📥 Cargando modelo de embeddings: {self._model_name}")
+            # SentenceTransformer (PyTorch) u ONNX Runtime int8, según embedding_backend
+            model = build_encoder(langchain_settings, self._model_name)
+            # Una pasada de prueba: la primera inferencia inicializa kernels y buffers
+            model.encode(["passage: test"], normalize_embeddings=True)
+            with self._lock:
+                self._model = model
+                self._state = MODEL_READY
+                self._load_error = None
+                self._load_seconds = round(time.perf_counter() - start, 2)
+            logger.info(f"✅ Modelo de embeddings cargado en {self._load_seconds}s ({model.backend})")
+        except Exception as e:
             with self._lock:
-                if self._model is None and not self._is_loading:
-                    self._is_loading = True
-                    try:
-                        from sentence_transformers import SentenceTransformer
-                        logger.info(f"📥 Cargando modelo de embeddings: {self._model_name}")
-                        self._model = SentenceTransformer(self._model_name)
-                        logger.info("✅ Modelo de embeddings cargado exitosamente")
-                    except Exception as e:
-                        logger.error(f"❌ Error cargando modelo de embeddings: {e}")
-                        self._model = None
-                        raise
-                    finally:
-                        self._is_loading = False
-        return self._model
-    
-    def _get_cache_key(self, text: str, text_type: str = "passage") -> str:
-        """Genera clave única para el caché basada en el texto y tipo"""
-        content = f"{text_type}:{text}"
-        return hashlib.md5(content.encode()).hexdigest()
-    
-    def _manage_cache_size(self):
-        """Gestiona el tamaño del caché eliminando entradas antiguas si es necesario"""
-        if len(self._embedding_cache) > self._max_cache_size:
-            # Eliminar 20% de las entradas más antiguas (FIFO simple)
-            items_to_remove = len(self._embedding_cache) - int(self._max_cache_size * 0.8)
-            keys_to_remove = list(self._embedding_cache.keys())[:items_to_remove]
-            for key in keys_to_remove:
-                del self._embedding_cache[key]
-            logger.info(f"🧹 Cache limpiado: removidas {items_to_remove} entradas")
-    
-    def generate_embeddings(self, texts: List[str], text_type: str = "passage") -> List[List[float]]:
+                self._state = MODEL_FAILED
+                self._load_error = str(e) or type(e).__name__
+                self._failed_at = time.monotonic()
+            logger.error(f"❌ Error cargando modelo de embeddings: {e}")
+        finally:
+            self._settled.set()
+    
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Bloquea hasta que termine la carga en curso (o la lanza); True si el modelo quedó listo"""
+        if self._sidecar is not None and (self._sidecar.healthy or self._sidecar.ping()):
+            return True
+        if self.state == MODEL_READY:
+            return True
+        self.start_loading()
+        self._settled.wait(timeout)
+        return self.state == MODEL_READY
+    
+    def _get_model(self):
+        """
+        Modelo local sin esperar nunca a una carga de fondo: si está cargando (o falló) lanza
+        EmbeddingModelNotReady. En frío (scripts, sin start_loading previo) carga en el acto
+        """
+        if self._model is not None:
+            return self._model
+        state = self.state
+        if state == MODEL_COLD:
+            self.start_loading()
+            self._settled.wait()
+            if self._model is None:
+                raise RuntimeError(self._load_error or "Modelo de embeddings no disponible")
+            return self._model
+        if state == MODEL_FAILED and time.monotonic() - self._failed_at > getattr(
+                langchain_settings, "embedding_model_retry_s", 60.0):
+            self.start_loading()
+        raise EmbeddingModelNotReady(f"Modelo de embeddings no listo ({self.state})")
+    
+    def generate_embeddings(self, texts: List[str], text_type: str = "passage",
+                            raise_errors: bool = False) -> List[np.ndarray]:
         """
         Genera embeddings para una lista de textos con caché automático
         
         Args:
             texts: Lista de textos para generar embeddings
             text_type: Tipo de texto ("passage" para documentos, "query" para consultas)
+            raise_errors: Propagar el error en lugar de devolver [] (el sidecar lo reenvía al cliente)
             
         Returns:
-            Lista de embeddings (vectores)
+            Lista de embeddings (arrays NumPy de solo lectura, compartidos con el caché)
         """
         if not texts:
             return []
         
-        model = self._get_model()
-        if model is None:
-            logger.error("❌ Modelo de embeddings no disponible")
-            return []
-        
-        # Verificar caché para textos ya procesados
-        embeddings = []
-        texts_to_process = []
-        indices_to_process = []
-        
-        for i, text in enumerate(texts):
-            cache_key = self._get_cache_key(text, text_type)
-            if cache_key in self._embedding_cache:
-                embeddings.append(self._embedding_cache[cache_key])
-            else:
-                embeddings.append(None)  # Placeholder
-                texts_to_process.append(text)
-                indices_to_process.append(i)
+        embeddings, texts_to_process, keys_to_process, indices_to_process = self._lookup(texts, text_type)
         
         # Procesar textos no cacheados
         if texts_to_process:
             try:
-                # Preparar textos con prefijo para modelos e5
-                if text_type == "query":
-                    prepared_texts = [f"query: {text}" for text in texts_to_process]
-                else:
-                    prepared_texts = [f"passage: {text}" for text in texts_to_process]
-                
-                # Generar embeddings
-                new_embeddings = model.encode(prepared_texts, normalize_embeddings=True)
-                new_embeddings_list = new_embeddings.tolist() if hasattr(new_embeddings, "tolist") else new_embeddings
+                # Generar embeddings (modelo local o sidecar)
+                with stage("embed_encode"):
+                    new_embeddings = self._encode(texts_to_process, text_type)
+                # Una copia propia por fila: una vista mantendría vivo todo el lote mientras siga en caché
+                new_embeddings_list = [to_vector(row, self._dtype) for row in new_embeddings]
                 
                 # Actualizar caché y resultado
-                for i, (text, embedding) in enumerate(zip(texts_to_process, new_embeddings_list)):
-                    cache_key = self._get_cache_key(text, text_type)
-                    self._embedding_cache[cache_key] = embedding
+                for i, (key, embedding) in enumerate(zip(keys_to_process, new_embeddings_list)):
+                    self._embedding_cache.put(key, embedding)
                     embeddings[indices_to_process[i]] = embedding
-                
-                # Gestionar tamaño del caché
-                self._manage_cache_size()
+                self._to_store(text_type, texts_to_process, new_embeddings_list)
                 
                 logger.info(f"📊 Generados {len(new_embeddings_list)} nuevos embeddings, {len(texts) - len(new_embeddings_list)} desde caché")
                 
+            except EmbeddingModelNotReady as e:
+                if raise_errors:
+                    raise
+                logger.info(f"⏳ {e}: se usa el camino sin embeddings")
+                return []
             except Exception as e:
                 logger.error(f"❌ Error generando embeddings: {e}")
+                if raise_errors:
+                    raise
                 return []
         else:
             logger.info(f"📊 Todos los embeddings ({len(texts)}) obtenidos desde caché")
         
         return embeddings
     
-    def generate_single_embedding(self, text: str, text_type: str = "passage") -> List[float]:
+    def _lookup(self, texts: List[str], text_type: str, use_memory: bool = True):
+        """Resuelve desde caché (LRU y store persistente); devuelve resultados y lo pendiente"""
+        embeddings = []
+        texts_to_process = []
+        keys_to_process = []
+        indices_to_process = []
+        
+        for i, text in enumerate(texts):
+            key = cache_key(text, text_type)
+            cached = self._embedding_cache.get(key) if use_memory else None
+            embeddings.append(cached)  # None = pendiente
+            if cached is None:
+                texts_to_process.append(key[1])
+                keys_to_process.append(key)
+                indices_to_process.append(i)
+        
+        # Segundo nivel: lo que ya se codificó en un arranque anterior (o en otro worker)
+        if texts_to_process and self._store is not None:
+            texts_to_process, keys_to_process, indices_to_process = self._from_store(
+                text_type, texts_to_process, keys_to_process, indices_to_process, embeddings,
+                use_memory=use_memory)
+        return embeddings, texts_to_process, keys_to_process, indices_to_process
+    
+    def generate_embeddings_bulk(self, texts: List[str], text_type: str = "passage", workers: Optional[int] = 1,
+                                 batch_size: Optional[int] = None, progress=None) -> List[np.ndarray]:
+        """
+        Ingesta masiva: lotes ordenados por longitud y, con workers > 1 (o None = núcleos),
+        un pool de procesos. No pasa por el LRU (lo vaciaría); sí lee y escribe el store persistente.
+        Con sidecar se codifica en proceso a través de él. Los textos de lotes fallidos vuelven
+        como vectores vacíos (initialize_madrid_knowledge los salta) y no se guardan
+        """
+        from Server.core.services.bulk_embedding import bulk_encode
+        if not texts:
+            return []
+        embeddings, pending, _, indices = self._lookup(texts, text_type, use_memory=False)
+        encoded = 0
+        if pending:
+            if self._sidecar is not None:
+                workers = 1
+            matrix = bulk_encode(pending, text_type, workers=workers, batch_size=batch_size, progress=progress)
+            ok = [i for i, row in enumerate(matrix) if row.size and not np.isnan(row[0])]
+            for index in indices:
+                embeddings[index] = np.empty(0, dtype=self._dtype)
+            vectors = [to_vector(matrix[i], self._dtype) for i in ok]
+            for i, vector in zip(ok, vectors):
+                embeddings[indices[i]] = vector
+            self._to_store(text_type, [pending[i] for i in ok], vectors)
+            encoded = len(ok)
+        logger.info(f"📊 Ingesta masiva: {encoded}/{len(pending)} codificados, "
+                    f"{len(texts) - len(pending)} desde caché")
+        return embeddings
+    
+    def _encode(self, texts: List[str], text_type: str):
+        """Codifica textos ya normalizados: en el sidecar si está configurado, si no con el modelo local"""
+        if self._sidecar is not None:
+            try:
+                return self._sidecar.encode(texts, text_type)
+            except SidecarError as e:
+                if not langchain_settings.embedding_sidecar_fallback_local:
+                    raise
+                logger.warning(f"⚠️ Sidecar de embeddings no disponible, usando modelo local: {e}")
+        
+        model = self._get_model()
+        # Preparar textos con prefijo para modelos e5
+        if text_type == "query":
+            prepared_texts = [f"query: {text}" for text in texts]
+        else:
+            prepared_texts = [f"passage: {text}" for text in texts]
+        return model.encode(prepared_texts, normalize_embeddings=True)
+    
+    def use_local_model(self):
+        """Fuerza el modelo en proceso (lo usa el propio sidecar, que es quien carga el modelo)"""
+        self._sidecar = None
+    
+    def _from_store(self, text_type, texts, keys, indices, embeddings, use_memory: bool = True):
+        """Rellena desde el store persistente y devuelve solo lo que sigue pendiente"""
+        try:
+            stored = self._store.get_many(text_type, texts)
+        except Exception as e:
+            logger.warning(f"⚠️ Error leyendo el caché persistente de embeddings: {e}")
+            return texts, keys, indices
+        pending = ([], [], [])
+        for text, key, index in zip(texts, keys, indices):
+            row = stored.get(text)
+            if row is None:
+                for bucket, value in zip(pending, (text, key, index)):
+                    bucket.append(value)
+                continue
+            # Las filas float32 son vistas del mmap (sin copia); otro dtype implica convertir
+            embedding = row if row.dtype == self._dtype else to_vector(row, self._dtype)
+            if use_memory:
+                self._embedding_cache.put(key, embedding)
+            embeddings[index] = embedding
+        return pending
+    
+    def _to_store(self, text_type: str, texts: List[str], vectors: List[np.ndarray]):
+        if self._store is None:
+            return
+        try:
+            self._store.put_many(text_type, list(zip(texts, vectors)))
+        except Exception as e:
+            logger.warning(f"⚠️ Error guardando embeddings en el caché persistente: {e}")
+    
+    def generate_single_embedding(self, text: str, text_type: str = "passage") -> np.ndarray:
         """
         Genera embedding para un solo texto
         
@@ -151,49 +337,112 @@ class EmbeddingService:
             text_type: Tipo de texto ("passage" o "query")
             
         Returns:
-            Vector de embedding
+            Vector de embedding (vacío si no se pudo generar)
         """
         embeddings = self.generate_embeddings([text], text_type)
-        return embeddings[0] if embeddings else []
+        return embeddings[0] if embeddings else np.empty(0, dtype=self._dtype)
+    
+    def _cached(self, text: str, text_type: str):
+        return self._embedding_cache.get(cache_key(text, text_type), count_miss=False)
     
-    def generate_query_embedding(self, query: str) -> List[float]:
-        """Genera embedding específicamente para consultas"""
-        return self.generate_single_embedding(query, "query")
+    def _unavailable(self) -> bool:
+        """Sin sidecar y con el modelo aún no listo: mejor no encolar en el batcher"""
+        return self._sidecar is None and not self.is_available()
     
-    def generate_passage_embeddings(self, passages: List[str]) -> List[List[float]]:
+    def generate_query_embedding(self, query: str) -> np.ndarray:
+        """Genera embedding específicamente para consultas (micro-batching con otras concurrentes)"""
+        if self._batcher is None:
+            return self.generate_single_embedding(query, "query")
+        cached = self._cached(query, "query")
+        if cached is not None:
+            return cached
+        if self._unavailable():
+            return np.empty(0, dtype=self._dtype)
+        try:
+            return self._batcher.embed(query, "query")
+        except Exception as e:
+            logger.error(f"❌ Error generando embedding de consulta: {e}")
+            return np.empty(0, dtype=self._dtype)
+    
+    async def agenerate_query_embedding(self, query: str) -> np.ndarray:
+        """Como generate_query_embedding, pero espera el lote sin bloquear un hilo"""
+        if self._batcher is None:
+            return await asyncio.to_thread(self.generate_single_embedding, query, "query")
+        cached = self._cached(query, "query")
+        if cached is not None:
+            return cached
+        if self._unavailable():
+            return np.empty(0, dtype=self._dtype)
+        try:
+            return await self._batcher.aembed(query, "query")
+        except Exception as e:
+            logger.error(f"❌ Error generando embedding de consulta: {e}")
+            return np.empty(0, dtype=self._dtype)
+    
+    def generate_passage_embeddings(self, passages: List[str]) -> List[np.ndarray]:
         """Genera embeddings específicamente para pasajes/documentos"""
         return self.generate_embeddings(passages, "passage")
     
     def is_available(self) -> bool:
-        """Verifica si el servicio de embeddings está disponible"""
-        try:
-            return self._get_model() is not None
-        except Exception:
+        """
+        Verifica si el servicio de embeddings está disponible, sin bloquear: si el modelo
+        está en frío lanza su carga en background y responde False hasta que esté listo.
+        Con sidecar usa su salud cacheada: nunca hace I/O de socket en el camino de la petición
+        """
+        if self._sidecar is not None and self._sidecar.healthy:
+            return True
+        if self._sidecar is not None and not langchain_settings.embedding_sidecar_fallback_local:
             return False
+        if self.state == MODEL_COLD:
+            self.start_loading()
+        return self.state == MODEL_READY
+    
+    def get_readiness(self) -> Dict[str, Any]:
+        """Estado de la carga para health checks (no bloquea)"""
+        sidecar_up = self._sidecar is not None and self._sidecar.healthy
+        return {
+            "state": MODEL_READY if sidecar_up else self.state,
+            "ready": sidecar_up or self.state == MODEL_READY,
+            "mode": "sidecar" if self._sidecar is not None else "local",
+            "load_seconds": self._load_seconds,
+            "error": self._load_error,
+        }
     
     def get_cache_stats(self) -> Dict[str, Any]:
         """Obtiene estadísticas del caché"""
         return {
-            "cache_size": len(self._embedding_cache),
-            "max_cache_size": self._max_cache_size,
+            **self._embedding_cache.get_stats(),
             "model_loaded": self._model is not None,
-            "model_name": self._model_name
+            "model_state": self.state,
+            "load_seconds": self._load_seconds,
+            "load_error": self._load_error,
+            "mode": "sidecar" if self._sidecar is not None else "local",
+            "model_name": self._model_name,
+            "backend": getattr(self._model, "backend", langchain_settings.embedding_backend),
+            "dtype": self._dtype.name,
+            "batcher": self._batcher.get_stats() if self._batcher else None,
+            "store": self._store.get_stats() if self._store else None,
+            "sidecar": self._sidecar.get_stats() if self._sidecar else None
         }
     
     def clear_cache(self):
         """Limpia el caché de embeddings"""
-        with self._lock:
-            self._embedding_cache.clear()
+        self._embedding_cache.clear()
         logger.info("🧹 Cache de embeddings limpiado")
     
     def warm_up(self):
-        """Pre-carga el modelo para evitar latencia en el primer request"""
+        """
+        Pre-carga el modelo esperando a que termine (scripts y sidecar); la API usa
+        start_loading() para no bloquear el arranque
+        """
         try:
             logger.info("🔥 Warming up embedding service...")
-            self._get_model()
+            if self._sidecar is None and not self.wait_until_ready():
+                logger.warning(f"⚠️ Embedding service warm up failed: {self._load_error}")
+                return
             # Generar un embedding de prueba para inicializar completamente
             test_embedding = self.generate_single_embedding("test", "passage")
-            if test_embedding:
+            if len(test_embedding):
                 logger.info("✅ Embedding service warmed up successfully")
             else:
                 logger.warning("⚠️ Embedding service warm up failed")
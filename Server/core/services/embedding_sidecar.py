@@ -0,0 +1,282 @@
+"""
+Embedding Sidecar - Un único modelo de embeddings compartido por todos los workers del host
+El sidecar (scripts/embedding_sidecar.py) carga el modelo una vez y atiende peticiones por
+un socket Unix; cada worker de uvicorn usa EmbeddingService como cliente ligero (sin
+modelo, conservando su caché local). Las peticiones de todos los workers pasan por el
+mismo EmbeddingBatcher, así que también se agrupan entre workers.
+
+Protocolo binario (big-endian), una trama por mensaje precedida de su longitud (uint32):
+  petición:  op (uint8: 1=encode, 2=ping) | tipo (uint8: 0=passage, 1=query) | n (uint32)
+             y n veces: longitud (uint32) + texto UTF-8
+  respuesta: estado (uint8: 0=ok, 1=error) | dtype (uint8: 0=float32, 1=float16)
+             | dim (uint32) | n (uint32) y n*dim valores en bruto (orden nativo de NumPy
+             little-endian); en error, el mensaje UTF-8 en lugar de los valores
+"""
+
+import os
+import time
+import socket
+import struct
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from Server.core.services.embedding_batcher import EmbeddingBatcher
+
+logger = logging.getLogger(__name__)
+
+OP_ENCODE = 1
+OP_PING = 2
+TEXT_TYPES = ("passage", "query")
+DTYPES = (np.dtype("<f4"), np.dtype("<f2"))
+
+_LENGTH = struct.Struct("!I")
+_REQUEST = struct.Struct("!BBI")
+_RESPONSE = struct.Struct("!BBII")
+MAX_FRAME = 64 * 1024 * 1024
+
+
+class SidecarError(RuntimeError):
+    """Error devuelto por el sidecar o fallo de comunicación con él"""
+
+
+# ---------- Codificación de tramas ----------
+def encode_request(op: int, text_type: str, texts: List[str]) -> bytes:
+    parts = [_REQUEST.pack(op, TEXT_TYPES.index(text_type), len(texts))]
+    for text in texts:
+        data = text.encode("utf-8")
+        parts.append(_LENGTH.pack(len(data)))
+        parts.append(data)
+    body = b"".join(parts)
+    return _LENGTH.pack(len(body)) + body
+
+
+def decode_request(body: bytes) -> Tuple[int, str, List[str]]:
+    op, type_code, count = _REQUEST.unpack_from(body)
+    offset, texts = _REQUEST.size, []
+    for _ in range(count):
+        (length,) = _LENGTH.unpack_from(body, offset)
+        offset += _LENGTH.size
+        texts.append(body[offset:offset + length].decode("utf-8"))
+        offset += length
+    return op, TEXT_TYPES[type_code], texts
+
+
+def encode_response(vectors: np.ndarray) -> bytes:
+    code = 1 if vectors.dtype == np.float16 else 0
+    matrix = np.ascontiguousarray(vectors, dtype=DTYPES[code])
+    count, dim = matrix.shape if matrix.ndim == 2 else (0, 0)
+    body = _RESPONSE.pack(0, code, dim, count) + matrix.tobytes()
+    return _LENGTH.pack(len(body)) + body
+
+
+def encode_error(message: str) -> bytes:
+    body = _RESPONSE.pack(1, 0, 0, 0) + message.encode("utf-8")
+    return _LENGTH.pack(len(body)) + body
+
+
+def decode_response(body: bytes) -> np.ndarray:
+    status, code, dim, count = _RESPONSE.unpack_from(body)
+    payload = memoryview(body)[_RESPONSE.size:]
+    if status != 0:
+        raise SidecarError(bytes(payload).decode("utf-8", errors="replace"))
+    return np.frombuffer(payload, dtype=DTYPES[code]).reshape(count, dim)
+
+
+# ---------- Cliente (en cada worker) ----------
+class EmbeddingSidecarClient:
+    """
+    Cliente bloqueante: una conexión por hilo, reconexión transparente una vez
+    La salud del sidecar (healthy) sale del resultado de cada petición y de un ping cacheado
+    health_ttl segundos que se refresca en un hilo aparte: consultarla nunca toca el socket
+    """
+
+    def __init__(self, socket_path: str, timeout: float = 30.0, health_ttl: float = 2.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.health_ttl = health_ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._healthy: Optional[bool] = None  # None = aún sin comprobar
+        self._checked_at = 0.0
+        self._refreshing = False
+        self._stats = {"requests": 0, "texts": 0, "errors": 0, "reconnects": 0, "total_ms": 0.0}
+
+    def _connection(self) -> socket.socket:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.settimeout(self.timeout)
+            conn.connect(self.socket_path)
+            self._local.conn = conn
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    @staticmethod
+    def _recv_exact(conn: socket.socket, size: int) -> bytes:
+        chunks, remaining = [], size
+        while remaining:
+            chunk = conn.recv(min(remaining, 1 << 20))
+            if not chunk:
+                raise ConnectionError("El sidecar cerró la conexión")
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+    def _roundtrip(self, frame: bytes) -> bytes:
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.sendall(frame)
+                (length,) = _LENGTH.unpack(self._recv_exact(conn, _LENGTH.size))
+                body = self._recv_exact(conn, length)
+                self._mark_health(True)
+                return body
+            except socket.timeout as e:
+                # El sidecar recibió la petición pero no responde: reintentar solo duplicaría la espera
+                self._drop_connection()
+                self._mark_health(False)
+                raise SidecarError(f"Sidecar de embeddings sin respuesta en {self.timeout}s") from e
+            except (OSError, ConnectionError) as e:
+                # Conexión caducada (p. ej. el sidecar se reinició): un reintento con socket nuevo
+                self._drop_connection()
+                if attempt:
+                    self._mark_health(False)
+                    raise SidecarError(f"Sidecar de embeddings no disponible en {self.socket_path}: {e}") from e
+                with self._lock:
+                    self._stats["reconnects"] += 1
+        raise SidecarError("unreachable")
+
+    def encode(self, texts: List[str], text_type: str = "passage") -> np.ndarray:
+        start = time.perf_counter()
+        try:
+            vectors = decode_response(self._roundtrip(encode_request(OP_ENCODE, text_type, list(texts))))
+        except Exception:
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["texts"] += len(texts)
+            self._stats["total_ms"] += (time.perf_counter() - start) * 1000
+        return vectors
+
+    def ping(self) -> bool:
+        """Comprobación síncrona (hace I/O): para scripts y arranque, no para peticiones"""
+        try:
+            decode_response(self._roundtrip(encode_request(OP_PING, "passage", [])))
+            return True
+        except Exception:
+            return False
+
+    # ---------- Salud sin I/O ----------
+    def _mark_health(self, healthy: bool):
+        with self._lock:
+            self._healthy = healthy
+            self._checked_at = time.monotonic()
+
+    @property
+    def healthy(self) -> bool:
+        """Último estado conocido; si caducó, lanza un ping en background y no lo espera"""
+        with self._lock:
+            healthy, stale = self._healthy, time.monotonic() - self._checked_at > self.health_ttl
+        if stale:
+            self.refresh_health()
+        return bool(healthy)
+
+    def refresh_health(self):
+        """Ping en un hilo daemon (uno a la vez) que actualiza healthy"""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def _ping():
+            try:
+                self.ping()
+            finally:
+                self._drop_connection()
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=_ping, name="sidecar-health", daemon=True).start()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        total = stats.pop("total_ms")
+        stats["avg_ms"] = round(total / stats["requests"], 2) if stats["requests"] else 0.0
+        stats["socket"] = self.socket_path
+        stats["healthy"] = self._healthy
+        return stats
+
+
+# ---------- Servidor (proceso sidecar) ----------
+class EmbeddingSidecarServer:
+    """Servidor asyncio sobre socket Unix; las peticiones de todos los clientes comparten batcher"""
+
+    def __init__(self, socket_path: str, encode_fn: Callable[[List[str], str], List[Any]],
+                 max_batch: int = 32, max_wait_ms: float = 5.0):
+        self.socket_path = socket_path
+        self.batcher = EmbeddingBatcher(encode_fn, max_batch=max_batch, max_wait_ms=max_wait_ms)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections = 0
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections += 1
+        try:
+            while True:
+                try:
+                    (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+                    if length > MAX_FRAME:
+                        raise ValueError(f"Trama demasiado grande ({length} bytes)")
+                    body = await reader.readexactly(length)
+                except asyncio.IncompleteReadError:
+                    return
+                writer.write(await self._respond(body))
+                await writer.drain()
+        except Exception as e:
+            logger.warning(f"⚠️ Conexión del sidecar cerrada por error: {e}")
+        finally:
+            self._connections -= 1
+            writer.close()
+
+    async def _respond(self, body: bytes) -> bytes:
+        try:
+            op, text_type, texts = decode_request(body)
+            if op == OP_PING or not texts:
+                return encode_response(np.empty((0, 0), dtype=np.float32))
+            vectors = await asyncio.gather(*(self.batcher.aembed(text, text_type) for text in texts))
+            return encode_response(np.stack([np.asarray(v) for v in vectors]))
+        except Exception as e:
+            return encode_error(str(e) or type(e).__name__)
+
+    async def start(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # socket huérfano de una ejecución anterior
+        self._server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        logger.info(f"🧩 Sidecar de embeddings escuchando en {self.socket_path}")
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"connections": self._connections, "batcher": self.batcher.get_stats()}
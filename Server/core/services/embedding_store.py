@@ -0,0 +1,201 @@
+"""
+Embedding Store - Caché persistente de embeddings en disco, compartido entre procesos
+Los vectores viven en una matriz float32 por modelo (<modelo>.f32, solo se añade al final)
+que se abre con mmap en modo lectura: cargar es inmediato, no copia nada y varios workers
+del mismo host comparten las mismas páginas. Un índice SQLite (index.sqlite) traduce
+(modelo, tipo de texto, texto normalizado) -> fila de la matriz.
+
+Escritura: dentro de una transacción BEGIN IMMEDIATE (un solo escritor a la vez entre
+procesos) se añaden las filas nuevas al final del fichero y después se registran en el
+índice; una fila solo es visible cuando su entrada está confirmada. Si un proceso muere
+a mitad, la fila huérfana se ignora y una escritura parcial se trunca en la siguiente
+"""
+
+import os
+import re
+import mmap
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# SQLite admite como mucho 999 parámetros por consulta en versiones antiguas
+_LOOKUP_CHUNK = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS matrices (
+    model TEXT PRIMARY KEY,
+    dimension INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    text_type TEXT NOT NULL,
+    text TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    PRIMARY KEY (model, text_type, text)
+) WITHOUT ROWID;
+"""
+
+
+def _model_slug(model_name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "__", model_name)
+
+
+class EmbeddingStore:
+    """Matriz float32 mapeada en memoria + índice SQLite para un modelo de embeddings"""
+
+    def __init__(self, directory: str, model_name: str):
+        self.directory = directory
+        self.model_name = model_name
+        os.makedirs(directory, exist_ok=True)
+        self.matrix_path = os.path.join(directory, f"{_model_slug(model_name)}.f32")
+        self.index_path = os.path.join(directory, "index.sqlite")
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.index_path, timeout=30, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        row = self._conn.execute("SELECT dimension FROM matrices WHERE model = ?", (model_name,)).fetchone()
+        self.dimension: Optional[int] = row[0] if row else None
+
+        self._matrix: Optional[np.ndarray] = None
+        self._mapped_rows = 0
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "remaps": 0}
+        self._remap()
+
+    # ---------- Lectura ----------
+    def _remap(self):
+        """(Re)abre la matriz con mmap; las vistas ya entregadas siguen apuntando al mapeo anterior"""
+        if not self.dimension or not os.path.exists(self.matrix_path):
+            return
+        row_bytes = self.dimension * 4
+        rows = os.path.getsize(self.matrix_path) // row_bytes
+        if rows == 0 or rows == self._mapped_rows:
+            return
+        with open(self.matrix_path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), rows * row_bytes, access=mmap.ACCESS_READ)
+        self._matrix = np.frombuffer(buffer, dtype=np.float32).reshape(rows, self.dimension)
+        self._mapped_rows = rows
+        self._stats["remaps"] += 1
+
+    def get_many(self, text_type: str, texts: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Devuelve {texto: fila} para los textos ya guardados; las filas son vistas sin copia"""
+        found: Dict[str, int] = {}
+        unique = list(dict.fromkeys(texts))
+        with self._lock:
+            for start in range(0, len(unique), _LOOKUP_CHUNK):
+                chunk = unique[start:start + _LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(self._conn.execute(
+                    f"SELECT text, row FROM embeddings WHERE model = ? AND text_type = ? "
+                    f"AND text IN ({placeholders})",
+                    (self.model_name, text_type, *chunk),
+                ).fetchall())
+            # Otro worker pudo añadir filas desde que mapeamos la matriz
+            if found and max(found.values()) >= self._mapped_rows:
+                self._load_dimension()
+                self._remap()
+            result = {text: self._matrix[row] for text, row in found.items() if row < self._mapped_rows}
+            self._stats["hits"] += len(result)
+            self._stats["misses"] += len(unique) - len(result)
+        return result
+
+    def get(self, text_type: str, text: str) -> Optional[np.ndarray]:
+        return self.get_many(text_type, [text]).get(text)
+
+    def _load_dimension(self):
+        row = self._conn.execute("SELECT dimension FROM matrices WHERE model = ?", (self.model_name,)).fetchone()
+        self.dimension = row[0] if row else None
+
+    # ---------- Escritura (solo al final) ----------
+    def put_many(self, text_type: str, items: Sequence[Tuple[str, Any]]) -> int:
+        """Guarda los vectores que aún no estén en el índice; devuelve cuántas filas se añadieron"""
+        if not items:
+            return 0
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                added = self._append_locked(text_type, items)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._stats["writes"] += added
+        return added
+
+    def _append_locked(self, text_type: str, items: Sequence[Tuple[str, Any]]) -> int:
+        vectors = {text: np.asarray(vector, dtype=np.float32).reshape(-1) for text, vector in items}
+        dimension = len(next(iter(vectors.values())))
+        self._load_dimension()
+        if self.dimension is None:
+            self._conn.execute("INSERT INTO matrices (model, dimension) VALUES (?, ?)", (self.model_name, dimension))
+            self.dimension = dimension
+        elif self.dimension != dimension:
+            raise ValueError(f"Dimensión {dimension} distinta de la guardada ({self.dimension}) para {self.model_name}")
+
+        texts = list(vectors.keys())
+        existing = set()
+        for start in range(0, len(texts), _LOOKUP_CHUNK):
+            chunk = texts[start:start + _LOOKUP_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            existing.update(text for (text,) in self._conn.execute(
+                f"SELECT text FROM embeddings WHERE model = ? AND text_type = ? AND text IN ({placeholders})",
+                (self.model_name, text_type, *chunk),
+            ))
+        new_texts = [text for text in texts if text not in existing]
+        if not new_texts:
+            return 0
+
+        row_bytes = dimension * 4
+        fd = os.open(self.matrix_path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            size = os.fstat(fd).st_size
+            if size % row_bytes:
+                # Fila a medio escribir de un proceso que murió: nunca llegó al índice
+                os.ftruncate(fd, size - size % row_bytes)
+                size -= size % row_bytes
+            first_row = size // row_bytes
+            data = np.stack([vectors[text] for text in new_texts]).tobytes()
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
+
+        self._conn.executemany(
+            "INSERT INTO embeddings (model, text_type, text, row) VALUES (?, ?, ?, ?)",
+            [(self.model_name, text_type, text, first_row + i) for i, text in enumerate(new_texts)],
+        )
+        return len(new_texts)
+
+    # ---------- Estado ----------
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings WHERE model = ?",
+                                      (self.model_name,)).fetchone()[0]
+
+    def get_stats(self) -> Dict[str, Any]:
+        size = os.path.getsize(self.matrix_path) if os.path.exists(self.matrix_path) else 0
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            "path": self.directory,
+            "model": self.model_name,
+            "dimension": self.dimension,
+            "rows": len(self),
+            "mapped_rows": self._mapped_rows,
+            "file_mb": round(size / (1024 * 1024), 3),
+        })
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+            self._matrix = None
+            self._mapped_rows = 0
@@ -1,10 +1,13 @@
 """
 Servicio Groq para el Ratoncito Pérez Digital
 Wrapper para LangChain + Groq con configuración optimizada
+El proveedor real se elige por configuración (llm_backend): Groq o el sustituto local
 """
 
-from typing import Optional, Dict, Any
-from langchain_groq import ChatGroq
+import time
+import asyncio
+import logging
+from typing import Optional, Dict, Any, List
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
 from langchain_core.language_models.chat_models import BaseChatModel
 import sys
@@ -13,6 +16,18 @@ import os
 # Añadir el directorio raíz al path para importar config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 from config import langchain_settings
+from Server.core.services.llm_backends import LLMBackend, GroqBackend, build_backend_pool
+from Server.core.services.llm_router import ModelRouter, PoolEntry
+from Server.core.services.llm_resilience import ResilientInvoker, LLMDeadlineExceeded, policy_from_settings
+from Server.core.services.llm_scheduler import LLMScheduler, LLMOverloaded
+from Server.core.services.tokenizer import tokenizer
+from Server.core.services.usage_tracker import usage_tracker
+
+logger = logging.getLogger(__name__)
+
+# Respuestas de cortesía cuando el LLM no está disponible o falla
+UNAVAILABLE_RESPONSE = "Lo siento, el Ratoncito Pérez está descansando. Intenta de nuevo en un momento 🐭"
+ERROR_RESPONSE = "¡Ups! El Ratoncito Pérez se ha despistado un momento. ¿Puedes repetir tu pregunta? 🐭✨"
 
 
 class GroqService:
@@ -20,41 +35,74 @@ class GroqService:
     
     def __init__(self):
         self.settings = langchain_settings
-        self._llm: Optional[BaseChatModel] = None
+        self.invoker = ResilientInvoker(policy_from_settings(self.settings))
+        self.scheduler = LLMScheduler(
+            max_in_flight=self.settings.llm_max_in_flight,
+            tokens_per_minute=self.settings.llm_tokens_per_minute,
+            max_queue_wait=self.settings.llm_max_queue_wait,
+        )
+        self.router = ModelRouter(
+            primary_model=self.settings.agent_model,
+            routes=self.settings.llm_model_routes,
+            large_prompt_tokens=self.settings.llm_large_prompt_tokens,
+            failure_threshold=self.settings.llm_failure_threshold,
+            cooldown=self.settings.llm_failover_cooldown,
+            prices=self.settings.llm_model_prices,
+        )
         self._initialize_llm()
     
     def _initialize_llm(self) -> None:
-        """Inicializa el modelo LLM de Groq"""
+        """Inicializa el pool de backends LLM configurado (claves x modelos)"""
         try:
-            if not self.settings or not self.settings.validate_groq_key():
-                raise ValueError("API key de Groq no válida")
-            
-            self._llm = ChatGroq(
-                groq_api_key=self.settings.groq_api_key,
-                model_name=self.settings.agent_model,
-                temperature=self.settings.temperature,
-                max_tokens=self.settings.max_tokens,
-                # Optimizaciones para conversaciones familiares
-                top_p=0.9,
-                streaming=False,  # Por ahora sin streaming
-            )
-            
-            print(f"✅ GroqService inicializado - Modelo: {self.settings.agent_model}")
+            self.use_backends(build_backend_pool(self.settings))
+            primary = self.router.primary.backend
+            print(f"✅ GroqService inicializado - Backend: {primary.name} - Modelo: {primary.model} "
+                  f"({len(self.router.entries)} en el pool)")
             
         except Exception as e:
             print(f"❌ Error inicializando Groq: {e}")
-            self._llm = None
+            self.router.set_pool([])
+    
+    def use_backends(self, backends: List[LLMBackend]) -> None:
+        """Sustituye el pool de backends en caliente"""
+        self.router.set_pool(backends, self.scheduler.update_rate_limit)
+    
+    def use_backend(self, backend: Optional[LLMBackend]) -> None:
+        """Sustituye el pool por un único backend (pruebas de carga, tests)"""
+        self.use_backends([backend] if backend is not None else [])
+    
+    @property
+    def backend(self) -> Optional[LLMBackend]:
+        """Backend del modelo principal"""
+        primary = self.router.primary
+        return primary.backend if primary else None
     
     @property
     def llm(self) -> BaseChatModel:
-        """Getter para el modelo LLM"""
-        if self._llm is None:
+        """Getter para el modelo LLM de LangChain (solo con el backend Groq)"""
+        if not isinstance(self.backend, GroqBackend):
             raise RuntimeError("GroqService no está inicializado correctamente")
-        return self._llm
+        return self.backend.llm
     
     def is_available(self) -> bool:
         """Verifica si el servicio está disponible"""
-        return self._llm is not None
+        return self.router.is_available()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Métricas de reintentos, hedging y timeouts, de la cola del scheduler y del enrutado"""
+        backend = self.backend
+        return {
+            "backend": backend.name if backend else None,
+            "model": backend.model if backend else None,
+            **self.invoker.get_stats(),
+            "scheduler": self.scheduler.get_stats(),
+            "routing": self.router.get_stats(),
+        }
+    
+    @staticmethod
+    def is_fallback_response(response: str) -> bool:
+        """Indica si la respuesta es un mensaje de cortesía y no una generación real"""
+        return response in (UNAVAILABLE_RESPONSE, ERROR_RESPONSE)
     
     def create_messages(self, system_prompt: str, user_message: str, 
                        conversation_history: Optional[list] = None) -> list:
@@ -87,6 +135,14 @@ class GroqService:
         
         return messages
     
+    def create_messages_with_history(self, system_prompt: str, user_message: str,
+                                     history_messages: Optional[list] = None) -> list:
+        """
+        Igual que create_messages pero con el historial ya convertido a mensajes LangChain
+        (reutilizados entre turnos por el PromptBuilder)
+        """
+        return [SystemMessage(content=system_prompt), *(history_messages or []), HumanMessage(content=user_message)]
+    
     def create_family_context_messages(self, system_prompt: str, user_message: str,
                                       family_data: Dict[str, Any],
                                       conversation_history: Optional[list] = None) -> list:
@@ -142,26 +198,82 @@ class GroqService:
         
         return "CONTEXTO FAMILIAR:\n" + "\n".join(context_parts) if context_parts else ""
     
-    async def generate_response(self, messages: list) -> str:
+    @staticmethod
+    def _prompt_tokens(messages: list) -> int:
+        return sum(tokenizer.count(getattr(m, "content", "") or "") for m in messages)
+    
+    async def _invoke(self, messages: list, max_tokens: Optional[int], priority: Optional[str],
+                      situation: Optional[str], prompt_tokens: int, tags: Dict[str, Any],
+                      failed: List[PoolEntry]):
+        """
+        Un intento: turno en el scheduler, elección de modelo/clave, registro de salud y de uso.
+        Las entradas de `failed` ya fallaron en esta llamada y el reintento las evita
+        """
+        # Reserva en el presupuesto por minuto: prompt + salida máxima
+        estimated_tokens = prompt_tokens + (max_tokens or self.settings.max_tokens)
+        async with self.scheduler.slot(priority, estimated_tokens) as ticket:
+            entry = self.router.pick(situation, prompt_tokens, exclude=failed)
+            start = time.perf_counter()
+            try:
+                result = await entry.backend.ainvoke(messages, max_tokens=max_tokens)
+            except asyncio.CancelledError:
+                self.router.release(entry)
+                raise
+            except Exception as e:
+                self.router.record_failure(entry, e)
+                failed.append(entry)
+                raise
+            latency = time.perf_counter() - start
+            usage = result.response_metadata.get("token_usage") or {}
+            self.router.record_success(entry, latency, usage)
+            usage_tracker.record(
+                entry.model, usage, latency,
+                self.router.cost(entry.model, usage.get("prompt_tokens", 0) or 0,
+                                 usage.get("completion_tokens", 0) or 0),
+                situation=situation, family_id=tags.get("family_id"), poi_id=tags.get("poi_id"),
+            )
+            ticket.settle(usage.get("total_tokens"))
+            return result
+    
+    async def generate_response(self, messages: list, max_tokens: Optional[int] = None,
+                                priority: Optional[str] = None, situation: Optional[str] = None,
+                                tags: Optional[Dict[str, Any]] = None) -> str:
         """
-        Genera respuesta usando Groq
+        Genera respuesta usando Groq, con reintentos ante 429/5xx, hedging opcional
+        y un deadline global (ver llm_resilience). Cada intento pasa por el scheduler,
+        que limita las llamadas en vuelo y los tokens por minuto
         
         Args:
             messages: Lista de mensajes formateados
+            max_tokens: Límite de tokens de salida para esta llamada (por defecto settings.max_tokens)
+            priority: Tipo de situación para la cola ("poi_arrival" pasa antes que la charla)
+            situation: Tipo de situación para elegir modelo (por defecto priority)
+            tags: family_id y poi_id para el registro de uso
             
         Returns:
             Respuesta del Ratoncito Pérez
         """
         try:
             if not self.is_available():
-                return "Lo siento, el Ratoncito Pérez está descansando. Intenta de nuevo en un momento 🐭"
+                return UNAVAILABLE_RESPONSE
             
-            response = await self._llm.ainvoke(messages)
+            prompt_tokens = self._prompt_tokens(messages)
+            failed: List[PoolEntry] = []
+            response = await self.invoker.run(
+                lambda: self._invoke(messages, max_tokens, priority, situation or priority, prompt_tokens,
+                                     tags or {}, failed)
+            )
             return response.content.strip()
             
+        except LLMOverloaded as e:
+            logger.warning(f"🚦 {e}")
+            return UNAVAILABLE_RESPONSE
+        except LLMDeadlineExceeded as e:
+            logger.warning(f"⏱️ {e}")
+            return ERROR_RESPONSE
         except Exception as e:
-            print(f"❌ Error generando respuesta: {e}")
-            return "¡Ups! El Ratoncito Pérez se ha despistado un momento. ¿Puedes repetir tu pregunta? 🐭✨"
+            logger.error(f"❌ Error generando respuesta: {e}")
+            return ERROR_RESPONSE
     
     def sync_generate_response(self, messages: list) -> str:
         """
@@ -169,14 +281,14 @@ class GroqService:
         """
         try:
             if not self.is_available():
-                return "Lo siento, el Ratoncito Pérez está descansando. Intenta de nuevo en un momento 🐭"
+                return UNAVAILABLE_RESPONSE
             
-            response = self._llm.invoke(messages)
+            response = self.backend.invoke(messages)
             return response.content.strip()
             
         except Exception as e:
             print(f"❌ Error generando respuesta: {e}")
-            return "¡Ups! El Ratoncito Pérez se ha despistado un momento. ¿Puedes repetir tu pregunta? 🐭✨"
+            return ERROR_RESPONSE
 
 
 # Instancia global del servicio
@@ -0,0 +1,357 @@
+"""
+LLM Backends - Interfaz común para proveedores de LLM
+Groq (producción) y un sustituto local determinista para pruebas de carga sin gastar cuota
+"""
+
+import re
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LLMResult:
+    """Respuesta normalizada de cualquier backend"""
+    content: str
+    response_metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+class LLMBackendError(Exception):
+    """Error del proveedor con código HTTP y Retry-After (si lo hay)"""
+
+    def __init__(self, message: str, status_code: int = 500, retry_after: Optional[float] = None,
+                 rate_limit: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.rate_limit = rate_limit or {}
+
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Duraciones de Groq como "7.66s", "2m59.56s" o "120ms" a segundos"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    parts = _DURATION_PART.findall(value)
+    return sum(float(amount) * units[unit] for amount, unit in parts) if parts else None
+
+
+def parse_rate_limit_headers(headers) -> Dict[str, Any]:
+    """Cabeceras x-ratelimit-* (y retry-after) a un dict; vacío si el proveedor no las manda"""
+    info: Dict[str, Any] = {}
+    for field_name in ("limit_requests", "limit_tokens", "remaining_requests", "remaining_tokens"):
+        raw = headers.get(f"x-ratelimit-{field_name.replace('_', '-')}")
+        if raw is not None:
+            try:
+                info[field_name] = int(float(raw))
+            except ValueError:
+                pass
+    for field_name in ("reset_requests", "reset_tokens"):
+        seconds = parse_reset_duration(headers.get(f"x-ratelimit-{field_name.replace('_', '-')}"))
+        if seconds is not None:
+            info[f"{field_name}_s"] = seconds
+    retry_after = parse_reset_duration(headers.get("retry-after"))
+    if retry_after is not None:
+        info["retry_after"] = retry_after
+    return info
+
+
+class LLMBackend(ABC):
+    """Interfaz de backend: mensajes LangChain in, LLMResult out"""
+
+    name = "base"
+
+    def __init__(self, model: str):
+        self.model = model
+        self.key_id = "default"  # clave de API (o instancia) a la que pertenece, para el failover
+        # Recibe el estado de rate limit que anuncia el proveedor (lo usa el scheduler)
+        self.rate_limit_listener: Optional[Callable[[Dict[str, Any]], None]] = None
+
+    def is_available(self) -> bool:
+        return True
+
+    def _report_rate_limit(self, info: Dict[str, Any]):
+        if info and self.rate_limit_listener:
+            try:
+                self.rate_limit_listener(info)
+            except Exception as e:
+                logger.debug(f"Listener de rate limit falló: {e}")
+
+    @abstractmethod
+    async def ainvoke(self, messages: list, max_tokens: Optional[int] = None) -> LLMResult:
+        """Camino de producción (GroqService.generate_response, dentro del event loop)"""
+
+    @abstractmethod
+    def invoke(self, messages: list, max_tokens: Optional[int] = None) -> LLMResult:
+        """Solo síncrono, fuera de cualquier event loop (GroqService.sync_generate_response)"""
+
+
+class GroqBackend(LLMBackend):
+    """Backend real sobre ChatGroq (LangChain)"""
+
+    name = "groq"
+
+    def __init__(self, api_key: str, model: str, temperature: float, max_tokens: int,
+                 base_url: Optional[str] = None, timeout: float = 25.0):
+        super().__init__(model)
+        import httpx
+        from langchain_groq import ChatGroq
+
+        # Los hooks leen las cabeceras x-ratelimit-* de cada respuesta (ChatGroq no las expone)
+        async def _on_async_response(response):
+            self._report_rate_limit(parse_rate_limit_headers(response.headers))
+
+        def _on_response(response):
+            self._report_rate_limit(parse_rate_limit_headers(response.headers))
+
+        kwargs = {"base_url": base_url} if base_url else {}
+        kwargs["http_async_client"] = httpx.AsyncClient(timeout=timeout, event_hooks={"response": [_on_async_response]})
+        kwargs["http_client"] = httpx.Client(timeout=timeout, event_hooks={"response": [_on_response]})
+        self.llm = ChatGroq(
+            groq_api_key=api_key,
+            model_name=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            # Optimizaciones para conversaciones familiares
+            top_p=0.9,
+            streaming=False,  # Por ahora sin streaming
+            # Sin reintentos del SDK: ResilientInvoker gestiona reintentos, Retry-After y deadline
+            max_retries=0,
+            timeout=timeout,
+            **kwargs,
+        )
+
+    @staticmethod
+    def _wrap(response) -> LLMResult:
+        return LLMResult(content=response.content, response_metadata=dict(response.response_metadata or {}))
+
+    @staticmethod
+    def _translate_error(error: Exception) -> Exception:
+        """Convierte errores HTTP del SDK de Groq a LLMBackendError"""
+        status_code = getattr(error, "status_code", None)
+        if status_code is None:
+            return error
+        response = getattr(error, "response", None)
+        rate_limit = parse_rate_limit_headers(response.headers) if response is not None else {}
+        return LLMBackendError(str(error), status_code=status_code, retry_after=rate_limit.get("retry_after"),
+                               rate_limit=rate_limit)
+
+    async def ainvoke(self, messages: list, max_tokens: Optional[int] = None) -> LLMResult:
+        call_kwargs = {"max_tokens": max_tokens} if max_tokens else {}
+        try:
+            return self._wrap(await self.llm.ainvoke(messages, **call_kwargs))
+        except Exception as e:
+            raise self._translate_error(e) from e
+
+    def invoke(self, messages: list, max_tokens: Optional[int] = None) -> LLMResult:
+        call_kwargs = {"max_tokens": max_tokens} if max_tokens else {}
+        try:
+            return self._wrap(self.llm.invoke(messages, **call_kwargs))
+        except Exception as e:
+            raise self._translate_error(e) from e
+
+
+# Frases del sustituto local (respuesta determinista según el mensaje)
+STANDIN_RESPONSES = [
+    "¡Qué buena pregunta, exploradores! Este rincón de Madrid guarda secretos de hace siglos. 🐭✨",
+    "Aquí paseaban reyes y ratoncitos; fijaos en las piedras, ¡cuentan historias! 🐭",
+    "¡Bienvenidos! Este lugar es especial porque por aquí pasa mi ruta mágica de dientes. ✨",
+    "Madrid está llena de sorpresas, y esta es una de mis favoritas. ¿Veis algo curioso? 🐭",
+]
+
+
+@dataclass
+class StandInProfile:
+    """Perfil de comportamiento del sustituto local"""
+    latency_p50: float = 0.4  # segundos hasta el primer token
+    latency_sigma: float = 0.5  # dispersión log-normal
+    tokens_per_second: float = 500.0
+    completion_tokens: int = 60
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    requests_per_minute: int = 0  # 0 = sin límite
+    retry_after: float = 1.0
+    seed: Optional[int] = None
+
+
+class StandInSimulator:
+    """Núcleo del sustituto: latencias, tasas de tokens, errores y 429 configurables"""
+
+    def __init__(self, profile: StandInProfile):
+        self.profile = profile
+        self._random = random.Random(profile.seed)
+        self._lock = threading.Lock()
+        self._recent = deque()
+
+    def _check_rate_limit(self) -> Dict[str, Any]:
+        """Lanza 429/503 si toca; devuelve el estado de rate limit que anunciaría Groq"""
+        profile = self.profile
+        with self._lock:
+            if profile.rate_limit_rate and self._random.random() < profile.rate_limit_rate:
+                raise LLMBackendError("Rate limit reached (simulado)", status_code=429,
+                                      retry_after=profile.retry_after,
+                                      rate_limit={"retry_after": profile.retry_after})
+            rate_limit: Dict[str, Any] = {}
+            if profile.requests_per_minute:
+                now = time.monotonic()
+                while self._recent and now - self._recent[0] > 60:
+                    self._recent.popleft()
+                if len(self._recent) >= profile.requests_per_minute:
+                    retry_after = round(60 - (now - self._recent[0]), 2)
+                    raise LLMBackendError("Rate limit reached (simulado)", status_code=429,
+                                          retry_after=retry_after,
+                                          rate_limit={"limit_requests": profile.requests_per_minute,
+                                                      "remaining_requests": 0, "reset_requests_s": retry_after,
+                                                      "retry_after": retry_after})
+                self._recent.append(now)
+                rate_limit = {
+                    "limit_requests": profile.requests_per_minute,
+                    "remaining_requests": profile.requests_per_minute - len(self._recent),
+                    "reset_requests_s": round(60 - (now - self._recent[0]), 2),
+                }
+            if profile.error_rate and self._random.random() < profile.error_rate:
+                raise LLMBackendError("Internal server error (simulado)", status_code=503)
+            return rate_limit
+
+    def plan(self, prompt_text: str, user_text: str, max_tokens: Optional[int]) -> Dict[str, Any]:
+        """Decide contenido, tokens y duración de la respuesta (lanza LLMBackendError si toca fallar)"""
+        rate_limit = self._check_rate_limit()
+        profile = self.profile
+        digest = int(hashlib.md5(user_text.encode()).hexdigest(), 16)
+        content = STANDIN_RESPONSES[digest % len(STANDIN_RESPONSES)]
+        completion_tokens = min(profile.completion_tokens, max_tokens) if max_tokens else profile.completion_tokens
+        prompt_tokens = max(1, (len(prompt_text) + len(user_text)) // 4)
+        with self._lock:
+            first_token = self._random.lognormvariate(0, profile.latency_sigma) * profile.latency_p50
+        duration = first_token + completion_tokens / profile.tokens_per_second
+        return {
+            "content": content,
+            "duration": duration,
+            "rate_limit": rate_limit,
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+
+class LocalStandInBackend(LLMBackend):
+    """Sustituto en proceso de Groq para pruebas de carga offline"""
+
+    name = "local"
+
+    def __init__(self, model: str, profile: Optional[StandInProfile] = None):
+        super().__init__(model)
+        self.simulator = StandInSimulator(profile or StandInProfile())
+
+    @staticmethod
+    def _split(messages: list):
+        contents = [getattr(m, "content", m.get("content", "") if isinstance(m, dict) else str(m)) for m in messages]
+        return "\n".join(contents[:-1]), contents[-1] if contents else ""
+
+    def _result(self, plan: Dict[str, Any]) -> LLMResult:
+        return LLMResult(
+            content=plan["content"],
+            response_metadata={
+                "model_name": self.model,
+                "token_usage": plan["usage"],
+                "finish_reason": "stop",
+                "backend": self.name,
+            },
+        )
+
+    def _plan(self, messages: list, max_tokens: Optional[int]) -> Dict[str, Any]:
+        try:
+            plan = self.simulator.plan(*self._split(messages), max_tokens)
+        except LLMBackendError as e:
+            self._report_rate_limit(e.rate_limit)
+            raise
+        self._report_rate_limit(plan["rate_limit"])
+        return plan
+
+    async def ainvoke(self, messages: list, max_tokens: Optional[int] = None) -> LLMResult:
+        plan = self._plan(messages, max_tokens)
+        await asyncio.sleep(plan["duration"])
+        return self._result(plan)
+
+    def invoke(self, messages: list, max_tokens: Optional[int] = None) -> LLMResult:
+        plan = self._plan(messages, max_tokens)
+        time.sleep(plan["duration"])
+        return self._result(plan)
+
+
+def standin_profile_from_settings(settings) -> StandInProfile:
+    return StandInProfile(
+        latency_p50=settings.llm_standin_latency_p50,
+        latency_sigma=settings.llm_standin_latency_sigma,
+        tokens_per_second=settings.llm_standin_tokens_per_second,
+        error_rate=settings.llm_standin_error_rate,
+        rate_limit_rate=settings.llm_standin_rate_limit_rate,
+        requests_per_minute=settings.llm_standin_requests_per_minute,
+        seed=settings.llm_standin_seed,
+    )
+
+
+def build_backend(settings, model: Optional[str] = None, api_key: Optional[str] = None) -> LLMBackend:
+    """
+    Construye el backend según settings.llm_backend (LLM_BACKEND): "groq" (por defecto) o "local"
+    """
+    backend_name = settings.llm_backend.lower()
+    model = model or settings.agent_model
+
+    if backend_name == "local":
+        backend = LocalStandInBackend(model, standin_profile_from_settings(settings))
+        backend.key_id = "local"
+        return backend
+
+    if not settings.validate_groq_key():
+        raise ValueError("API key de Groq no válida")
+    return GroqBackend(
+        api_key=api_key or settings.groq_api_key,
+        model=model,
+        temperature=settings.temperature,
+        max_tokens=settings.max_tokens,
+        base_url=settings.groq_base_url,
+        timeout=settings.llm_deadline,
+    )
+
+
+def build_backend_pool(settings) -> List[LLMBackend]:
+    """
+    Un backend por cada combinación clave x modelo: el modelo principal más los de
+    llm_model_routes, con groq_api_key y las claves extra de groq_api_keys (separadas por comas)
+    """
+    primary = settings.agent_model
+    routes = settings.llm_model_routes
+    models = list(dict.fromkeys([primary, *routes.values()]))
+
+    backend_name = settings.llm_backend.lower()
+    if backend_name == "local":
+        return [build_backend(settings, model=model) for model in models]
+
+    extra_keys = [k.strip() for k in (settings.groq_api_keys or "").split(",") if k.strip()]
+    keys = list(dict.fromkeys([settings.groq_api_key, *extra_keys]))
+    pool = []
+    for index, api_key in enumerate(keys):
+        for model in models:
+            backend = build_backend(settings, model=model, api_key=api_key)
+            backend.key_id = f"key{index}"
+            pool.append(backend)
+    return pool
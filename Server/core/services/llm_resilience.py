@@ -0,0 +1,207 @@
+"""
+LLM Resilience - Reintentos, backoff y peticiones hedged para las llamadas al LLM
+Los 429/5xx transitorios se reintentan con backoff exponencial con jitter (respetando
+Retry-After), una petición lenta puede duplicarse tras el p95 observado (gana la primera)
+y todo el intento queda acotado por un deadline global
+"""
+
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from Server.core.services.llm_backends import LLMBackendError
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class LLMDeadlineExceeded(Exception):
+    """No se obtuvo respuesta del LLM dentro del deadline global"""
+
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 3
+    backoff_base: float = 0.5  # segundos, se duplica en cada reintento
+    backoff_max: float = 8.0
+    deadline: float = 25.0  # segundos para toda la llamada (reintentos incluidos)
+    hedge_enabled: bool = False
+    hedge_delay: Optional[float] = None  # None = p95 de las latencias observadas
+    hedge_min_delay: float = 1.0
+    hedge_min_samples: int = 20
+
+
+def policy_from_settings(settings) -> RetryPolicy:
+    return RetryPolicy(
+        max_attempts=settings.llm_max_attempts,
+        backoff_base=settings.llm_backoff_base,
+        backoff_max=settings.llm_backoff_max,
+        deadline=settings.llm_deadline,
+        hedge_enabled=settings.llm_hedge_enabled,
+        hedge_delay=settings.llm_hedge_delay,
+        hedge_min_delay=settings.llm_hedge_min_delay,
+    )
+
+
+def is_retryable(error: BaseException) -> bool:
+    """429 y 5xx del proveedor, timeouts y errores de conexión"""
+    if isinstance(error, LLMBackendError):
+        return error.status_code in RETRYABLE_STATUS
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    name = type(error).__name__
+    return "Connection" in name or "Timeout" in name
+
+
+class ResilientInvoker:
+    """Ejecuta una llamada al LLM con reintentos, hedging y deadline, y lleva las métricas"""
+
+    def __init__(self, policy: Optional[RetryPolicy] = None, latency_window: int = 200):
+        self.policy = policy or RetryPolicy()
+        self._latencies: deque = deque(maxlen=latency_window)
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "attempts": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "hedges_fired": 0,
+            "hedges_won": 0,
+            "timeouts": 0,
+        }
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _observe(self, duration: float):
+        with self._lock:
+            self._latencies.append(duration)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Espera antes de lanzar la petición duplicada (None = sin hedging todavía)"""
+        if not self.policy.hedge_enabled:
+            return None
+        if self.policy.hedge_delay is not None:
+            return self.policy.hedge_delay
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < self.policy.hedge_min_samples:
+            return None
+        p95 = samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))]
+        return max(self.policy.hedge_min_delay, p95)
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        """Backoff exponencial con jitter completo; Retry-After marca el mínimo"""
+        ceiling = min(self.policy.backoff_max, self.policy.backoff_base * (2 ** attempt))
+        delay = random.uniform(0, ceiling)
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after:
+            delay = retry_after + random.uniform(0, self.policy.backoff_base)
+        return delay
+
+    async def _timed(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        self._count("attempts")
+        start = time.perf_counter()
+        result = await call()
+        self._observe(time.perf_counter() - start)
+        return result
+
+    async def _hedged(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Una petición y, si tarda más del retardo de hedge, una segunda; gana la primera que acierte"""
+        primary = asyncio.ensure_future(self._timed(call))
+        tasks = [primary]
+        try:
+            delay = self.hedge_delay()
+            if delay is None:
+                return await primary
+
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return primary.result()
+
+            self._count("hedges_fired")
+            hedge = asyncio.ensure_future(self._timed(call))
+            tasks.append(hedge)
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._count("hedges_won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # La perdedora (o todas si vence el deadline) se cancela
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def run(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Ejecuta `call` (que crea una petición nueva en cada invocación)
+        Lanza LLMDeadlineExceeded si se agota el deadline; si no, el último error del proveedor
+        """
+        self._count("calls")
+        deadline_at = time.monotonic() + self.policy.deadline
+        attempt = 0
+        while True:
+            remaining = deadline_at - time.monotonic()
+            try:
+                result = await asyncio.wait_for(self._hedged(call), timeout=remaining)
+                self._count("successes")
+                return result
+            except asyncio.TimeoutError as e:
+                if time.monotonic() >= deadline_at:
+                    self._count("timeouts")
+                    self._count("failures")
+                    raise LLMDeadlineExceeded(f"Sin respuesta del LLM en {self.policy.deadline}s") from e
+                error: BaseException = e
+            except Exception as e:
+                error = e
+
+            if isinstance(error, LLMBackendError) and error.status_code == 429:
+                self._count("rate_limited")
+            attempt += 1
+            if attempt >= self.policy.max_attempts or not is_retryable(error):
+                self._count("failures")
+                raise error
+
+            delay = self.backoff(attempt - 1, error)
+            if time.monotonic() + delay >= deadline_at:
+                # Esperar a Retry-After agotaría el deadline: mejor fallar ya
+                self._count("timeouts")
+                self._count("failures")
+                raise LLMDeadlineExceeded(f"Reintento en {delay:.1f}s excede el deadline") from error
+            self._count("retries")
+            logger.info(f"🔁 Reintento {attempt} del LLM en {delay:.2f}s tras: {error}")
+            await asyncio.sleep(delay)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        hedge_delay = self.hedge_delay()
+        return {
+            **stats,
+            "hedge_enabled": self.policy.hedge_enabled,
+            "hedge_delay_s": round(hedge_delay, 3) if hedge_delay is not None else None,
+            "max_attempts": self.policy.max_attempts,
+            "deadline_s": self.policy.deadline,
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            for key in self._stats:
+                self._stats[key] = 0
+            self._latencies.clear()
@@ -0,0 +1,252 @@
+"""
+LLM Router - Elección de modelo y clave por llamada con seguimiento de salud
+La tabla de rutas asigna un modelo a cada tipo de situación (la charla general puede ir a
+un modelo pequeño y rápido); los prompts grandes vuelven al modelo principal. Entre las
+entradas del pool (clave x modelo) se elige la más rápida y sana, y se salta a otra si una
+empieza a fallar o a ir lenta. Latencia y coste por modelo quedan medidos para ajustar la tabla
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from Server.core.services.llm_backends import LLMBackend, LLMBackendError
+
+logger = logging.getLogger(__name__)
+
+# USD por millón de tokens (entrada, salida). Orientativo: revisar con la tarifa vigente de Groq
+DEFAULT_MODEL_PRICES = {
+    "openai/gpt-oss-120b": (0.15, 0.60),
+    "openai/gpt-oss-20b": (0.075, 0.30),
+    "llama-3.1-8b-instant": (0.05, 0.08),
+}
+
+
+class PoolEntry:
+    """Un backend (modelo + clave) con su salud y sus contadores"""
+
+    def __init__(self, backend: LLMBackend, key_id: str, latency_window: int = 200):
+        self.backend = backend
+        self.key_id = key_id
+        self.model = backend.model
+        self.ewma_latency: Optional[float] = None
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.in_flight = 0
+        self.latencies: deque = deque(maxlen=latency_window)
+        self.counters = {"calls": 0, "errors": 0, "rate_limited": 0, "prompt_tokens": 0,
+                         "completion_tokens": 0, "cost_usd": 0.0}
+
+    @property
+    def name(self) -> str:
+        return f"{self.model}@{self.key_id}"
+
+    def is_healthy(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+
+class ModelRouter:
+    """Pool de backends con tabla de rutas por situación y failover por salud y latencia"""
+
+    def __init__(self, primary_model: str, routes: Optional[Dict[str, str]] = None,
+                 large_prompt_tokens: int = 1500, failure_threshold: int = 3, cooldown: float = 30.0,
+                 slow_factor: float = 3.0, prices: Optional[Dict[str, tuple]] = None):
+        self.primary_model = primary_model
+        self.routes = dict(routes or {})
+        self.large_prompt_tokens = large_prompt_tokens
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.slow_factor = slow_factor
+        self.prices = {**DEFAULT_MODEL_PRICES, **(prices or {})}
+        self._entries: List[PoolEntry] = []
+        self._lock = threading.Lock()
+        self._routed: Dict[str, Dict[str, int]] = {}
+        self._failovers = 0
+
+    # === Pool ===
+
+    def set_pool(self, backends: List[LLMBackend],
+                 rate_limit_listener: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """
+        Sustituye el pool. El estado de rate limit de cada clave se lleva aquí; solo con una
+        clave se reenvía al scheduler (con varias, una clave agotada no debe frenar a las demás)
+        """
+        entries = [PoolEntry(backend, getattr(backend, "key_id", "default")) for backend in backends]
+        single_key = len({entry.key_id for entry in entries}) <= 1
+        for entry in entries:
+            entry.backend.rate_limit_listener = self._listener(entry, rate_limit_listener if single_key else None)
+        with self._lock:
+            self._entries = entries
+
+    def _listener(self, entry: PoolEntry, forward: Optional[Callable[[Dict[str, Any]], None]]):
+        def on_rate_limit(info: Dict[str, Any]):
+            if info.get("remaining_requests") == 0 and info.get("reset_requests_s"):
+                self._cool_down(entry, info["reset_requests_s"])
+            if forward:
+                forward(info)
+        return on_rate_limit
+
+    @property
+    def entries(self) -> List[PoolEntry]:
+        return list(self._entries)
+
+    @property
+    def models(self) -> List[str]:
+        """Modelo principal y los de la tabla de rutas, sin repetir"""
+        return list(dict.fromkeys([self.primary_model, *self.routes.values()]))
+
+    @property
+    def primary(self) -> Optional[PoolEntry]:
+        entries = self._entries
+        return next((e for e in entries if e.model == self.primary_model), entries[0] if entries else None)
+
+    def is_available(self) -> bool:
+        return any(entry.backend.is_available() for entry in self._entries)
+
+    # === Selección ===
+
+    def target_model(self, situation: Optional[str], prompt_tokens: int = 0) -> str:
+        """Modelo según la tabla de rutas; los prompts grandes van siempre al principal"""
+        if prompt_tokens > self.large_prompt_tokens:
+            return self.primary_model
+        return self.routes.get(situation or "", self.primary_model)
+
+    def _score(self, entry: PoolEntry, fastest: float) -> float:
+        latency = entry.ewma_latency if entry.ewma_latency is not None else fastest
+        # Cada fallo seguido pesa aunque no llegue al umbral del cooldown
+        penalty = (1.0 + entry.in_flight) * (1 + entry.consecutive_failures)
+        # Una entrada mucho más lenta que la mejor del mismo modelo se trata como degradada
+        if fastest and latency > fastest * self.slow_factor:
+            penalty *= 10
+        return latency * penalty
+
+    def pick(self, situation: Optional[str], prompt_tokens: int = 0,
+             exclude: Optional[List[PoolEntry]] = None) -> PoolEntry:
+        """
+        Mejor entrada sana del modelo objetivo; si no hay, del principal; si no, cualquiera.
+        `exclude` son las entradas que ya fallaron en esta llamada: el reintento va a otra
+        clave u otro modelo, y solo vuelve a ellas si no queda nada más
+        """
+        target = self.target_model(situation, prompt_tokens)
+        now = time.monotonic()
+        with self._lock:
+            if not self._entries:
+                raise LLMBackendError("No hay backends LLM configurados", status_code=503)
+            healthy = [e for e in self._entries if e.is_healthy(now)]
+            untried = [e for e in healthy if not exclude or e not in exclude]
+            chosen = None
+            for pool in (untried, healthy):
+                for model in (target, self.primary_model):
+                    candidates = [e for e in pool if e.model == model]
+                    if candidates:
+                        known = [e.ewma_latency for e in candidates if e.ewma_latency is not None]
+                        fastest = min(known) if known else 0.0
+                        chosen = min(candidates, key=lambda e: self._score(e, fastest))
+                        break
+                if chosen is not None:
+                    break
+            if chosen is None:
+                # Todo en cooldown: la que antes salga de él
+                pool = healthy or sorted(self._entries, key=lambda e: e.cooldown_until)
+                chosen = pool[0]
+            if chosen.model != target:
+                self._failovers += 1
+            routed = self._routed.setdefault(situation or "unknown", {})
+            routed[chosen.model] = routed.get(chosen.model, 0) + 1
+            chosen.in_flight += 1
+        return chosen
+
+    # === Resultados ===
+
+    def _cool_down(self, entry: PoolEntry, seconds: float):
+        with self._lock:
+            entry.cooldown_until = max(entry.cooldown_until, time.monotonic() + seconds)
+        logger.warning(f"🧊 {entry.name} en pausa {seconds:.1f}s")
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        price_in, price_out = self.prices.get(model, (0.0, 0.0))
+        return (prompt_tokens * price_in + completion_tokens * price_out) / 1_000_000
+
+    def record_success(self, entry: PoolEntry, latency: float, usage: Optional[Dict[str, Any]] = None):
+        usage = usage or {}
+        prompt_tokens = usage.get("prompt_tokens", 0) or 0
+        completion_tokens = usage.get("completion_tokens", 0) or 0
+        with self._lock:
+            entry.in_flight = max(0, entry.in_flight - 1)
+            entry.consecutive_failures = 0
+            entry.latencies.append(latency)
+            entry.ewma_latency = latency if entry.ewma_latency is None else 0.8 * entry.ewma_latency + 0.2 * latency
+            counters = entry.counters
+            counters["calls"] += 1
+            counters["prompt_tokens"] += prompt_tokens
+            counters["completion_tokens"] += completion_tokens
+            counters["cost_usd"] += self.cost(entry.model, prompt_tokens, completion_tokens)
+
+    def record_failure(self, entry: PoolEntry, error: BaseException):
+        """429: pausa la clave lo que diga Retry-After; errores repetidos: pausa la entrada"""
+        cooldown = None
+        with self._lock:
+            entry.in_flight = max(0, entry.in_flight - 1)
+            entry.counters["calls"] += 1
+            entry.counters["errors"] += 1
+            if isinstance(error, LLMBackendError) and error.status_code == 429:
+                entry.counters["rate_limited"] += 1
+                cooldown = error.retry_after or self.cooldown / 3
+            else:
+                entry.consecutive_failures += 1
+                if entry.consecutive_failures >= self.failure_threshold:
+                    cooldown = self.cooldown
+                    entry.consecutive_failures = 0
+        if cooldown:
+            self._cool_down(entry, cooldown)
+
+    def release(self, entry: PoolEntry):
+        """La llamada se abandonó sin resultado (cancelada por hedging o deadline)"""
+        with self._lock:
+            entry.in_flight = max(0, entry.in_flight - 1)
+
+    # === Estadísticas ===
+
+    @staticmethod
+    def _percentile(sorted_values: list, pct: float) -> float:
+        if not sorted_values:
+            return 0.0
+        index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+        return round(sorted_values[index] * 1000, 1)
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            models: Dict[str, Dict[str, Any]] = {}
+            for entry in self._entries:
+                model = models.setdefault(entry.model, {"calls": 0, "errors": 0, "rate_limited": 0,
+                                                        "prompt_tokens": 0, "completion_tokens": 0,
+                                                        "cost_usd": 0.0, "_latencies": []})
+                for key, value in entry.counters.items():
+                    model[key] += value
+                model["_latencies"].extend(entry.latencies)
+            for model in models.values():
+                latencies = sorted(model.pop("_latencies"))
+                model["cost_usd"] = round(model["cost_usd"], 6)
+                model["latency_p50_ms"] = self._percentile(latencies, 50)
+                model["latency_p95_ms"] = self._percentile(latencies, 95)
+            return {
+                "primary_model": self.primary_model,
+                "routes": dict(self.routes),
+                "large_prompt_tokens": self.large_prompt_tokens,
+                "failovers": self._failovers,
+                "routed": {k: dict(v) for k, v in self._routed.items()},
+                "models": models,
+                "pool": [
+                    {
+                        "name": entry.name,
+                        "healthy": entry.is_healthy(now),
+                        "cooldown_s": round(max(0.0, entry.cooldown_until - now), 1),
+                        "ewma_latency_ms": round(entry.ewma_latency * 1000, 1) if entry.ewma_latency else None,
+                        "in_flight": entry.in_flight,
+                    }
+                    for entry in self._entries
+                ],
+            }
@@ -0,0 +1,245 @@
+"""
+LLM Scheduler - Cola con prioridad y control de admisión para las llamadas al LLM
+Limita las peticiones en vuelo y el consumo de tokens por minuto (sincronizado con las
+cabeceras x-ratelimit-* del proveedor), atiende primero lo que la familia está esperando
+(llegada a un POI) y rechaza pronto lo que no podría salir de la cola a tiempo
+"""
+
+import time
+import heapq
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Menor número = más prioridad. Lo no listado cae en DEFAULT_PRIORITY
+PRIORITIES = {
+    "poi_arrival": 0,
+    "location_question": 1,
+    "poi_question": 1,
+    "general_conversation": 2,
+    "offline": 3,
+    "prefetch": 4,
+}
+DEFAULT_PRIORITY = 2
+
+
+class LLMOverloaded(Exception):
+    """La petición se descarta porque su espera en cola excedería el máximo permitido"""
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    tokens: int = field(compare=False)
+    enqueued_at: float = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    label: str = field(compare=False)
+
+
+class Ticket:
+    """Permiso concedido; settle() ajusta el presupuesto con los tokens reales"""
+
+    def __init__(self, scheduler: "LLMScheduler", tokens: int):
+        self._scheduler = scheduler
+        self.tokens = tokens
+
+    def settle(self, used_tokens: Optional[int]):
+        if used_tokens is not None:
+            self._scheduler._adjust_tokens(self.tokens - used_tokens)
+            self.tokens = used_tokens
+
+
+class LLMScheduler:
+    """
+    Admisión de llamadas al LLM:
+    - como mucho max_in_flight peticiones simultáneas
+    - un cubo de tokens (tokens_per_minute) que se rellena de forma continua y se corrige
+      con lo que reporta el proveedor (remaining/reset)
+    - cola por prioridad; si la espera estimada o real supera max_queue_wait se descarta
+    """
+
+    def __init__(self, max_in_flight: int = 16, tokens_per_minute: int = 0,
+                 max_queue_wait: float = 10.0, wait_window: int = 500):
+        self.max_in_flight = max_in_flight
+        self.tokens_per_minute = tokens_per_minute
+        self.max_queue_wait = max_queue_wait
+        self._lock = threading.Lock()
+        self._queue: list = []
+        self._seq = 0
+        self._in_flight = 0
+        self._tokens = float(tokens_per_minute)
+        self._tokens_updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._wake_handle: Optional[asyncio.TimerHandle] = None
+        self._waits_ms: deque = deque(maxlen=wait_window)
+        self._service_s: deque = deque(maxlen=wait_window)
+        self._provider: Dict[str, Any] = {}
+        self._stats = {"granted": 0, "shed": 0, "expired": 0, "max_queue_depth": 0}
+        self._by_priority: Dict[str, Dict[str, int]] = {}
+
+    # === Presupuesto de tokens ===
+
+    def _refill(self, now: float):
+        if not self.tokens_per_minute:
+            return
+        elapsed = now - self._tokens_updated
+        self._tokens = min(float(self.tokens_per_minute), self._tokens + elapsed * self.tokens_per_minute / 60)
+        self._tokens_updated = now
+
+    def _adjust_tokens(self, delta: int):
+        with self._lock:
+            if self.tokens_per_minute:
+                self._tokens = min(float(self.tokens_per_minute), self._tokens + delta)
+        self._dispatch()
+
+    def update_rate_limit(self, info: Dict[str, Any]):
+        """Sincroniza el presupuesto con las cabeceras x-ratelimit-* de la última respuesta"""
+        if not info:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._provider = {**info, "updated_at": time.time()}
+            if info.get("limit_tokens") and not self.tokens_per_minute:
+                self.tokens_per_minute = int(info["limit_tokens"])
+                self._tokens = float(self.tokens_per_minute)
+            remaining = info.get("remaining_tokens")
+            if remaining is not None and self.tokens_per_minute:
+                self._refill(now)
+                self._tokens = min(self._tokens, float(remaining))
+            if info.get("remaining_requests") == 0 and info.get("reset_requests_s"):
+                self._blocked_until = max(self._blocked_until, now + info["reset_requests_s"])
+            if info.get("retry_after"):
+                self._blocked_until = max(self._blocked_until, now + info["retry_after"])
+
+    # === Cola ===
+
+    def _estimated_wait(self, priority: int) -> float:
+        """Espera aproximada: lotes por delante (misma o mayor prioridad) x tiempo medio de servicio"""
+        ahead = sum(1 for w in self._queue if w.priority <= priority)
+        if self._in_flight + ahead < self.max_in_flight:
+            return 0.0
+        service = sum(self._service_s) / len(self._service_s) if self._service_s else 1.0
+        return (ahead // self.max_in_flight + 1) * service
+
+    def _dispatch(self):
+        """Concede permisos en orden de prioridad mientras haya hueco y tokens"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            while self._queue and self._in_flight < self.max_in_flight:
+                waiter = self._queue[0]
+                if waiter.future.done():
+                    heapq.heappop(self._queue)
+                    continue
+                wake_in = self._blocked_until - now
+                # Una petición mayor que el cubo entero solo espera a tenerlo lleno
+                needed = min(waiter.tokens, self.tokens_per_minute) - self._tokens
+                if self.tokens_per_minute and needed > 0:
+                    wake_in = max(wake_in, needed * 60 / self.tokens_per_minute)
+                if wake_in > 0:
+                    self._schedule_wake(waiter.future.get_loop(), wake_in)
+                    return
+                heapq.heappop(self._queue)
+                self._in_flight += 1
+                if self.tokens_per_minute:
+                    self._tokens -= waiter.tokens
+                waiter.future.set_result(None)
+
+    def _schedule_wake(self, loop: asyncio.AbstractEventLoop, delay: float):
+        if self._wake_handle is not None:
+            self._wake_handle.cancel()
+        self._wake_handle = loop.call_later(delay, self._dispatch)
+
+    def _priority_stats(self, label: str) -> Dict[str, int]:
+        return self._by_priority.setdefault(label, {"granted": 0, "shed": 0})
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[str] = None, tokens: int = 0):
+        """Espera turno para una llamada al LLM; lanza LLMOverloaded si no llegaría a tiempo"""
+        label = priority or "general_conversation"
+        level = PRIORITIES.get(label, DEFAULT_PRIORITY)
+        loop = asyncio.get_running_loop()
+        enqueued_at = time.monotonic()
+        with self._lock:
+            if self._estimated_wait(level) > self.max_queue_wait:
+                self._stats["shed"] += 1
+                self._priority_stats(label)["shed"] += 1
+                raise LLMOverloaded(f"Cola del LLM saturada ({len(self._queue)} en espera)")
+            self._seq += 1
+            waiter = _Waiter(level, self._seq, tokens, enqueued_at, loop.create_future(), label)
+            heapq.heappush(self._queue, waiter)
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], len(self._queue))
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.max_queue_wait)
+        except asyncio.TimeoutError:
+            with self._lock:
+                granted = waiter.future.done() and not waiter.future.cancelled()
+                if not granted:
+                    waiter.future.cancel()
+                    self._stats["expired"] += 1
+                    self._stats["shed"] += 1
+                    self._priority_stats(label)["shed"] += 1
+            if not granted:
+                raise LLMOverloaded(f"Más de {self.max_queue_wait}s en la cola del LLM")
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter.future.done() and not waiter.future.cancelled()
+                if not granted:
+                    waiter.future.cancel()
+            if granted:
+                self._release()
+            raise
+
+        wait_ms = (time.monotonic() - enqueued_at) * 1000
+        with self._lock:
+            self._waits_ms.append(wait_ms)
+            self._stats["granted"] += 1
+            self._priority_stats(label)["granted"] += 1
+        started = time.monotonic()
+        try:
+            yield Ticket(self, tokens)
+        finally:
+            with self._lock:
+                self._service_s.append(time.monotonic() - started)
+            self._release()
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._dispatch()
+
+    # === Estadísticas ===
+
+    @staticmethod
+    def _percentile(sorted_values: list, pct: float) -> float:
+        if not sorted_values:
+            return 0.0
+        index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+        return round(sorted_values[index], 1)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill(time.monotonic())
+            waits = sorted(self._waits_ms)
+            return {
+                **self._stats,
+                "in_flight": self._in_flight,
+                "max_in_flight": self.max_in_flight,
+                "queue_depth": sum(1 for w in self._queue if not w.future.done()),
+                "wait_p50_ms": self._percentile(waits, 50),
+                "wait_p95_ms": self._percentile(waits, 95),
+                "wait_max_ms": round(waits[-1], 1) if waits else 0.0,
+                "tokens_per_minute": self.tokens_per_minute,
+                "tokens_available": int(self._tokens) if self.tokens_per_minute else None,
+                "provider_rate_limit": dict(self._provider),
+                "by_priority": {k: dict(v) for k, v in self._by_priority.items()},
+            }
@@ -423,9 +423,17 @@ def _embed_texts(texts: List[str], kind: str = "passage") -> List[List[float]]:
     """
     kind: "passage" for documents, "query" for search queries. E5 models benefit from prefixes.
     """
-    embedder = _get_embedder()
     if not texts:
         return []
+    # Mismo modelo que EmbeddingService: reutilizarlo (o su sidecar) en vez de cargar otra copia
+    from Server.core.services.embedding_service import embedding_service
+    from Server.core.services.embedding_cache import to_sdk_values
+    if getattr(embedding_service, "_model_name", None) == EMBED_MODEL:
+        vectors = embedding_service.generate_embeddings(texts, kind)
+        if len(vectors) != len(texts):
+            raise RuntimeError("EmbeddingService could not embed the texts")
+        return [to_sdk_values(v) for v in vectors]
+    embedder = _get_embedder()
     if kind == "query":
         prepped = [f"query: {t}" for t in texts]
     else:
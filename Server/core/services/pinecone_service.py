@@ -12,10 +12,14 @@ Configuration via environment variables:
 from __future__ import annotations
 
 import os
+import sys
 import time
 import logging
 from typing import Any, Dict, Iterable, List, Optional
 
+from Server.core.services.tracing import stage
+from Server.core.services.embedding_cache import to_sdk_values
+
 logger = logging.getLogger(__name__)
 
 class PineconeService:
@@ -30,7 +34,9 @@ class PineconeService:
 		self._pc = None
 		self._index = None
 		self._last_error: Optional[str] = None
-		self._vector_cache = {}  # Cache de vectores consultados recientemente
+		# IDs vistos recientemente (solo para saber si existen): no guarda los valores, que
+		# duplicarían en listas de floats lo que ya está en el caché de EmbeddingService
+		self._vector_cache = {}
 
 		if not self.api_key:
 			self._last_error = "PINECONE_API_KEY not set"
@@ -79,27 +85,24 @@ class PineconeService:
 		vectors: Iterable[Dict[str, Any]],
 		namespace: Optional[str] = None,
 	) -> Any:
-		"""vectors: [{id, values, metadata?}]"""
+		"""vectors: [{id, values, metadata?}]; values puede ser un array NumPy"""
 		if not self._index:
 			raise RuntimeError(self._last_error or "Pinecone index not available")
 		
-		vectors_list = list(vectors)
+		# Frontera con el SDK: aquí (y solo aquí) los arrays pasan a listas de floats
+		vectors_list = [{**vector, "values": to_sdk_values(vector.get("values", []))} for vector in vectors]
 		
 		# Actualizar caché local con los vectores que se están subiendo
 		for vector in vectors_list:
 			vector_id = vector.get("id")
 			if vector_id:
-				self._vector_cache[vector_id] = {
-					"values": vector.get("values"),
-					"metadata": vector.get("metadata", {}),
-					"timestamp": time.time()
-				}
+				self._remember(vector_id, vector.get("metadata", {}))
 		
 		return self._index.upsert(vectors=vectors_list, namespace=namespace)
 
 	def query(
 		self,
-		vector: List[float],
+		vector: Any,
 		top_k: int = 5,
 		filter: Optional[Dict[str, Any]] = None,
 		include_metadata: bool = True,
@@ -107,13 +110,14 @@ class PineconeService:
 	) -> Any:
 		if not self._index:
 			raise RuntimeError(self._last_error or "Pinecone index not available")
-		return self._index.query(
-			vector=vector,
-			top_k=top_k,
-			filter=filter,
-			include_metadata=include_metadata,
-			namespace=namespace,
-		)
+		with stage("pinecone"):
+			return self._index.query(
+				vector=to_sdk_values(vector),
+				top_k=top_k,
+				filter=filter,
+				include_metadata=include_metadata,
+				namespace=namespace,
+			)
 
 	def delete(
 		self,
@@ -172,12 +176,7 @@ class PineconeService:
 			
 			# Actualizar caché si existe
 			if exists and hasattr(result, 'vectors') and vector_id in result.vectors:
-				vector_data = result.vectors[vector_id]
-				self._vector_cache[vector_id] = {
-					"values": vector_data.get("values", []),
-					"metadata": vector_data.get("metadata", {}),
-					"timestamp": time.time()
-				}
+				self._remember(vector_id, result.vectors[vector_id].get("metadata", {}))
 			
 			return exists
 			
@@ -220,12 +219,7 @@ class PineconeService:
 							
 							# Actualizar caché si existe
 							if exists:
-								vector_data = vectors[vector_id]
-								self._vector_cache[vector_id] = {
-									"values": vector_data.get("values", []),
-									"metadata": vector_data.get("metadata", {}),
-									"timestamp": time.time()
-								}
+								self._remember(vector_id, vectors[vector_id].get("metadata", {}))
 					elif isinstance(result, dict) and 'vectors' in result:
 						vectors = result['vectors']
 						for vector_id in ids_to_check:
@@ -234,12 +228,7 @@ class PineconeService:
 							
 							# Actualizar caché si existe
 							if exists and vector_id in vectors:
-								vector_data = vectors[vector_id]
-								self._vector_cache[vector_id] = {
-									"values": vector_data.get("values", []),
-									"metadata": vector_data.get("metadata", {}),
-									"timestamp": time.time()
-								}
+								self._remember(vector_id, vectors[vector_id].get("metadata", {}))
 				else:
 					# Si no hay índice, asumir que no existen
 					for vector_id in ids_to_check:
@@ -253,6 +242,35 @@ class PineconeService:
 		
 		return results
 
+	def fetch_vectors(self, vector_ids: List[str], namespace: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+		"""
+		Obtiene varios vectores por ID en una sola llamada
+		Devuelve {vector_id: {"values", "metadata"}} solo para los que existen
+		"""
+		if not self._index or not vector_ids:
+			return {}
+		try:
+			result = self._index.fetch(ids=vector_ids, namespace=namespace)
+			vectors = result.vectors if hasattr(result, 'vectors') else (result or {}).get('vectors', {})
+
+			fetched = {}
+			for vector_id, vector_data in (vectors or {}).items():
+				if not isinstance(vector_data, dict) and hasattr(vector_data, 'to_dict'):
+					vector_data = vector_data.to_dict()
+				entry = {
+					"values": vector_data.get("values", []),
+					"metadata": vector_data.get("metadata", {}) or {},
+				}
+				fetched[vector_id] = entry
+				self._remember(vector_id, entry["metadata"])
+			return fetched
+		except Exception as e:
+			logger.error(f"Error obteniendo vectores por ID: {e}")
+			return {}
+
+	def _remember(self, vector_id: str, metadata: Optional[Dict[str, Any]]) -> None:
+		self._vector_cache[vector_id] = {"metadata": metadata or {}, "timestamp": time.time()}
+
 	def clear_cache(self):
 		"""Limpia el caché de vectores"""
 		self._vector_cache.clear()
@@ -260,9 +278,14 @@ class PineconeService:
 
 	def get_cache_stats(self) -> Dict[str, Any]:
 		"""Obtiene estadísticas del caché"""
+		size = sys.getsizeof(self._vector_cache)
+		for vector_id, entry in self._vector_cache.items():
+			metadata = entry["metadata"]
+			size += sys.getsizeof(vector_id) + sys.getsizeof(entry) + sys.getsizeof(metadata)
+			size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in metadata.items())
 		return {
 			"cached_vectors": len(self._vector_cache),
-			"cache_size_mb": len(str(self._vector_cache)) / (1024 * 1024)  # Aproximado
+			"cache_size_mb": round(size / (1024 * 1024), 3)
 		}
 
 	# ---------- Health ----------
@@ -288,7 +311,7 @@ class PineconeService:
 		return status
 
 	# ---------- Helper methods for Madrid knowledge ----------
-	def upsert_madrid_content(self, poi_id: str, content_type: str, text: str, embedding: List[float]) -> bool:
+	def upsert_madrid_content(self, poi_id: str, content_type: str, text: str, embedding: Any) -> bool:
 		"""
 		Helper específico para subir contenido de Madrid
 		OPTIMIZADO: Verifica existencia antes de hacer upsert
@@ -320,7 +343,7 @@ class PineconeService:
 			logger.error(f"❌ Error subiendo {poi_id}_{content_type}: {e}")
 			return False
 
-	def search_madrid_content(self, query_embedding: List[float], poi_id: str = None, content_type: str = None, top_k: int = 3) -> List[Dict]:
+	def search_madrid_content(self, query_embedding: Any, poi_id: str = None, content_type: str = None, top_k: int = 3) -> List[Dict]:
 		"""Buscar contenido de Madrid con filtros opcionales"""
 		try:
 			filter_dict = {}
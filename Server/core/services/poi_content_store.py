@@ -0,0 +1,203 @@
+"""
+POI Content Store - Caché en memoria del contenido estático de los POIs
+Se carga al arrancar (snapshot local + fetch por ID en batch a Pinecone),
+se refresca en background y resuelve fallos de caché con carga single-flight.
+Lo que Pinecone no tiene también se recuerda (negative_ttl segundos) para no repetir el
+fetch síncrono en cada petición
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from typing import Dict, Any, List, Optional
+
+# Añadir el directorio raíz al path para importar config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from config import langchain_settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "poi_content_snapshot.json"
+)
+
+
+class PoiContentStore:
+    """Almacén en proceso del texto de cada POI, indexado por vector_id ({poi_id}_{info_type})"""
+
+    def __init__(self, snapshot_path: Optional[str] = None, refresh_interval: int = 3600, negative_ttl: float = 60.0):
+        self._snapshot_path = snapshot_path or DEFAULT_SNAPSHOT_PATH
+        self._refresh_interval = refresh_interval
+        self._negative_ttl = negative_ttl
+        self._content: Dict[str, str] = {}
+        self._absent: Dict[str, float] = {}  # vector_id -> instante (monotonic) en que caduca el "no existe"
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, threading.Event] = {}
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._last_refresh: Optional[float] = None
+        self._hits = 0
+        self._misses = 0
+        self._negative_hits = 0
+
+    @staticmethod
+    def _vector_id(poi_id: str, info_type: str = "basic_info") -> str:
+        return f"{poi_id}_{info_type}"
+
+    # ---------- Lecturas ----------
+    def get(self, poi_id: str, info_type: str = "basic_info") -> Optional[str]:
+        """
+        Devuelve el contenido del POI desde memoria.
+        En caso de fallo hace una única carga desde Pinecone aunque haya varios hilos pidiendo el mismo POI.
+        """
+        vector_id = self._vector_id(poi_id, info_type)
+        with self._lock:
+            text = self._content.get(vector_id)
+            if text is not None:
+                self._hits += 1
+                return text
+            if self._absent.get(vector_id, 0.0) > time.monotonic():
+                self._negative_hits += 1
+                return None
+            self._misses += 1
+            event = self._inflight.get(vector_id)
+            leader = event is None
+            if leader:
+                event = threading.Event()
+                self._inflight[vector_id] = event
+
+        if not leader:
+            event.wait(timeout=10)
+            with self._lock:
+                return self._content.get(vector_id)
+
+        try:
+            fetched = self._fetch_from_pinecone([vector_id])
+            with self._lock:
+                self._content.update(fetched)
+                if vector_id in fetched:
+                    self._absent.pop(vector_id, None)
+                else:
+                    self._absent[vector_id] = time.monotonic() + self._negative_ttl
+            return fetched.get(vector_id)
+        finally:
+            with self._lock:
+                self._inflight.pop(vector_id, None)
+            event.set()
+
+    def put(self, poi_id: str, info_type: str, text: str):
+        """Registra contenido recién generado (p. ej. tras un upsert a Pinecone)"""
+        if not text:
+            return
+        vector_id = self._vector_id(poi_id, info_type)
+        with self._lock:
+            self._content[vector_id] = text
+            self._absent.pop(vector_id, None)
+
+    # ---------- Carga ----------
+    def load_snapshot(self) -> int:
+        """Carga el snapshot local si existe. Devuelve el número de entradas cargadas"""
+        try:
+            if not os.path.exists(self._snapshot_path):
+                return 0
+            with open(self._snapshot_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            content = data.get("content", {})
+            with self._lock:
+                for vector_id, text in content.items():
+                    self._content.setdefault(vector_id, text)
+            logger.info(f"📂 Snapshot de POIs cargado: {len(content)} entradas")
+            return len(content)
+        except Exception as e:
+            logger.warning(f"⚠️ Error cargando snapshot de POIs: {e}")
+            return 0
+
+    def save_snapshot(self):
+        """Persiste el contenido actual para acelerar el siguiente arranque"""
+        try:
+            with self._lock:
+                data = {"saved_at": int(time.time()), "content": dict(self._content)}
+            os.makedirs(os.path.dirname(self._snapshot_path), exist_ok=True)
+            tmp_path = f"{self._snapshot_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self._snapshot_path)
+        except Exception as e:
+            logger.warning(f"⚠️ Error guardando snapshot de POIs: {e}")
+
+    def preload(self, poi_ids: List[str], info_type: str = "basic_info") -> int:
+        """Carga todos los POIs con un único fetch por ID a Pinecone"""
+        vector_ids = [self._vector_id(poi_id, info_type) for poi_id in poi_ids]
+        fetched = self._fetch_from_pinecone(vector_ids)
+        if fetched:
+            with self._lock:
+                self._content.update(fetched)
+                for vector_id in fetched:
+                    self._absent.pop(vector_id, None)
+            self.save_snapshot()
+        self._last_refresh = time.time()
+        logger.info(f"📚 Contenido de POIs precargado: {len(fetched)}/{len(vector_ids)}")
+        return len(fetched)
+
+    def _fetch_from_pinecone(self, vector_ids: List[str]) -> Dict[str, str]:
+        try:
+            from Server.core.services.pinecone_service import pinecone_service
+        except ImportError:
+            return {}
+        if not pinecone_service or not pinecone_service.is_available():
+            return {}
+        vectors = pinecone_service.fetch_vectors(vector_ids)
+        return {
+            vector_id: data["metadata"]["text"]
+            for vector_id, data in vectors.items()
+            if data.get("metadata", {}).get("text")
+        }
+
+    # ---------- Refresco en background ----------
+    def start_background_refresh(self, poi_ids: List[str], info_type: str = "basic_info"):
+        """Lanza un hilo daemon que recarga el contenido periódicamente"""
+        if self._refresh_thread and self._refresh_thread.is_alive():
+            return
+
+        def _loop():
+            while not self._stop_event.wait(self._refresh_interval):
+                try:
+                    self.preload(poi_ids, info_type)
+                except Exception as e:
+                    logger.warning(f"⚠️ Error refrescando contenido de POIs: {e}")
+
+        self._stop_event.clear()
+        self._refresh_thread = threading.Thread(target=_loop, daemon=True)
+        self._refresh_thread.start()
+
+    def stop_background_refresh(self):
+        self._stop_event.set()
+
+    # ---------- Estadísticas ----------
+    def get_stats(self) -> Dict[str, Any]:
+        total = self._hits + self._misses
+        return {
+            "entries": len(self._content),
+            "hits": self._hits,
+            "misses": self._misses,
+            "negative_hits": self._negative_hits,
+            "hit_rate": round(self._hits / total, 3) if total else 0.0,
+            "last_refresh": int(self._last_refresh) if self._last_refresh else None,
+            "refresh_interval": self._refresh_interval,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._content.clear()
+            self._absent.clear()
+
+
+# Instancia global del store
+poi_content_store = PoiContentStore(
+    snapshot_path=langchain_settings.poi_content_snapshot_path,
+    refresh_interval=langchain_settings.poi_content_refresh_interval,
+    negative_ttl=langchain_settings.poi_content_negative_ttl,
+)
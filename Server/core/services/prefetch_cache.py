@@ -0,0 +1,113 @@
+"""
+Prefetch Cache - Caché efímero por familia de lo que probablemente pedirá a continuación
+Tras avanzar de POI se precalculan contenido, borrador de llegada y payload de /next;
+se mide cuántos elementos se usan (hits) y cuántos caducan sin usarse (waste)
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+# Añadir el directorio raíz al path para importar config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from config import langchain_settings
+
+logger = logging.getLogger(__name__)
+
+
+class PrefetchCache:
+    """Entradas (familia, tipo) con TTL corto, ligadas a una clave de validez (p. ej. el POI)"""
+
+    def __init__(self, ttl: int = 300, max_families: int = 5000):
+        self.ttl = ttl
+        self.max_families = max_families
+        self._entries: Dict[Tuple[int, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _kind_stats(self, kind: str) -> Dict[str, int]:
+        return self._stats.setdefault(kind, {"stored": 0, "used": 0, "hits": 0, "misses": 0, "wasted": 0})
+
+    def _drop(self, key: Tuple[int, str]):
+        entry = self._entries.pop(key)
+        if not entry["used"]:
+            self._kind_stats(key[1])["wasted"] += 1
+
+    def put(self, family_id: int, kind: str, value: Any, valid_for: Any = None):
+        """Guarda un elemento precalculado; el anterior del mismo tipo se descarta"""
+        key = (family_id, kind)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = {
+                "value": value,
+                "valid_for": valid_for,
+                "expires_at": time.monotonic() + self.ttl,
+                "used": False,
+            }
+            self._kind_stats(kind)["stored"] += 1
+            if len(self._entries) > self.max_families * 3:
+                self._purge_expired()
+
+    def get(self, family_id: int, kind: str, valid_for: Any = None) -> Optional[Any]:
+        """Devuelve el elemento si sigue vigente y corresponde a `valid_for`; si no, None"""
+        key = (family_id, kind)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._kind_stats(kind)["misses"] += 1
+                return None
+            if entry["expires_at"] < time.monotonic() or entry["valid_for"] != valid_for:
+                self._drop(key)
+                self._kind_stats(kind)["misses"] += 1
+                return None
+            stats = self._kind_stats(kind)
+            if not entry["used"]:
+                entry["used"] = True
+                stats["used"] += 1
+            stats["hits"] += 1
+            return entry["value"]
+
+    def pop(self, family_id: int, kind: str, valid_for: Any = None) -> Optional[Any]:
+        """Como get, pero el elemento solo puede servirse una vez"""
+        value = self.get(family_id, kind, valid_for)
+        if value is not None:
+            with self._lock:
+                self._entries.pop((family_id, kind), None)
+        return value
+
+    def invalidate(self, family_id: int, kind: str):
+        with self._lock:
+            if (family_id, kind) in self._entries:
+                self._drop((family_id, kind))
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        for key in [k for k, e in self._entries.items() if e["expires_at"] < now]:
+            self._drop(key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._purge_expired()
+            kinds = {}
+            for kind, stats in self._stats.items():
+                served = stats["hits"] + stats["misses"]
+                settled = stats["used"] + stats["wasted"]
+                kinds[kind] = {
+                    **stats,
+                    "hit_rate": round(stats["hits"] / served, 3) if served else 0.0,
+                    "waste_rate": round(stats["wasted"] / settled, 3) if settled else 0.0,
+                }
+            return {"entries": len(self._entries), "ttl": self.ttl, "kinds": kinds}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._stats.clear()
+
+
+# Instancia global del caché de prefetch
+prefetch_cache = PrefetchCache(ttl=langchain_settings.prefetch_ttl)
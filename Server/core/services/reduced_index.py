@@ -0,0 +1,209 @@
+"""
+Reduced Index - Búsqueda local con embeddings de dimensión reducida
+El corpus de POIs son unas decenas de pasajes: buscar con vectores de 1024 dimensiones en
+Pinecone es caro para lo que aporta. Este índice proyecta pasajes y consultas a k
+dimensiones y busca en memoria con NumPy.
+
+Proyecciones:
+- "pca": PCA ajustada sobre nuestros pasajes. Las componentes están ordenadas por varianza,
+  así que un único ajuste sirve para cualquier k (las primeras k componentes, estilo
+  Matryoshka). k nunca supera el rango del corpus (nº de pasajes - 1)
+- "truncate": primeras k coordenadas del vector original, sin ajuste (Matryoshka puro;
+  solo es fiable con modelos entrenados para ello)
+
+La dimensión se elige en caliente (set_dimension) sin recodificar nada: los pasajes se
+guardan con todas las componentes y se recortan al buscar. Es un índice local y no un
+namespace de Pinecone porque todos los namespaces de un índice comparten su dimensión
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Añadir el directorio raíz al path para importar config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from config import langchain_settings
+
+logger = logging.getLogger(__name__)
+
+REDUCTION_METHODS = ("pca", "truncate")
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.clip(norms, 1e-12, None)
+
+
+class PCAProjection:
+    """Media + componentes principales (filas ordenadas por varianza explicada)"""
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray, explained_variance_ratio: np.ndarray):
+        self.mean = mean
+        self.components = components
+        self.explained_variance_ratio = explained_variance_ratio
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray) -> "PCAProjection":
+        data = np.asarray(vectors, dtype=np.float32)
+        mean = data.mean(axis=0)
+        _, singular, vt = np.linalg.svd(data - mean, full_matrices=False)
+        variance = singular ** 2
+        rank = int(np.sum(variance > variance.max() * 1e-10)) if variance.size else 0
+        total = variance[:rank].sum() or 1.0
+        return cls(mean, vt[:rank].astype(np.float32), (variance[:rank] / total).astype(np.float32))
+
+    @property
+    def max_dimension(self) -> int:
+        return len(self.components)
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        """Coordenadas en todas las componentes (sin normalizar); se recortan al buscar"""
+        return (np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components.T
+
+
+class ReducedIndex:
+    """Índice en memoria de pasajes proyectados; la dimensión activa se cambia en caliente"""
+
+    def __init__(self, dimension: int = 0, method: str = "pca"):
+        self.method = method if method in REDUCTION_METHODS else "pca"
+        self._requested_dimension = dimension
+        self._projection: Optional[PCAProjection] = None
+        self._coords: Optional[np.ndarray] = None
+        self._ids: List[str] = []
+        self._metadata: List[Dict[str, Any]] = []
+        self._normalized: Dict[int, np.ndarray] = {}  # pasajes recortados a k y normalizados, por k
+        self._lock = threading.Lock()
+        self._stats = {"searches": 0, "total_search_ms": 0.0}
+
+    # ---------- Construcción ----------
+    def build(self, items: Sequence[Tuple[str, str, Dict[str, Any]]],
+              embed_fn: Callable[[List[str]], List[np.ndarray]]) -> int:
+        """items: [(id, texto, metadata)]; embed_fn codifica pasajes (p. ej. generate_passage_embeddings)"""
+        items = [item for item in items if item[1]]
+        if len(items) < 2:
+            logger.warning("⚠️ Índice reducido: hacen falta al menos 2 pasajes")
+            return 0
+        vectors = embed_fn([text for _, text, _ in items])
+        if len(vectors) != len(items):
+            logger.warning("⚠️ Índice reducido: no se pudieron codificar los pasajes")
+            return 0
+        self.load([item[0] for item in items], np.stack([np.asarray(v, dtype=np.float32) for v in vectors]),
+                  [item[2] for item in items])
+        return len(items)
+
+    def load(self, ids: List[str], vectors: np.ndarray, metadata: Optional[List[Dict[str, Any]]] = None):
+        """Ajusta la proyección sobre estos pasajes y los indexa con todas sus componentes"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        projection = PCAProjection.fit(vectors) if self.method == "pca" else None
+        coords = projection.transform(vectors) if projection else vectors
+        with self._lock:
+            self._projection = projection
+            self._coords = coords
+            self._ids = list(ids)
+            self._metadata = list(metadata) if metadata else [{} for _ in ids]
+            self._normalized = {}
+        logger.info(f"📐 Índice reducido ({self.method}) con {len(ids)} pasajes, "
+                    f"dimensión máxima {self.max_dimension}")
+        self._warn_if_capped()
+
+    # ---------- Dimensión ----------
+    @property
+    def max_dimension(self) -> int:
+        if self._coords is None:
+            return 0
+        return self._projection.max_dimension if self._projection else self._coords.shape[1]
+
+    @property
+    def requested_dimension(self) -> int:
+        return self._requested_dimension
+
+    @property
+    def dimension(self) -> int:
+        """Dimensión efectiva (0 = desactivado): la pedida, acotada por lo que permite el corpus"""
+        if not self._requested_dimension or self._coords is None:
+            return 0
+        return min(self._requested_dimension, self.max_dimension)
+
+    @property
+    def capped(self) -> bool:
+        """La dimensión pedida supera el rango del corpus: se busca con menos componentes"""
+        return self._coords is not None and self._requested_dimension > self.max_dimension
+
+    @property
+    def ready(self) -> bool:
+        return self.dimension > 0
+
+    def _warn_if_capped(self):
+        if self.capped:
+            logger.warning(f"⚠️ Índice reducido: dimensión {self._requested_dimension} pedida, pero el corpus "
+                           f"({len(self._ids)} pasajes) solo admite {self.max_dimension}; se usa {self.dimension}")
+
+    def set_dimension(self, dimension: int, method: Optional[str] = None):
+        """Cambia la dimensión activa; cambiar de método exige reconstruir (build/load)"""
+        if method and method != self.method:
+            if method not in REDUCTION_METHODS:
+                raise ValueError(f"Método de reducción desconocido: {method}")
+            with self._lock:
+                self.method = method
+                self._projection = None
+                self._coords = None
+                self._normalized = {}
+        self._requested_dimension = max(0, int(dimension))
+        self._warn_if_capped()
+
+    # ---------- Búsqueda ----------
+    @staticmethod
+    def _project(query_vector: Any, projection: Optional[PCAProjection], k: int) -> np.ndarray:
+        query = np.asarray(query_vector, dtype=np.float32)
+        if projection is not None:
+            query = (query - projection.mean) @ projection.components[:k].T
+        return _normalize(query[:k])
+
+    def search(self, query_vector: Any, top_k: int = 3, dimension: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Mismo formato que PineconeService.search_madrid_content: [{id, score, metadata}]"""
+        with self._lock:
+            coords, ids, metadata, projection = self._coords, self._ids, self._metadata, self._projection
+            if coords is None:
+                return []
+            k = min(dimension or self.dimension or self.max_dimension, self.max_dimension)
+            passages = self._normalized.get(k)
+            if passages is None:
+                passages = self._normalized[k] = np.ascontiguousarray(_normalize(coords[:, :k]))
+        start = time.perf_counter()
+        query = self._project(query_vector, projection, k)
+        scores = passages @ query
+        top = np.argsort(-scores)[:top_k]
+        results = [{"id": ids[i], "score": float(scores[i]), "metadata": metadata[i]} for i in top]
+        with self._lock:
+            self._stats["searches"] += 1
+            self._stats["total_search_ms"] += (time.perf_counter() - start) * 1000
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        searches = stats.pop("total_search_ms")
+        stats.update({
+            "method": self.method,
+            "requested_dimension": self.requested_dimension,
+            "dimension": self.dimension,
+            "max_dimension": self.max_dimension,
+            "capped": self.capped,
+            "passages": len(self._ids),
+            "avg_search_ms": round(searches / stats["searches"], 4) if stats["searches"] else 0.0,
+        })
+        if self._projection is not None and self.dimension:
+            stats["explained_variance"] = round(float(self._projection.explained_variance_ratio[:self.dimension].sum()), 4)
+        return stats
+
+
+# Instancia global (embedding_reduced_dimension = 0 la deja desactivada)
+reduced_index = ReducedIndex(
+    dimension=langchain_settings.embedding_reduced_dimension,
+    method=langchain_settings.embedding_reduction_method,
+)
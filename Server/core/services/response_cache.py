@@ -0,0 +1,149 @@
+"""
+Response Cache - Caché semántico de respuestas del LLM
+Reutiliza respuestas para preguntas casi idénticas en el mismo POI, situación y franja de edad
+"""
+
+import os
+import re
+import sys
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+# Añadir el directorio raíz al path para importar config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from config import langchain_settings
+
+logger = logging.getLogger(__name__)
+
+# Marcador que sustituye a los nombres de la familia en las respuestas cacheadas
+NAME_PLACEHOLDER = "{familia}"
+
+# Varios nombres seguidos ("Luis y Marta", "Luis, Marta y Pepe") son un único saludo
+_ADJACENT_PLACEHOLDERS = re.compile(
+    re.escape(NAME_PLACEHOLDER) + r"(?:\s*(?:,|\by\b|\be\b)\s*" + re.escape(NAME_PLACEHOLDER) + r")+")
+# El saludo sin nombres ya es "familia X"
+_FAMILY_PREFIX = re.compile(r"\bfamilia\s+" + re.escape(NAME_PLACEHOLDER), re.IGNORECASE)
+# Un nombre precedido de estas palabras es parte de un topónimo ("Plaza de Santa Ana")
+_PLACE_PREFIXES = ("Santa ", "Santo ", "San ", "de ", "del ")
+
+
+class SemanticResponseCache:
+    """Caché LRU con TTL indexado por (poi_id, situación, franja de edad) + similitud de embedding"""
+
+    def __init__(self, threshold: float = 0.92, ttl: int = 86400, max_entries: int = 500):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, str, str], List[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    # ---------- Plantillas ----------
+    @staticmethod
+    def to_template(response: str, names: List[str]) -> str:
+        """
+        Sustituye el saludo a la familia por un único marcador: solo palabras completas
+        ("Ana" no toca "Mariana" ni "Santa Ana") y los nombres seguidos se funden en uno
+        """
+        template = response
+        lookbehind = "".join(f"(?<!{re.escape(prefix)})" for prefix in _PLACE_PREFIXES)
+        for name in sorted({n.strip() for n in names if n and n.strip()}, key=len, reverse=True):
+            template = re.sub(rf"{lookbehind}\b{re.escape(name)}\b", NAME_PLACEHOLDER, template)
+        template = _ADJACENT_PLACEHOLDERS.sub(NAME_PLACEHOLDER, template)
+        return _FAMILY_PREFIX.sub(NAME_PLACEHOLDER, template)
+
+    @staticmethod
+    def render(template: str, greeting: str) -> str:
+        """Aplica la personalización de la familia actual sobre la respuesta cacheada"""
+        return template.replace(NAME_PLACEHOLDER, greeting)
+
+    # ---------- Operaciones ----------
+    def lookup(self, poi_id: str, situation_type: str, age_band: str,
+               query_embedding: List[float]) -> Optional[str]:
+        """Devuelve la plantilla más similar por encima del umbral, o None"""
+        bucket_key = (poi_id or "", situation_type, age_band)
+        query = np.asarray(query_embedding, dtype=np.float32)
+        now = time.time()
+
+        with self._lock:
+            best_id, best_score = None, self.threshold
+            for entry_id in list(self._buckets.get(bucket_key, [])):
+                entry = self._entries[entry_id]
+                if now - entry["created_at"] > self.ttl:
+                    self._remove(entry_id)
+                    self._expirations += 1
+                    continue
+                score = float(np.dot(entry["embedding"], query))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(best_id)
+            self._hits += 1
+            return self._entries[best_id]["template"]
+
+    def store(self, poi_id: str, situation_type: str, age_band: str,
+              query_embedding: List[float], template: str):
+        bucket_key = (poi_id or "", situation_type, age_band)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                "bucket": bucket_key,
+                "embedding": np.asarray(query_embedding, dtype=np.float32),
+                "template": template,
+                "created_at": time.time(),
+            }
+            self._buckets.setdefault(bucket_key, []).append(entry_id)
+
+            while len(self._entries) > self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self._evictions += 1
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        bucket = self._buckets.get(entry["bucket"], [])
+        bucket.remove(entry_id)
+        if not bucket:
+            self._buckets.pop(entry["bucket"], None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / total, 3) if total else 0.0,
+            "evictions": self._evictions,
+            "expirations": self._expirations,
+            "threshold": self.threshold,
+            "ttl": self.ttl,
+        }
+
+
+# Instancia global del caché
+response_cache = SemanticResponseCache(
+    threshold=langchain_settings.response_cache_threshold,
+    ttl=langchain_settings.response_cache_ttl,
+    max_entries=langchain_settings.response_cache_max_entries,
+)
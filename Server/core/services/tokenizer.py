@@ -0,0 +1,78 @@
+"""
+Tokenizer - Recuento de tokens con el tokenizador del modelo
+Usa tiktoken con o200k_base (el de gpt-oss) si está instalado y, si no, una estimación por
+caracteres. tiktoken descarga el BPE la primera vez: en workers sin red hay que dejarlo en
+tokenizer_cache_dir (TIKTOKEN_CACHE_DIR) al construir la imagen; si falta se avisa una vez
+"""
+
+import os
+import sys
+import logging
+import threading
+from typing import Optional
+
+# Añadir el directorio raíz al path para importar config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from config import langchain_settings
+
+logger = logging.getLogger(__name__)
+
+# Caracteres por token aproximados para texto en español (modo sin tiktoken)
+CHARS_PER_TOKEN = 4
+DEFAULT_ENCODING = "o200k_base"
+
+
+class Tokenizer:
+    """Cuenta y recorta texto en tokens; carga el encoding de forma lazy"""
+
+    def __init__(self, encoding_name: Optional[str] = None, cache_dir: Optional[str] = None):
+        self._encoding_name = encoding_name or DEFAULT_ENCODING
+        self._cache_dir = cache_dir
+        self._encoding = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _get_encoding(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    if self._cache_dir:
+                        os.environ.setdefault("TIKTOKEN_CACHE_DIR", self._cache_dir)
+                    try:
+                        import tiktoken
+                        self._encoding = tiktoken.get_encoding(self._encoding_name)
+                        logger.info(f"✅ Tokenizador cargado: {self._encoding_name}")
+                    except Exception as e:
+                        logger.warning(f"⚠️ Tokenizador {self._encoding_name} no disponible ({e}), "
+                                       "usando estimación de tokens por caracteres")
+                    self._loaded = True
+        return self._encoding
+
+    @property
+    def is_exact(self) -> bool:
+        return self._get_encoding() is not None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        encoding = self._get_encoding()
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+        return max(1, len(text) // CHARS_PER_TOKEN)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Recorta el texto a max_tokens respetando los límites de token"""
+        if max_tokens <= 0 or not text:
+            return ""
+        encoding = self._get_encoding()
+        if encoding is not None:
+            tokens = encoding.encode(text, disallowed_special=())
+            if len(tokens) <= max_tokens:
+                return text
+            return encoding.decode(tokens[:max_tokens]).rstrip() + "…"
+        max_chars = max_tokens * CHARS_PER_TOKEN
+        return text if len(text) <= max_chars else text[:max_chars].rstrip() + "…"
+
+
+# Instancia global del tokenizador
+tokenizer = Tokenizer(langchain_settings.tokenizer_encoding, langchain_settings.tokenizer_cache_dir)
@@ -0,0 +1,135 @@
+"""
+Tracing - Temporizadores ligeros por etapa para el pipeline de chat
+Las etapas de cada request se emiten como cabecera Server-Timing, se agregan
+en histogramas por etapa y se registran en logs con los mismos nombres
+"""
+
+import time
+import logging
+import threading
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores (ms) de los buckets del histograma; el último bucket es +inf
+HISTOGRAM_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+class RequestTrace:
+    """Etapas medidas durante un request (se comparte con los hilos vía contextvars)"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.stages: List[Tuple[str, float]] = []
+
+    def record(self, name: str, duration_ms: float):
+        self.stages.append((name, duration_ms))
+
+    def totals(self) -> Dict[str, float]:
+        """Duración acumulada por etapa, en orden de primera aparición"""
+        totals: Dict[str, float] = {}
+        for name, duration_ms in list(self.stages):
+            totals[name] = totals.get(name, 0.0) + duration_ms
+        return totals
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started_at) * 1000
+
+    def server_timing_header(self) -> str:
+        parts = [f"{name};dur={duration:.1f}" for name, duration in self.totals().items()]
+        parts.append(f"total;dur={self.elapsed_ms():.1f}")
+        return ", ".join(parts)
+
+    def log_line(self) -> str:
+        parts = [f"{name}={duration:.1f}ms" for name, duration in self.totals().items()]
+        parts.append(f"total={self.elapsed_ms():.1f}ms")
+        return " ".join(parts)
+
+
+class StageHistograms:
+    """Histogramas agregados por etapa con percentiles sobre una ventana reciente"""
+
+    def __init__(self, window: int = 1000):
+        self._window = window
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, List[int]] = {}
+        self._samples: Dict[str, deque] = {}
+        self._sums: Dict[str, float] = {}
+
+    def observe(self, name: str, duration_ms: float):
+        with self._lock:
+            if name not in self._buckets:
+                self._buckets[name] = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+                self._samples[name] = deque(maxlen=self._window)
+                self._sums[name] = 0.0
+            self._buckets[name][bisect_left(HISTOGRAM_BUCKETS_MS, duration_ms)] += 1
+            self._samples[name].append(duration_ms)
+            self._sums[name] += duration_ms
+
+    @staticmethod
+    def _percentile(sorted_samples: List[float], pct: float) -> float:
+        if not sorted_samples:
+            return 0.0
+        index = min(len(sorted_samples) - 1, int(round(pct / 100 * (len(sorted_samples) - 1))))
+        return round(sorted_samples[index], 1)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {}
+        with self._lock:
+            for name, buckets in self._buckets.items():
+                samples = sorted(self._samples[name])
+                count = sum(buckets)
+                labels = [f"le_{b}ms" for b in HISTOGRAM_BUCKETS_MS] + ["le_inf"]
+                stats[name] = {
+                    "count": count,
+                    "avg_ms": round(self._sums[name] / count, 1) if count else 0.0,
+                    "p50_ms": self._percentile(samples, 50),
+                    "p95_ms": self._percentile(samples, 95),
+                    "p99_ms": self._percentile(samples, 99),
+                    "buckets": dict(zip(labels, buckets)),
+                }
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+            self._samples.clear()
+            self._sums.clear()
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+
+# Histogramas globales del proceso
+stage_histograms = StageHistograms()
+
+
+def start_trace() -> RequestTrace:
+    """Abre una traza para el request actual"""
+    trace = RequestTrace()
+    _current_trace.set(trace)
+    return trace
+
+
+def get_current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Mide una etapa del pipeline. Sin traza activa solo alimenta los histogramas,
+    así que puede usarse también desde tareas en background
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        stage_histograms.observe(name, duration_ms)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.record(name, duration_ms)
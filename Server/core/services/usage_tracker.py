@@ -0,0 +1,227 @@
+"""
+Usage Tracker - Consumo de tokens, latencia y coste de cada llamada al LLM
+Se agrega en memoria por familia, POI, tipo de situación y modelo, y se vuelca por lotes
+a la tabla llm_usage desde un hilo en background. La tabla se crea (si no existe) al
+arrancar la app y cuando el hilo abre su conexión
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+# Añadir el directorio raíz al path para importar config
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from config import langchain_settings
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = ("family", "situation", "model", "poi")
+_COLUMNS = {"family": "family_id", "situation": "situation", "model": "model", "poi": "poi_id"}
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_usage (
+    id BIGSERIAL PRIMARY KEY,
+    family_id INTEGER REFERENCES families(id) ON DELETE SET NULL,
+    situation TEXT, poi_id TEXT, model TEXT NOT NULL,
+    prompt_tokens INTEGER NOT NULL, completion_tokens INTEGER NOT NULL, cached_tokens INTEGER NOT NULL,
+    latency_ms REAL NOT NULL, cost_usd NUMERIC(12, 8) NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+)
+"""
+_INSERT_COLUMNS = ("family_id", "situation", "poi_id", "model", "prompt_tokens", "completion_tokens",
+                   "cached_tokens", "latency_ms", "cost_usd", "created_at")
+
+
+def cached_tokens_from(usage: Dict[str, Any]) -> int:
+    """Tokens de prompt servidos desde la caché del proveedor (si los reporta)"""
+    details = usage.get("prompt_tokens_details") or {}
+    return int(details.get("cached_tokens") or usage.get("cached_tokens") or 0)
+
+
+class UsageTracker:
+    """Acumula el uso por dimensión y lo persiste por lotes"""
+
+    def __init__(self, batch_size: int = 200, flush_interval: float = 10.0, max_pending: int = 10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending: deque = deque(maxlen=max_pending)
+        self._totals: Dict[str, Dict[Any, Dict[str, float]]] = {dim: {} for dim in DIMENSIONS}
+        self._flushed = 0
+        self._dropped = 0
+        self._flush_errors = 0
+        self._stop_event = threading.Event()
+        self._flush_thread: Optional[threading.Thread] = None
+        self._started_at = time.time()
+
+    @staticmethod
+    def _empty() -> Dict[str, float]:
+        return {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0,
+                "latency_ms": 0.0, "cost_usd": 0.0}
+
+    def record(self, model: str, usage: Dict[str, Any], latency_s: float, cost_usd: float,
+               situation: Optional[str] = None, family_id: Optional[int] = None, poi_id: Optional[str] = None):
+        row = {
+            "family_id": family_id,
+            "situation": situation,
+            "poi_id": poi_id,
+            "model": model,
+            "prompt_tokens": int(usage.get("prompt_tokens") or 0),
+            "completion_tokens": int(usage.get("completion_tokens") or 0),
+            "cached_tokens": cached_tokens_from(usage),
+            "latency_ms": round(latency_s * 1000, 1),
+            "cost_usd": cost_usd,
+            "created_at": datetime.now(timezone.utc),
+        }
+        keys = {"family": family_id, "situation": situation, "model": model, "poi": poi_id}
+        with self._lock:
+            if len(self._pending) == self._pending.maxlen:
+                self._dropped += 1
+            self._pending.append(row)
+            for dim, key in keys.items():
+                totals = self._totals[dim].setdefault(key, self._empty())
+                totals["calls"] += 1
+                for field_name in ("prompt_tokens", "completion_tokens", "cached_tokens", "latency_ms", "cost_usd"):
+                    totals[field_name] += row[field_name]
+
+    # ---------- Persistencia ----------
+    @staticmethod
+    def ensure_table(db) -> bool:
+        """Crea llm_usage si no existe (idempotente). False si no se pudo"""
+        try:
+            db.execute_query(_SCHEMA)
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo crear la tabla llm_usage: {e}")
+            return False
+
+    def flush(self, db) -> int:
+        """Inserta lo pendiente en lotes de batch_size (un INSERT multi-fila por lote)"""
+        written = 0
+        while True:
+            with self._lock:
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            if not batch:
+                return written
+            placeholders = ", ".join(["(" + ", ".join(["%s"] * len(_INSERT_COLUMNS)) + ")"] * len(batch))
+            params = tuple(row[column] for row in batch for column in _INSERT_COLUMNS)
+            try:
+                db.execute_query(f"INSERT INTO llm_usage ({', '.join(_INSERT_COLUMNS)}) VALUES {placeholders}",
+                                 params)
+            except Exception as e:
+                # Se devuelven a la cola para el siguiente intento (la cola está acotada)
+                with self._lock:
+                    self._pending.extendleft(reversed(batch))
+                    self._flush_errors += 1
+                logger.warning(f"⚠️ Error guardando uso del LLM ({len(batch)} filas): {e}")
+                return written
+            written += len(batch)
+            with self._lock:
+                self._flushed += len(batch)
+
+    def start_background_flush(self, connect: Callable[[], Any]):
+        """
+        Hilo daemon que vuelca el uso cada flush_interval segundos con su propia conexión
+        (connect() -> Database): la conexión psycopg2 no se comparte entre hilos, y un
+        commit/rollback del volcado no debe intercalarse con las consultas de las peticiones
+        """
+        if self._flush_thread and self._flush_thread.is_alive():
+            return
+
+        def _loop():
+            db = None
+            while True:
+                stopping = self._stop_event.wait(self.flush_interval)
+                if self._pending:
+                    if db is None:
+                        try:
+                            db = connect()
+                            self.ensure_table(db)
+                        except Exception as e:
+                            logger.warning(f"⚠️ Sin conexión para volcar el uso del LLM: {e}")
+                    if db is not None:
+                        self.flush(db)
+                if stopping:
+                    break
+            if db is not None:
+                db.close()
+
+        self._stop_event.clear()
+        self._flush_thread = threading.Thread(target=_loop, name="usage-flush", daemon=True)
+        self._flush_thread.start()
+
+    def stop_background_flush(self, timeout: float = 10.0):
+        """Detiene el hilo tras un último volcado (en el propio hilo, con su conexión)"""
+        self._stop_event.set()
+        if self._flush_thread is not None:
+            self._flush_thread.join(timeout)
+            self._flush_thread = None
+
+    # ---------- Consultas ----------
+    def breakdown(self, by: str = "family", limit: int = 20) -> List[Dict[str, Any]]:
+        """Uso desde el arranque agrupado por una dimensión, ordenado por coste"""
+        if by not in DIMENSIONS:
+            raise ValueError(f"Dimensión no válida: {by} (usar {', '.join(DIMENSIONS)})")
+        with self._lock:
+            rows = [{by: key, **totals} for key, totals in self._totals[by].items()]
+        for row in rows:
+            calls = row["calls"] or 1
+            row["avg_latency_ms"] = round(row.pop("latency_ms") / calls, 1)
+            row["cost_usd"] = round(row["cost_usd"], 6)
+        rows.sort(key=lambda r: (r["cost_usd"], r["prompt_tokens"] + r["completion_tokens"]), reverse=True)
+        return rows[:limit]
+
+    @staticmethod
+    def breakdown_from_db(db, by: str = "family", limit: int = 20, since_hours: int = 24) -> List[Dict[str, Any]]:
+        """Mismo desglose sobre lo ya persistido en llm_usage"""
+        if by not in DIMENSIONS:
+            raise ValueError(f"Dimensión no válida: {by} (usar {', '.join(DIMENSIONS)})")
+        column = _COLUMNS[by]
+        rows = db.execute_query(f"""
+            SELECT {column} AS "{by}", COUNT(*) AS calls,
+                   SUM(prompt_tokens) AS prompt_tokens, SUM(completion_tokens) AS completion_tokens,
+                   SUM(cached_tokens) AS cached_tokens, AVG(latency_ms) AS avg_latency_ms,
+                   SUM(cost_usd) AS cost_usd
+            FROM llm_usage
+            WHERE created_at >= now() - make_interval(hours => %s)
+            GROUP BY {column}
+            ORDER BY SUM(cost_usd) DESC
+            LIMIT %s
+        """, (since_hours, limit))
+        return [
+            {**row, "avg_latency_ms": round(float(row["avg_latency_ms"] or 0), 1),
+             "cost_usd": round(float(row["cost_usd"] or 0), 6)}
+            for row in rows or []
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = self._totals["model"].values()
+            return {
+                "calls": sum(t["calls"] for t in models),
+                "prompt_tokens": sum(t["prompt_tokens"] for t in models),
+                "completion_tokens": sum(t["completion_tokens"] for t in models),
+                "cached_tokens": sum(t["cached_tokens"] for t in models),
+                "cost_usd": round(sum(t["cost_usd"] for t in models), 6),
+                "pending": len(self._pending),
+                "flushed": self._flushed,
+                "dropped": self._dropped,
+                "flush_errors": self._flush_errors,
+                "since": int(self._started_at),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+            self._totals = {dim: {} for dim in DIMENSIONS}
+
+
+# Instancia global del registro de uso
+usage_tracker = UsageTracker(
+    batch_size=langchain_settings.usage_flush_batch_size,
+    flush_interval=langchain_settings.usage_flush_interval,
+)
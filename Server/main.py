@@ -1,10 +1,11 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 import logging
 import uvicorn
 import os
+import sys
 import asyncio
 from threading import Thread
 
@@ -15,13 +16,27 @@ try:
 except Exception:
     pass
 
+# Añadir el directorio del servidor al path para importar config
+sys.path.append(os.path.dirname(__file__))
+from config import langchain_settings
+
 from Server.api.endpoints import chat, routes, family, debug, auth
 from Server.core.models.database import Database
-from Server.core.agents.raton_perez import raton_perez, RatonPerez
+from Server.core.agents.raton_perez import raton_perez, RatonPerez, groq_service
 
 # Importar servicios optimizados
 from Server.core.services.embedding_service import embedding_service
-from Server.core.agents.madrid_knowledge import initialize_madrid_knowledge
+from Server.core.agents.madrid_knowledge import initialize_madrid_knowledge, initialize_poi_content, build_reduced_index
+from Server.core.services.poi_content_store import poi_content_store
+from Server.core.services.response_cache import response_cache
+from Server.core.services.prefetch_cache import prefetch_cache
+from Server.core.services.arrival_narratives import arrival_narratives
+from Server.core.services.usage_tracker import usage_tracker
+from Server.core.security.dependencies import AuthenticatedUser, require_admin
+from Server.core.services.reduced_index import reduced_index
+from Server.core.services.tracing import start_trace, stage_histograms
+from Server.core.agents.prompt_builder import prompt_builder
+from Server.core.services.tokenizer import tokenizer
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -31,6 +46,28 @@ def background_knowledge_initialization():
     Inicialización en background de la base de conocimiento
     Para no bloquear el startup del servidor
     """
+    # tiktoken descarga el BPE la primera vez: mejor aquí que en la primera petición
+    logger.info(f"🔤 Tokenizador exacto: {tokenizer.is_exact}")
+
+    try:
+        loaded = initialize_poi_content()
+        logger.info(f"📚 Contenido de POIs en memoria: {loaded} precargados desde Pinecone")
+    except Exception as e:
+        logger.error(f"❌ Error precargando contenido de POIs: {e}")
+
+    # Lo que sigue necesita el modelo: esperar a la carga de fondo (sin bloquear requests)
+    if not embedding_service.wait_until_ready():
+        logger.warning(f"⚠️ Modelo de embeddings no disponible ({embedding_service.state}), "
+                       "se omite la indexación; las búsquedas usan keywords")
+        return
+
+    try:
+        indexed = build_reduced_index()
+        if indexed:
+            logger.info(f"📐 Índice local de dimensión reducida: {indexed} pasajes")
+    except Exception as e:
+        logger.error(f"❌ Error construyendo el índice de dimensión reducida: {e}")
+
     try:
         logger.info("🔄 Iniciando inicialización de base de conocimiento en background...")
         success = initialize_madrid_knowledge()
@@ -58,19 +95,26 @@ async def lifespan(app: FastAPI):
 
     # ============ FASE 2: SERVICIOS DE IA (NO BLOQUEANTES) ============
     
-    # Warm up del servicio de embeddings (no bloquea startup)
-    try:
-        logger.info("🔥 Iniciando warm-up del servicio de embeddings...")
-        embedding_service.warm_up()
-        logger.info("✅ Servicio de embeddings listo")
-    except Exception as e:
-        logger.warning(f"⚠️ Error en warm-up de embeddings: {e}")
+    # Carga del modelo de embeddings en background: el servidor acepta tráfico ya y,
+    # hasta que esté listo, la recuperación usa el camino por keywords
+    if langchain_settings.embedding_model_warm_up:
+        state = embedding_service.start_loading()
+        logger.info(f"🔥 Modelo de embeddings cargando en background (estado: {state})")
+
+    # Snapshot local de POIs: los primeros requests ya leen de memoria
+    poi_content_store.load_snapshot()
+    arrival_narratives.load()
 
     # Inicializar agente (ahora usa servicios optimizados)
     global raton_perez
     raton_perez = RatonPerez(db)
     logger.info("✅ Ratoncito Pérez inicializado con servicios optimizados")
 
+    # Volcado periódico del uso del LLM (tokens, latencia, coste) a llm_usage
+    if db.connection:
+        usage_tracker.ensure_table(db)
+        usage_tracker.start_background_flush(Database)
+
     # ============ FASE 3: INICIALIZACIÓN BACKGROUND ============
     
     # Lanzar inicialización de base de conocimiento en background
@@ -81,7 +125,7 @@ async def lifespan(app: FastAPI):
     # ============ FASE 4: VERIFICACIÓN DE ESQUEMA ============
     
     # Verificar tablas (actualizado con nuevas tablas de auth)
-    required_tables = ['users', 'families', 'family_members', 'family_route_progress']
+    required_tables = ['users', 'families', 'family_members', 'family_route_progress', 'llm_usage']
     try:
         if db.connection:
             result = db.execute_query("""
@@ -119,6 +163,9 @@ async def lifespan(app: FastAPI):
 
     logger.info("🔄 Cerrando aplicación...")
     
+    poi_content_store.stop_background_refresh()
+    usage_tracker.stop_background_flush()
+
     # Limpiar caches
     try:
         embedding_service.clear_cache()
@@ -148,6 +195,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Server-Timing: etapas medidas durante el request (context_load, retrieval, groq, db_save...)
+@app.middleware("http")
+async def server_timing_middleware(request: Request, call_next):
+    trace = start_trace()
+    response = await call_next(request)
+    if trace.stages:
+        response.headers["Server-Timing"] = trace.server_timing_header()
+    return response
+
 # ROUTERS
 app.include_router(auth.router, prefix="/api")    
 app.include_router(chat.router, prefix="/api")
@@ -186,10 +242,10 @@ async def health_check(request: Request):
     status = {
         "status": "healthy",
         "database": "connected" if db and db.health_check() else "disconnected",
-        "embedding_service": "ready" if embedding_service.is_available() else "not_ready",
+        "embedding_service": embedding_service.get_readiness()["state"],
         "timestamp": int(__import__('time').time())
     }
-    if status["database"] == "disconnected" or status["embedding_service"] == "not_ready":
+    if status["database"] == "disconnected" or status["embedding_service"] != "ready":
         status["status"] = "degraded"
     return status
 
@@ -212,6 +268,7 @@ def healthz():
         embedding_stats = embedding_service.get_cache_stats()
         status["embedding_service"] = {
             "available": embedding_service.is_available(),
+            **embedding_service.get_readiness(),
             "model_loaded": embedding_stats["model_loaded"],
             "model_name": embedding_stats["model_name"],
             "cache_size": embedding_stats["cache_size"],
@@ -274,6 +331,15 @@ async def service_stats():
     try:
         stats = {
             "embedding_service": embedding_service.get_cache_stats() if embedding_service else {"available": False},
+            "poi_content_store": poi_content_store.get_stats(),
+            "response_cache": response_cache.get_stats(),
+            "prefetch": prefetch_cache.get_stats(),
+            "arrival_narratives": arrival_narratives.get_stats(),
+            "chat_stages": stage_histograms.get_stats(),
+            "prompt_builder": prompt_builder.get_stats(),
+            "llm": groq_service.get_stats(),
+            "usage": usage_tracker.get_stats(),
+            "reduced_index": reduced_index.get_stats(),
             "timestamp": int(__import__('time').time())
         }
         
@@ -289,6 +355,26 @@ async def service_stats():
     except Exception as e:
         return {"error": str(e), "timestamp": int(__import__('time').time())}
 
+# Desglose del uso del LLM por familia, tipo de situación, modelo o POI
+@app.get("/api/stats/usage")
+async def usage_stats(request: Request, by: str = "family", limit: int = 20,
+                      source: str = "memory", since_hours: int = 24,
+                      admin: AuthenticatedUser = Depends(require_admin)):
+    """
+    Solo administradores (ADMIN_EMAILS): el desglose expone el uso de todas las familias
+    source=memory: desde el arranque del proceso (incluye lo aún no volcado)
+    source=db: histórico persistido en llm_usage de las últimas since_hours horas
+    """
+    try:
+        if source == "db":
+            db = request.app.state.db
+            rows = await asyncio.to_thread(usage_tracker.breakdown_from_db, db, by, limit, since_hours)
+        else:
+            rows = usage_tracker.breakdown(by, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"by": by, "source": source, "totals": usage_tracker.get_stats(), "rows": rows}
+
 # Exception handlers
 @app.exception_handler(404)
 async def not_found_handler(request, exc):
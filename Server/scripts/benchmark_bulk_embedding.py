@@ -0,0 +1,111 @@
+"""
+Pasajes/segundo de la ingesta masiva frente al bucle de initialize_madrid_knowledge
+Compara, sobre el mismo corpus:
+  - loop:    un pasaje por llamada (lo que hacía initialize_madrid_knowledge)
+  - batched: lotes ordenados por longitud en un solo proceso (bulk_encode, workers=1)
+  - pool:    los mismos lotes repartidos en N procesos (bulk_encode, workers=N)
+
+Por defecto el codificador es sintético y consume CPU como un transformer: coste fijo por
+llamada + coste por token del lote rellenado (n_textos * longitud máxima), así que refleja
+tanto lo que ahorra agrupar y ordenar como lo que escala con los núcleos sin descargar el
+modelo. Con --real usa el modelo configurado (sentence_transformers/onnx) en cada proceso
+
+Uso:
+    python -m Server.scripts.benchmark_bulk_embedding --passages 2000 --workers 1 2 4
+    python -m Server.scripts.benchmark_bulk_embedding --real --passages 500
+"""
+
+import os
+import json
+import zlib
+import time
+import argparse
+from typing import Dict, List
+
+import numpy as np
+
+from Server.core.services.bulk_embedding import bulk_encode, default_encoder_factory
+from Server.core.services.tokenizer import tokenizer
+
+
+class SyntheticEncoder:
+    """Coste de CPU proporcional al lote rellenado; vector determinista por texto"""
+
+    def __init__(self, dimension: int = 1024, call_us: float = 2000.0, token_us: float = 8.0):
+        self.dimension = dimension
+        self.call_us = call_us
+        self.token_us = token_us
+
+    def encode(self, texts: List[str], normalize_embeddings: bool = True) -> np.ndarray:
+        padded = len(texts) * max(tokenizer.count(text) for text in texts)
+        deadline = time.perf_counter() + (self.call_us + self.token_us * padded) / 1e6
+        while time.perf_counter() < deadline:
+            pass
+        vectors = np.stack([np.random.default_rng(zlib.crc32(text.encode("utf-8"))).standard_normal(self.dimension)
+                            for text in texts]).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def synthetic_encoder_factory() -> SyntheticEncoder:
+    return SyntheticEncoder()
+
+
+def build_passages(count: int, seed: int = 5) -> List[str]:
+    """Pasajes de 10 a 300 palabras (los extractos de Wikipedia varían mucho de largo)"""
+    rng = np.random.default_rng(seed)
+    words = ("plaza calle palacio ratón pérez diente museo historia madrid rey teatro "
+             "mercado siglo iglesia arenal puerta sol fuente jardín").split()
+    return [" ".join(rng.choice(words, size=int(rng.integers(10, 300)))) for _ in range(count)]
+
+
+def run(passages: List[str], factory, workers: List[int], batch_size: int) -> Dict[str, Dict]:
+    local = factory()
+    in_process = lambda texts, text_type: local.encode([f"{text_type}: {t}" for t in texts])
+    results = {}
+
+    start = time.perf_counter()
+    for text in passages:
+        in_process([text], "passage")
+    results["loop"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bulk_encode(passages, workers=1, batch_size=batch_size, encode_fn=in_process)
+    results["batched"] = time.perf_counter() - start
+
+    for count in workers:
+        if count <= 1:
+            continue
+        start = time.perf_counter()
+        bulk_encode(passages, workers=count, batch_size=batch_size, encoder_factory=factory)
+        results[f"pool x{count}"] = time.perf_counter() - start
+
+    return {name: {"seconds": round(seconds, 2),
+                   "passages_per_s": round(len(passages) / seconds, 1),
+                   "speedup_vs_loop": round(results["loop"] / seconds, 2)}
+            for name, seconds in results.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la ingesta masiva de pasajes")
+    parser.add_argument("--passages", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, os.cpu_count() or 1])
+    parser.add_argument("--real", action="store_true", help="Usar el modelo configurado en lugar del sintético")
+    parser.add_argument("--output", default=None, help="Guardar resultados en JSON")
+    args = parser.parse_args()
+
+    passages = build_passages(args.passages)
+    factory = default_encoder_factory if args.real else synthetic_encoder_factory
+    results = run(passages, factory, sorted(set(args.workers)), args.batch_size)
+
+    print(f"{len(passages)} pasajes, lotes de {args.batch_size}, {os.cpu_count()} núcleos")
+    print(f"{'modo':>10} | {'s':>7} {'pasajes/s':>10} {'x loop':>7}")
+    for name, r in results.items():
+        print(f"{name:>10} | {r['seconds']:>7} {r['passages_per_s']:>10} {r['speedup_vs_loop']:>7}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
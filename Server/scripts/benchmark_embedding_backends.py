@@ -0,0 +1,161 @@
+"""
+Precisión, latencia y memoria de los backends de embeddings
+Compara PyTorch (SentenceTransformer, la referencia) con ONNX fp32 y ONNX int8 sobre el
+corpus de POIs de la ruta:
+  - acuerdo: coseno entre el vector de referencia y el del backend para el mismo texto
+  - recall@1 / recall@3: la consulta sintética de cada POI recupera su pasaje
+  - top-1 igual a la referencia: mismo pasaje ganador que PyTorch
+  - carga (s), RSS tras cargar (MB), p50/p95 de una consulta y throughput en lotes de 32
+
+Los pasajes son nombre + descripción de cada POI; con --wikipedia se usa el extracto real
+(requiere red). Cada backend se mide en un proceso nuevo para que la memoria no se mezcle
+
+Uso:
+    python -m Server.scripts.benchmark_embedding_backends --onnx-dir models/intfloat__e5-large-v2-onnx
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from types import SimpleNamespace
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from Server.core.agents.location_helper import RATON_PEREZ_ROUTE
+from Server.core.services.embedding_backends import build_encoder
+
+QUERY_TEMPLATES = [
+    "¿Qué historia tiene {name}?",
+    "Cuéntame curiosidades de {name}",
+    "¿Qué podemos ver en {name}?",
+]
+
+BACKENDS = {
+    "pytorch": {"embedding_backend": "sentence_transformers"},
+    "onnx_fp32": {"embedding_backend": "onnx", "embedding_onnx_quantized": False},
+    "onnx_int8": {"embedding_backend": "onnx", "embedding_onnx_quantized": True},
+}
+
+
+def build_corpus(wikipedia: bool) -> Tuple[List[str], List[str], List[int]]:
+    passages = []
+    for poi in RATON_PEREZ_ROUTE:
+        text = f"{poi['name']}: {poi['description']}"
+        if wikipedia:
+            from Server.core.agents.madrid_knowledge import fetch_wikipedia_content
+            text = fetch_wikipedia_content(poi["name"]).get("basic_info") or text
+        passages.append(f"passage: {text}")
+    queries, labels = [], []
+    for index, poi in enumerate(RATON_PEREZ_ROUTE):
+        for template in QUERY_TEMPLATES:
+            queries.append(f"query: {template.format(name=poi['name'])}")
+            labels.append(index)
+    return passages, queries, labels
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def measure(backend: str, model_name: str, onnx_dir: str, wikipedia: bool, repeats: int) -> Dict:
+    """Se ejecuta en un proceso hijo: carga, codifica el corpus y mide latencias"""
+    settings = SimpleNamespace(embedding_onnx_path=onnx_dir, embedding_onnx_threads=0, **BACKENDS[backend])
+    passages, queries, _ = build_corpus(wikipedia)
+
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    encoder = build_encoder(settings, model_name)
+    load_s = time.perf_counter() - start
+    encoder.encode(queries[:1])  # primera pasada fuera de la medida
+
+    single = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        encoder.encode([queries[i % len(queries)]])
+        single.append((time.perf_counter() - start) * 1000)
+    batch = (queries * 2)[:32]
+    start = time.perf_counter()
+    for _ in range(max(1, repeats // 10)):
+        encoder.encode(batch)
+    batch_qps = 32 * max(1, repeats // 10) / (time.perf_counter() - start)
+
+    return {
+        "load_s": round(load_s, 2),
+        "rss_mb": round(_rss_mb() - rss_before, 1),
+        "p50_ms": round(float(np.percentile(single, 50)), 1),
+        "p95_ms": round(float(np.percentile(single, 95)), 1),
+        "batch32_qps": round(batch_qps, 1),
+        "passages": encoder.encode(passages).tolist(),
+        "queries": encoder.encode(queries).tolist(),
+    }
+
+
+def accuracy(reference: Dict, candidate: Dict, labels: List[int]) -> Dict:
+    ref_p, ref_q = np.asarray(reference["passages"]), np.asarray(reference["queries"])
+    cand_p, cand_q = np.asarray(candidate["passages"]), np.asarray(candidate["queries"])
+    agreement = np.concatenate([np.sum(ref_p * cand_p, axis=1), np.sum(ref_q * cand_q, axis=1)])
+    ranking = np.argsort(-(cand_q @ cand_p.T), axis=1)
+    ref_top1 = np.argmax(ref_q @ ref_p.T, axis=1)
+    labels = np.asarray(labels)
+    return {
+        "cosine_mean": round(float(agreement.mean()), 4),
+        "cosine_min": round(float(agreement.min()), 4),
+        "recall@1": round(float(np.mean(ranking[:, 0] == labels)), 3),
+        "recall@3": round(float(np.mean([label in row[:3] for row, label in zip(ranking, labels)])), 3),
+        "top1_same_as_pytorch": round(float(np.mean(ranking[:, 0] == ref_top1)), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de backends de embeddings")
+    parser.add_argument("--model", default=os.getenv("PINECONE_EMBEDDING_MODEL", "intfloat/e5-large-v2"))
+    parser.add_argument("--onnx-dir", required=True)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--wikipedia", action="store_true")
+    parser.add_argument("--output", default=None, help="Guardar resultados en JSON")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # Última línea de stdout = resultado (por si alguna dependencia imprime algo al cargar)
+        print()
+        print(json.dumps(measure(args.child, args.model, args.onnx_dir, args.wikipedia, args.repeats)))
+        return
+
+    runs = {}
+    for backend in args.backends:
+        command = [sys.executable, "-m", "Server.scripts.benchmark_embedding_backends", "--child", backend,
+                   "--model", args.model, "--onnx-dir", args.onnx_dir, "--repeats", str(args.repeats)]
+        if args.wikipedia:
+            command.append("--wikipedia")
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        runs[backend] = json.loads(output.strip().splitlines()[-1])
+
+    _, _, labels = build_corpus(False)
+    reference = runs.get("pytorch")
+    results = {}
+    print(f"{'backend':>10} | {'carga s':>7} {'RSS MB':>7} {'p50 ms':>7} {'p95 ms':>7} {'lote qps':>8} | "
+          f"{'coseno':>7} {'mín':>7} {'R@1':>5} {'R@3':>5} {'top1=pt':>7}")
+    for backend, run in runs.items():
+        quality = accuracy(reference or run, run, labels)
+        results[backend] = {**{k: v for k, v in run.items() if k not in ("passages", "queries")}, **quality}
+        r = results[backend]
+        print(f"{backend:>10} | {r['load_s']:>7} {r['rss_mb']:>7} {r['p50_ms']:>7} {r['p95_ms']:>7} "
+              f"{r['batch32_qps']:>8} | {r['cosine_mean']:>7} {r['cosine_min']:>7} {r['recall@1']:>5} "
+              f"{r['recall@3']:>5} {r['top1_same_as_pytorch']:>7}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark del micro-batching de embeddings
+Compara una pasada del modelo por consulta (como antes) con EmbeddingBatcher a 1/8/32/128
+llamadores concurrentes: throughput (consultas/s) y p50/p95 de latencia por consulta.
+Por defecto usa un codificador sintético con el perfil de coste de e5-large en CPU
+(coste fijo por pasada + coste por texto, una pasada a la vez); con --real usa el modelo
+
+Uso:
+    python -m Server.scripts.benchmark_embedding_batcher --requests 256
+    python -m Server.scripts.benchmark_embedding_batcher --real --concurrency 1 8 32
+"""
+
+import json
+import time
+import asyncio
+import argparse
+import threading
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from Server.core.services.embedding_batcher import EmbeddingBatcher
+
+
+class SyntheticEncoder:
+    """Una pasada a la vez (el modelo satura la CPU): fixed_ms + per_item_ms por texto"""
+
+    def __init__(self, fixed_ms: float = 25.0, per_item_ms: float = 2.0, dimension: int = 1024):
+        self.fixed = fixed_ms / 1000
+        self.per_item = per_item_ms / 1000
+        self.dimension = dimension
+        self._lock = threading.Lock()
+
+    def __call__(self, texts: List[str], text_type: str = "query") -> List[np.ndarray]:
+        with self._lock:
+            time.sleep(self.fixed + self.per_item * len(texts))
+        return [np.zeros(self.dimension, dtype=np.float32) for _ in texts]
+
+
+def real_encoder() -> Callable[[List[str], str], List]:
+    from Server.core.services.embedding_service import embedding_service
+    model = embedding_service._get_model()
+
+    def encode(texts: List[str], text_type: str = "query"):
+        return list(model.encode([f"{text_type}: {t}" for t in texts], normalize_embeddings=True))
+    return encode
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 1)
+
+
+async def _run(concurrency: int, total: int, embed) -> Dict[str, float]:
+    latencies: List[float] = []
+    counter = iter(range(total))
+
+    async def caller(worker: int):
+        for n in counter:
+            start = time.perf_counter()
+            await embed(f"consulta {worker}-{n}: ¿qué hay en esta plaza de Madrid?")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(caller(w) for w in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "throughput_qps": round(total / elapsed, 1),
+        "p50_ms": _percentile(latencies, 50),
+        "p95_ms": _percentile(latencies, 95),
+    }
+
+
+def benchmark(encode, concurrency_levels: List[int], total: int, max_batch: int, max_wait_ms: float) -> Dict:
+    results = {}
+    for concurrency in concurrency_levels:
+        # Sin batching: cada consulta es su propia pasada, desde un hilo (como asyncio.to_thread)
+        unbatched = asyncio.run(_run(concurrency, total, lambda t: asyncio.to_thread(encode, [t], "query")))
+        batcher = EmbeddingBatcher(encode, max_batch=max_batch, max_wait_ms=max_wait_ms)
+        batched = asyncio.run(_run(concurrency, total, lambda t: batcher.aembed(t, "query")))
+        batched["avg_batch_size"] = batcher.get_stats()["avg_batch_size"]
+        results[concurrency] = {"unbatched": unbatched, "batched": batched}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del micro-batching de embeddings")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--requests", type=int, default=256, help="Consultas por nivel de concurrencia")
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--real", action="store_true", help="Usar el modelo real en lugar del sintético")
+    parser.add_argument("--output", default=None, help="Guardar resultados en JSON")
+    args = parser.parse_args()
+
+    encode = real_encoder() if args.real else SyntheticEncoder()
+    results = benchmark(encode, args.concurrency, args.requests, args.max_batch, args.max_wait_ms)
+
+    print(f"{'concurrencia':>12} | {'sin batch qps':>13} {'p95 ms':>8} | {'batch qps':>9} {'p95 ms':>8} {'lote medio':>10}")
+    for concurrency, data in results.items():
+        u, b = data["unbatched"], data["batched"]
+        print(f"{concurrency:>12} | {u['throughput_qps']:>13} {u['p95_ms']:>8} | "
+              f"{b['throughput_qps']:>9} {b['p95_ms']:>8} {b['avg_batch_size']:>10}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"encoder": "real" if args.real else "synthetic", "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Microbenchmark del caché de embeddings
+Coste por consulta (acierto y fallo) y por inserción con el caché lleno: el dict anterior
+(MD5 del texto en cada consulta y en cada inserción, limpieza FIFO con list(keys())) frente
+al LRU actual (clave normalizada, OrderedDict con lock)
+
+Uso:
+    python -m Server.scripts.benchmark_embedding_cache --size 1000 --ops 200000
+"""
+
+import gc
+import time
+import random
+import hashlib
+import argparse
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from Server.core.services.embedding_cache import EmbeddingCache, cache_key
+
+
+class LegacyDictCache:
+    """Reproducción del caché anterior de EmbeddingService, para comparar"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: Dict[str, object] = {}
+
+    @staticmethod
+    def key(text: str, text_type: str) -> str:
+        return hashlib.md5(f"{text_type}:{text}".encode()).hexdigest()
+
+    def get(self, text: str, text_type: str):
+        key = self.key(text, text_type)
+        return self.entries[key] if key in self.entries else None
+
+    def put(self, text: str, text_type: str, value):
+        self.entries[self.key(text, text_type)] = value
+        if len(self.entries) > self.max_size:
+            items_to_remove = len(self.entries) - int(self.max_size * 0.8)
+            for key in list(self.entries.keys())[:items_to_remove]:
+                del self.entries[key]
+
+
+class LRUAdapter:
+    def __init__(self, max_size: int):
+        self.cache = EmbeddingCache(max_size)
+
+    def get(self, text: str, text_type: str):
+        return self.cache.get(cache_key(text, text_type))
+
+    def put(self, text: str, text_type: str, value):
+        self.cache.put(cache_key(text, text_type), value)
+
+
+def _per_op_ns(fn: Callable[[str], None], texts: List[str]) -> float:
+    start = time.perf_counter_ns()
+    for text in texts:
+        fn(text)
+    return round((time.perf_counter_ns() - start) / len(texts), 1)
+
+
+def _insert_tail_us(cache, texts: List[str], value) -> Dict[str, float]:
+    """p99.9 y peor inserción: la limpieza FIFO del dict anterior concentra el coste en picos"""
+    samples = []
+    gc.disable()  # que una pasada del GC no se confunda con un pico del caché
+    for text in texts:
+        start = time.perf_counter_ns()
+        cache.put(text, "query", value)
+        samples.append(time.perf_counter_ns() - start)
+    gc.enable()
+    samples.sort()
+    return {
+        "insert_p999_us": round(samples[int(len(samples) * 0.999)] / 1000, 1),
+        "insert_max_us": round(samples[-1] / 1000, 1),
+    }
+
+
+def run(size: int, ops: int, seed: int = 7) -> Dict[str, Dict[str, float]]:
+    rng = random.Random(seed)
+    vector = np.zeros(1024, dtype=np.float32)
+    resident = [f"¿Qué curiosidades tiene el lugar número {i} de Madrid?" for i in range(size)]
+    hits = [rng.choice(resident) for _ in range(ops)]
+    misses = [f"pregunta nueva {i} sobre la Puerta del Sol" for i in range(ops)]
+
+    results = {}
+    for name, factory in (("legacy_dict_md5", LegacyDictCache), ("lru", LRUAdapter)):
+        cache = factory(size)
+        for text in resident:
+            cache.put(text, "query", vector)
+        results[name] = {
+            "hit_ns": _per_op_ns(lambda t: cache.get(t, "query"), hits),
+            "miss_ns": _per_op_ns(lambda t: cache.get(t, "query"), misses),
+            # Con el caché lleno cada inserción provoca expulsión
+            "insert_full_ns": _per_op_ns(lambda t: cache.put(t, "query", vector), misses),
+            **_insert_tail_us(cache, [f"otra {t}" for t in misses], vector),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark del caché de embeddings")
+    parser.add_argument("--size", type=int, default=1000)
+    parser.add_argument("--ops", type=int, default=200000)
+    args = parser.parse_args()
+
+    results = run(args.size, args.ops)
+    print(f"{'caché':>16} | {'acierto ns':>10} {'fallo ns':>9} {'inserción llena ns':>19} {'p99.9 us':>9} {'peor us':>8}")
+    for name, data in results.items():
+        print(f"{name:>16} | {data['hit_ns']:>10} {data['miss_ns']:>9} {data['insert_full_ns']:>19} "
+              f"{data['insert_p999_us']:>9} {data['insert_max_us']:>8}")
+
+
+if __name__ == "__main__":
+    main()
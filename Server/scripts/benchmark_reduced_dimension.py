@@ -0,0 +1,120 @@
+"""
+Recall frente a latencia del índice de dimensión reducida
+Para cada dimensión (por defecto 64/128/256/1024) y método (pca, truncate) mide:
+  - recall@1 / recall@3 respecto al pasaje correcto de cada consulta
+  - acuerdo top-3 con la búsqueda a dimensión completa
+  - p50/p95 de una búsqueda y bytes por vector (float32)
+
+Por defecto usa un corpus sintético con la forma de unos embeddings reales (espectro
+decreciente, consultas = pasaje + ruido) y tamaño configurable, porque con los POIs de la
+ruta la PCA queda limitada al nº de pasajes. Con --real codifica los POIs (nombre +
+descripción, o el extracto de Wikipedia con --wikipedia) y consultas sintéticas por POI;
+ahí las dimensiones por encima del rango del corpus (nº de POIs - 1 con pca) se miden
+acotadas y salen marcadas con "!" (capped)
+
+Uso:
+    python -m Server.scripts.benchmark_reduced_dimension --passages 2000
+    python -m Server.scripts.benchmark_reduced_dimension --real --wikipedia
+"""
+
+import json
+import time
+import argparse
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from Server.core.services.reduced_index import ReducedIndex
+
+
+def synthetic_corpus(passages: int, queries_per_passage: int, dimension: int = 1024, latent: int = 96,
+                     noise: float = 1.5, seed: int = 11) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    # Espectro decreciente: unas pocas direcciones concentran casi toda la varianza
+    basis = rng.standard_normal((latent, dimension)) * (1.0 / np.arange(1, latent + 1) ** 0.5)[:, None]
+    docs = rng.standard_normal((passages, latent)) @ basis + 0.02 * rng.standard_normal((passages, dimension))
+    docs /= np.linalg.norm(docs, axis=1, keepdims=True)
+    labels = np.repeat(np.arange(passages), queries_per_passage)
+    queries = docs[labels] + noise * rng.standard_normal((len(labels), dimension)) / np.sqrt(dimension) * 4
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return docs.astype(np.float32), queries.astype(np.float32), labels
+
+
+def real_corpus(wikipedia: bool) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    from Server.scripts.benchmark_embedding_backends import build_corpus
+    from Server.core.services.embedding_service import embedding_service
+
+    passages, queries, labels = build_corpus(wikipedia)
+    # build_corpus ya añade los prefijos de e5; el servicio los vuelve a poner
+    strip = lambda texts, prefix: [t[len(prefix):] for t in texts]
+    embedding_service.warm_up()
+    doc_vectors = embedding_service.generate_passage_embeddings(strip(passages, "passage: "))
+    query_vectors = embedding_service.generate_embeddings(strip(queries, "query: "), "query")
+    if len(doc_vectors) != len(passages) or len(query_vectors) != len(queries):
+        raise RuntimeError("No se pudieron codificar los POIs (¿modelo de embeddings disponible?)")
+    docs, qs = np.stack(doc_vectors), np.stack(query_vectors)
+    return docs.astype(np.float32), qs.astype(np.float32), np.asarray(labels)
+
+
+def evaluate(docs: np.ndarray, queries: np.ndarray, labels: np.ndarray, dimensions: List[int]) -> Dict:
+    ids = [str(i) for i in range(len(docs))]
+    full = np.argsort(-(queries @ docs.T), axis=1)[:, :3]
+    results = {}
+    for method in ("pca", "truncate"):
+        index = ReducedIndex(method=method)
+        index.load(ids, docs)
+        for dimension in dimensions:
+            index.set_dimension(dimension)
+            timings, top1, top3, overlap = [], 0, 0, 0.0
+            for query, label, reference in zip(queries, labels, full):
+                start = time.perf_counter()
+                found = [int(r["id"]) for r in index.search(query, top_k=3)]
+                timings.append((time.perf_counter() - start) * 1e6)
+                top1 += found[0] == label
+                top3 += label in found
+                overlap += len(set(found) & set(reference.tolist())) / 3
+            n = len(queries)
+            results[f"{method}@{dimension}"] = {
+                "effective_dimension": index.dimension,
+                "capped": index.capped,
+                "recall@1": round(top1 / n, 3),
+                "recall@3": round(top3 / n, 3),
+                "top3_overlap_with_full": round(overlap / n, 3),
+                "search_p50_us": round(float(np.percentile(timings, 50)), 1),
+                "search_p95_us": round(float(np.percentile(timings, 95)), 1),
+                "bytes_per_vector": index.dimension * 4,
+                "explained_variance": index.get_stats().get("explained_variance"),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs latencia por dimensión de embedding")
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[64, 128, 256, 1024])
+    parser.add_argument("--passages", type=int, default=2000, help="Tamaño del corpus sintético")
+    parser.add_argument("--queries-per-passage", type=int, default=1)
+    parser.add_argument("--real", action="store_true", help="Codificar los POIs con el modelo real")
+    parser.add_argument("--wikipedia", action="store_true")
+    parser.add_argument("--output", default=None, help="Guardar resultados en JSON")
+    args = parser.parse_args()
+
+    if args.real:
+        docs, queries, labels = real_corpus(args.wikipedia)
+    else:
+        docs, queries, labels = synthetic_corpus(args.passages, args.queries_per_passage)
+    results = evaluate(docs, queries, labels, args.dimensions)
+
+    print(f"corpus: {len(docs)} pasajes, {len(queries)} consultas, dimensión {docs.shape[1]}")
+    print(f"{'config':>14} | {'dim':>5} {'R@1':>6} {'R@3':>6} {'top3=full':>9} {'p50 us':>7} {'p95 us':>7} {'bytes':>6}")
+    for name, r in results.items():
+        dim = f"{r['effective_dimension']}{'!' if r['capped'] else ''}"
+        print(f"{name:>14} | {dim:>5} {r['recall@1']:>6} {r['recall@3']:>6} "
+              f"{r['top3_overlap_with_full']:>9} {r['search_p50_us']:>7} {r['search_p95_us']:>7} "
+              f"{r['bytes_per_vector']:>6}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"passages": len(docs), "queries": len(queries), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
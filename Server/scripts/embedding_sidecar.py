@@ -0,0 +1,53 @@
+"""
+Sidecar de embeddings: carga el modelo una sola vez y lo sirve por un socket Unix
+Los workers de uvicorn se configuran con EMBEDDING_SIDECAR_SOCKET apuntando al mismo
+socket; EmbeddingService pasa a ser un cliente ligero que conserva su caché local.
+Las peticiones de todos los workers se agrupan en el mismo micro-batcher
+
+Uso:
+    python -m Server.scripts.embedding_sidecar --socket /tmp/raton-perez-embeddings.sock
+    EMBEDDING_SIDECAR_SOCKET=/tmp/raton-perez-embeddings.sock uvicorn Server.main:app --workers 4
+"""
+
+import os
+import sys
+import asyncio
+import logging
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from config import langchain_settings
+
+from Server.core.services.embedding_service import embedding_service
+from Server.core.services.embedding_sidecar import EmbeddingSidecarServer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sidecar de embeddings compartido por los workers")
+    parser.add_argument("--socket", default=langchain_settings.embedding_sidecar_socket
+                        or "/tmp/raton-perez-embeddings.sock")
+    parser.add_argument("--max-batch", type=int, default=langchain_settings.embedding_microbatch_max_size)
+    parser.add_argument("--max-wait-ms", type=float, default=langchain_settings.embedding_microbatch_wait_ms)
+    args = parser.parse_args()
+
+    # El sidecar es quien carga el modelo: nunca debe llamarse a sí mismo
+    embedding_service.use_local_model()
+    embedding_service.warm_up()
+    # Con raise_errors el fallo real (no un [] silencioso) llega al cliente en la trama de error
+    server = EmbeddingSidecarServer(
+        args.socket, lambda texts, text_type: embedding_service.generate_embeddings(texts, text_type, raise_errors=True),
+        max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        logger.info("🛑 Sidecar de embeddings detenido")
+    finally:
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
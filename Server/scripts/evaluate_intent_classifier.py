@@ -0,0 +1,130 @@
+"""
+Precisión del clasificador de intención frente al baseline por keywords
+Evalúa sobre un conjunto etiquetado de mensajes reales de familias (distintos de las
+frases prototipo) si el mensaje es una pregunta sobre un lugar (location_question) o
+conversación general, y compara:
+  - keywords: keyword_is_location_question (el criterio anterior y el fallback sin modelo)
+  - classifier: IntentClassifier con el modelo de embeddings configurado, para una rejilla
+    de min_similarity x margin (la configuración en uso va marcada con *)
+
+El clasificador está desactivado (intent_classifier_enabled=False) hasta que esta evaluación
+se ejecute con el modelo real: activarlo solo con un par de umbrales que supere al baseline
+en precisión sin perder recall, y fijarlos en intent_classifier_min_similarity/_margin
+
+Uso:
+    python -m Server.scripts.evaluate_intent_classifier
+    python -m Server.scripts.evaluate_intent_classifier --keywords-only
+"""
+
+import json
+import argparse
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from Server.core.agents.retrieval_context import IntentClassifier, intent_classifier, keyword_is_location_question
+
+# (mensaje, es pregunta sobre un lugar)
+LABELLED_MESSAGES: List[Tuple[str, bool]] = [
+    ("¿Quién vivía en este palacio?", True),
+    ("¿Por qué esta plaza tiene forma redonda?", True),
+    ("¿Cuántos años tiene esa iglesia?", True),
+    ("¿Qué significa el nombre de esta calle?", True),
+    ("¿Aquí había un mercado antes?", True),
+    ("¿De qué está hecha la estatua del caballo?", True),
+    ("¿Es verdad que el ratón vivía en una caja de galletas?", True),
+    ("¿Cuál es el edificio más antiguo de por aquí?", True),
+    ("¿Qué pasó en la Puerta del Sol?", True),
+    ("Cuéntanos algo chulo de este sitio", True),
+    ("¿Quién es el señor de la estatua?", True),
+    ("¿Por qué hay un oso en el escudo?", True),
+    ("¿Los reyes de verdad vivieron ahí dentro?", True),
+    ("¿Qué se hace en el teatro real?", True),
+    ("¿Y esa torre para qué sirve?", True),
+    ("¿Qué hay debajo del pasadizo?", True),
+    ("¿Cuándo abrieron la chocolatería de San Ginés?", True),
+    ("¿Hay algún fantasma en este lugar?", True),
+    ("Háblanos de la fuente", True),
+    ("¿Cómo se llamaba esta calle antes?", True),
+    ("¡Hola Ratoncito!", False),
+    ("Mi hermana se ha caído pero está bien", False),
+    ("¿Cuántos puntos llevamos ya?", False),
+    ("Tengo sed", False),
+    ("Me encanta esta aventura", False),
+    ("¿Tú tienes hermanos?", False),
+    ("¿Cuál es tu comida favorita?", False),
+    ("Vale, seguimos", False),
+    ("Jajaja qué gracioso", False),
+    ("Estamos cansados, ¿falta mucho?", False),
+    ("¿Me guardas mi diente?", False),
+    ("Adiós, hasta mañana", False),
+    ("Mi papá dice que eres muy listo", False),
+    ("¿Podemos jugar a las adivinanzas?", False),
+    ("Hoy es mi cumpleaños", False),
+    ("¿Dónde está el baño?", False),
+    ("No me gusta la historia, quiero jugar", False),
+    ("Qué interesante eres, ratón", False),
+    ("Se me ha movido un diente", False),
+    ("Gracias por todo", False),
+]
+
+THRESHOLDS = [0.70, 0.75, 0.80, 0.85]
+MARGINS = [0.0, 0.02, 0.05]
+
+
+def metrics(predict: Callable[[int, str], bool]) -> Dict[str, float]:
+    tp = fp = fn = tn = 0
+    for index, (message, label) in enumerate(LABELLED_MESSAGES):
+        predicted = bool(predict(index, message))
+        tp += predicted and label
+        fp += predicted and not label
+        fn += label and not predicted
+        tn += not predicted and not label
+    return {
+        "accuracy": round((tp + tn) / len(LABELLED_MESSAGES), 3),
+        "precision": round(tp / (tp + fp), 3) if tp + fp else 0.0,
+        "recall": round(tp / (tp + fn), 3) if tp + fn else 0.0,
+    }
+
+
+def evaluate(keywords_only: bool = False) -> Dict[str, Dict[str, float]]:
+    results = {"keywords": metrics(lambda _, message: keyword_is_location_question(message))}
+    if keywords_only:
+        return results
+
+    from Server.core.services.embedding_service import embedding_service
+    embedding_service.warm_up()
+    embeddings = embedding_service.generate_embeddings([m for m, _ in LABELLED_MESSAGES], "query")
+    if len(embeddings) != len(LABELLED_MESSAGES):
+        raise RuntimeError("No se pudieron codificar los mensajes (¿modelo disponible?)")
+    vectors = np.stack(embeddings)
+
+    default = intent_classifier
+    for threshold in THRESHOLDS:
+        for margin in MARGINS:
+            classifier = IntentClassifier(margin=margin, min_similarity=threshold)
+            mark = "*" if (threshold, margin) == (default.min_similarity, default.margin) else ""
+            results[f"classifier@{threshold}/{margin}{mark}"] = metrics(
+                lambda index, _: classifier.is_location_question(vectors[index]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clasificador de intención vs keywords")
+    parser.add_argument("--keywords-only", action="store_true", help="Solo el baseline (sin modelo)")
+    parser.add_argument("--output", default=None, help="Guardar resultados en JSON")
+    args = parser.parse_args()
+
+    results = evaluate(args.keywords_only)
+    positives = sum(label for _, label in LABELLED_MESSAGES)
+    print(f"{len(LABELLED_MESSAGES)} mensajes ({positives} sobre lugares)")
+    print(f"{'método':>26} | {'acc':>6} {'prec':>6} {'recall':>6}")
+    for name, r in results.items():
+        print(f"{name:>26} | {r['accuracy']:>6} {r['precision']:>6} {r['recall']:>6}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
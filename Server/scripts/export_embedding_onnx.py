@@ -0,0 +1,69 @@
+"""
+Exporta el modelo de embeddings a ONNX y genera la variante cuantizada int8
+Deja en el directorio de salida model.onnx, model.int8.onnx (cuantización dinámica de
+pesos, QInt8) y tokenizer.json, que es lo que carga OnnxEncoder (embedding_backend="onnx").
+Solo hace falta en la máquina que exporta: torch, transformers y onnxruntime
+
+Uso:
+    python -m Server.scripts.export_embedding_onnx --output models/intfloat__e5-large-v2-onnx
+"""
+
+import os
+import argparse
+
+from Server.core.services.embedding_backends import ONNX_INT8_MODEL_FILE, ONNX_MODEL_FILE, TOKENIZER_FILE
+
+
+def export(model_name: str, output: str, opset: int = 17):
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    tokenizer.backend_tokenizer.save(os.path.join(output, TOKENIZER_FILE))
+
+    sample = tokenizer(["query: ¿qué es la Plaza Mayor?"], return_tensors="pt")
+    names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic = {name: {0: "batch", 1: "sequence"} for name in names}
+    dynamic["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in names),
+            os.path.join(output, ONNX_MODEL_FILE),
+            input_names=names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic,
+            opset_version=opset,
+        )
+
+
+def quantize(output: str):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(
+        os.path.join(output, ONNX_MODEL_FILE),
+        os.path.join(output, ONNX_INT8_MODEL_FILE),
+        weight_type=QuantType.QInt8,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta el modelo de embeddings a ONNX (fp32 + int8)")
+    parser.add_argument("--model", default=os.getenv("PINECONE_EMBEDDING_MODEL", "intfloat/e5-large-v2"))
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--skip-quantize", action="store_true")
+    args = parser.parse_args()
+
+    export(args.model, args.output, args.opset)
+    if not args.skip_quantize:
+        quantize(args.output)
+    for name in sorted(os.listdir(args.output)):
+        size = os.path.getsize(os.path.join(args.output, name)) / (1024 * 1024)
+        print(f"{name:>20}  {size:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Job offline: narraciones de llegada por POI y franja de edad
+Genera varias variantes para cada combinación de RATON_PEREZ_ROUTE x child_age_groups
+y las guarda en un artefacto JSON versionado que el agente sirve sin llamar al LLM.
+La versión es una huella del modelo, el prompt y el contenido de los POIs: si no cambia,
+el job no regenera nada salvo con --force
+
+Uso:
+    python -m Server.scripts.generate_arrival_narratives --variants 4 --concurrency 4
+"""
+
+import os
+import sys
+import asyncio
+import argparse
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Añadir el directorio raíz al path para importar config
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from config import langchain_settings
+
+from Server.core.agents.location_helper import RATON_PEREZ_ROUTE, arrival_announcement
+from Server.core.agents.madrid_knowledge import get_location_info
+from Server.core.agents.prompt_builder import PERSONA_PROMPT, SITUATION_TEMPLATE, ARRIVAL_TEMPLATE
+from Server.core.services.arrival_narratives import ArrivalNarratives, arrival_narratives, content_version, poi_fingerprint
+from Server.core.services.groq_service import groq_service
+from Server.core.services.poi_content_store import poi_content_store
+from Server.core.services.response_cache import NAME_PLACEHOLDER
+
+logger = logging.getLogger(__name__)
+
+FAMILY_TEMPLATE = """FAMILIA QUE VISITAS:
+Niños de {min_age} a {max_age} años.
+Dirígete a la familia escribiendo exactamente {placeholder} donde irían sus nombres."""
+
+# Un enfoque distinto por variante para que las narraciones no se repitan
+VARIANT_ANGLES = [
+    "Empieza con una curiosidad sorprendente del lugar.",
+    "Propón un pequeño juego de observación para hacer allí mismo.",
+    "Cuenta un detalle histórico como si fuera un secreto.",
+    "Relaciona el lugar con la magia de los dientes y tu ruta por Madrid.",
+    "Invita a imaginar cómo era el lugar hace cientos de años.",
+    "Reta a la familia a encontrar algo concreto a su alrededor.",
+]
+
+
+def build_system_prompt(min_age: int, max_age: int, poi_name: str, poi_info: str, angle: str) -> str:
+    family = FAMILY_TEMPLATE.format(min_age=min_age, max_age=max_age, placeholder=NAME_PLACEHOLDER)
+    situation = ARRIVAL_TEMPLATE.format(poi_name=poi_name, poi_info=poi_info)
+    return f"{PERSONA_PROMPT}\n\n{family}\n\n{SITUATION_TEMPLATE.format(situation_context=situation)}\n\nENFOQUE: {angle}"
+
+
+async def generate_variant(semaphore: asyncio.Semaphore, poi: Dict, poi_info: str,
+                           age_range: tuple, angle: str) -> Optional[str]:
+    system_prompt = build_system_prompt(age_range[0], age_range[1], poi["name"], poi_info, angle)
+    messages = groq_service.create_messages_with_history(system_prompt, arrival_announcement(poi))
+    max_tokens = langchain_settings.situation_max_tokens.get("poi_arrival")
+    async with semaphore:
+        text = await groq_service.generate_response(messages, max_tokens=max_tokens, priority="offline",
+                                                    situation="poi_arrival")
+    if not text or groq_service.is_fallback_response(text):
+        return None
+    return text
+
+
+def plan(variants: int) -> Dict:
+    """POIs, franjas, enfoques y metadatos (con la versión) antes de generar nada"""
+    age_groups = langchain_settings.child_age_groups
+    pois = RATON_PEREZ_ROUTE
+    poi_texts = {poi["id"]: get_location_info(poi["id"], "basic_info") for poi in pois}
+    angles = [VARIANT_ANGLES[i % len(VARIANT_ANGLES)] for i in range(variants)]
+    model = groq_service.backend.model if groq_service.backend else None
+    prompt_fingerprint = build_system_prompt(0, 0, "", "", " | ".join(angles))
+    return {
+        "pois": pois,
+        "poi_texts": poi_texts,
+        "age_groups": age_groups,
+        "angles": angles,
+        "metadata": {
+            "version": content_version(model or "", prompt_fingerprint, {**poi_texts, "_bands": str(age_groups)}),
+            "model": model,
+            "variants": variants,
+            "age_bands": list(age_groups.keys()),
+            # El servicio las compara al cargar con el contenido vivo de cada POI
+            "poi_versions": {poi_id: poi_fingerprint(text) for poi_id, text in poi_texts.items()},
+        },
+    }
+
+
+async def generate(job: Dict, concurrency: int) -> Dict:
+    pois, poi_texts, age_groups, angles = job["pois"], job["poi_texts"], job["age_groups"], job["angles"]
+    semaphore = asyncio.Semaphore(concurrency)
+    jobs = {
+        (poi["id"], band, i): generate_variant(semaphore, poi, poi_texts[poi["id"]], age_range, angle)
+        for poi in pois
+        for band, age_range in age_groups.items()
+        for i, angle in enumerate(angles)
+    }
+    results = await asyncio.gather(*jobs.values())
+
+    narratives: Dict[str, Dict[str, List[str]]] = {}
+    failed = 0
+    for (poi_id, band, _), text in zip(jobs.keys(), results):
+        if text is None:
+            failed += 1
+            continue
+        narratives.setdefault(poi_id, {}).setdefault(band, []).append(text)
+
+    return {
+        "narratives": narratives,
+        "failed": failed,
+        "metadata": {**job["metadata"], "generated_at": datetime.utcnow().isoformat()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pregenera narraciones de llegada por POI y franja de edad")
+    parser.add_argument("--variants", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--output", default=None, help="Ruta del artefacto (por defecto la configurada)")
+    parser.add_argument("--force", action="store_true", help="Regenerar aunque la versión no haya cambiado")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if not groq_service.is_available():
+        raise SystemExit("❌ LLM no disponible: revisa GROQ_API_KEY o LLM_BACKEND")
+
+    poi_content_store.load_snapshot()
+    store = ArrivalNarratives(args.output) if args.output else arrival_narratives
+    store.load()
+    job = plan(args.variants)
+    if store.get_stats()["version"] == job["metadata"]["version"] and not args.force:
+        print(f"✅ Artefacto ya actualizado (versión {job['metadata']['version']}), nada que hacer")
+        return
+
+    result = asyncio.run(generate(job, args.concurrency))
+    metadata = result["metadata"]
+    store.save(result["narratives"], metadata)
+    total = sum(len(v) for bands in result["narratives"].values() for v in bands.values())
+    print(f"📜 {total} narraciones guardadas (versión {metadata['version']}, {result['failed']} fallidas)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Servidor HTTP local del sustituto de Groq
+Expone /openai/v1/chat/completions con el formato de la API de Groq para que ChatGroq
+(groq_base_url=http://127.0.0.1:8100) pueda usarse en pruebas de carga sin gastar cuota
+
+Uso:
+    python -m Server.scripts.llm_standin_server --port 8100 --latency-p50 0.4 --rate-limit-rate 0.05
+"""
+
+import time
+import uuid
+import asyncio
+import argparse
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from Server.core.services.llm_backends import LLMBackendError, StandInProfile, StandInSimulator
+
+
+def rate_limit_headers(rate_limit: dict) -> dict:
+    """Estado de rate limit del simulador con los nombres de cabecera de Groq"""
+    headers = {}
+    for field_name, value in rate_limit.items():
+        if field_name == "retry_after":
+            headers["retry-after"] = str(value)
+        elif field_name.endswith("_s"):
+            headers[f"x-ratelimit-{field_name[:-2].replace('_', '-')}"] = f"{value}s"
+        else:
+            headers[f"x-ratelimit-{field_name.replace('_', '-')}"] = str(value)
+    return headers
+
+
+def create_app(profile: StandInProfile) -> FastAPI:
+    simulator = StandInSimulator(profile)
+    app = FastAPI(title="Groq stand-in")
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        contents = [m.get("content") or "" for m in messages]
+        try:
+            plan = simulator.plan("\n".join(contents[:-1]), contents[-1] if contents else "",
+                                  body.get("max_tokens"))
+        except LLMBackendError as e:
+            headers = rate_limit_headers(e.rate_limit)
+            if e.retry_after is not None:
+                headers["retry-after"] = str(e.retry_after)
+            return JSONResponse(status_code=e.status_code, headers=headers,
+                                content={"error": {"message": str(e), "type": "standin_error"}})
+
+        await asyncio.sleep(plan["duration"])
+        return JSONResponse(headers=rate_limit_headers(plan["rate_limit"]), content={
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "standin"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": plan["content"]},
+                "finish_reason": "stop",
+            }],
+            "usage": plan["usage"],
+        })
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sustituto local de Groq para pruebas de carga")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-p50", type=float, default=0.4)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=500.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--requests-per-minute", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    import uvicorn
+    profile = StandInProfile(
+        latency_p50=args.latency_p50,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        requests_per_minute=args.requests_per_minute,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(profile), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Prueba de carga del Ratoncito Pérez
+Simula familias que se registran, crean su familia, chatean en cada POI y avanzan por
+RATON_PEREZ_ROUTE con tiempos de reflexión realistas. Por defecto corre en proceso contra
+la app con Groq, Pinecone y DB sustituidos; con --base-url ataca un servidor real.
+El informe (JSON) incluye throughput y p50/p95/p99 por endpoint para comparar ejecuciones
+
+Uso:
+    python -m Server.scripts.load_test --families 1000 --concurrency 200 --output loadtest.json
+"""
+
+import json
+import time
+import random
+import asyncio
+import argparse
+import logging
+from collections import Counter
+from dataclasses import dataclass, asdict, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from Server.core.agents.location_helper import RATON_PEREZ_ROUTE
+
+logger = logging.getLogger(__name__)
+
+CHAT_MESSAGES = [
+    "¿Qué es este lugar?",
+    "¡Hola Ratoncito Pérez!",
+    "¿Quién vivía aquí hace muchos años?",
+    "Cuéntanos una curiosidad",
+    "¿Qué hay en el museo?",
+    "¡Qué divertido!",
+]
+
+CHILD_NAMES = ["Lucía", "Hugo", "Martina", "Leo", "Sofía", "Mateo"]
+
+
+@dataclass
+class LoadTestConfig:
+    families: int = 100
+    concurrency: int = 50  # familias activas a la vez
+    messages_per_poi: int = 2
+    think_time: float = 5.0  # media (s) de la pausa entre acciones, exponencial
+    ramp_up: float = 10.0  # segundos para lanzar todas las familias
+    base_url: Optional[str] = None  # None = app en proceso con stubs
+    llm_latency_p50: float = 0.4
+    db_latency: float = 0.002
+    request_timeout: float = 60.0
+    seed: Optional[int] = None
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return round(sorted_values[index], 1)
+
+
+@dataclass
+class EndpointStats:
+    latencies_ms: List[float] = field(default_factory=list)
+    statuses: Dict[str, int] = field(default_factory=dict)
+    errors: int = 0
+
+    def record(self, duration_ms: float, status: str, ok: bool):
+        self.latencies_ms.append(duration_ms)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if not ok:
+            self.errors += 1
+
+    def summary(self, duration_s: float) -> Dict[str, Any]:
+        values = sorted(self.latencies_ms)
+        count = len(values)
+        return {
+            "count": count,
+            "errors": self.errors,
+            "error_rate": round(self.errors / count, 4) if count else 0.0,
+            "throughput_rps": round(count / duration_s, 2) if duration_s else 0.0,
+            "avg_ms": round(sum(values) / count, 1) if count else 0.0,
+            "p50_ms": percentile(values, 50),
+            "p95_ms": percentile(values, 95),
+            "p99_ms": percentile(values, 99),
+            "max_ms": round(values[-1], 1) if values else 0.0,
+            "statuses": dict(self.statuses),
+        }
+
+
+class LoadTest:
+    """Orquesta las familias simuladas y agrega las métricas por endpoint"""
+
+    def __init__(self, config: LoadTestConfig, patcher: Any = None):
+        self.config = config
+        self.patcher = patcher  # por dónde pasan los stubs en proceso (monkeypatch en los tests)
+        self.random = random.Random(config.seed)
+        self.stats: Dict[str, EndpointStats] = {}
+        self.completed_families = 0
+        self.failed_families = 0
+        # Un 200 con el mensaje de cortesía del LLM también es un fallo: se cuenta aparte
+        self.chat_responses = 0
+        self.chat_fallbacks = 0
+        self.chat_situations: Counter = Counter()
+
+    async def _request(self, client: httpx.AsyncClient, endpoint: str, method: str, url: str,
+                       **kwargs) -> Optional[Dict[str, Any]]:
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            status, ok = str(response.status_code), response.is_success
+        except httpx.HTTPError as e:
+            response, status, ok = None, type(e).__name__, False
+        duration_ms = (time.perf_counter() - start) * 1000
+        self.stats.setdefault(endpoint, EndpointStats()).record(duration_ms, status, ok)
+        return response.json() if ok else None
+
+    def _record_chat(self, result: Optional[Dict[str, Any]]):
+        from Server.core.services.groq_service import UNAVAILABLE_RESPONSE, ERROR_RESPONSE
+        if not result:
+            return
+        self.chat_responses += 1
+        self.chat_fallbacks += result.get("response") in (UNAVAILABLE_RESPONSE, ERROR_RESPONSE)
+        self.chat_situations[result.get("situation") or "unknown"] += 1
+
+    async def _think(self):
+        if self.config.think_time > 0:
+            await asyncio.sleep(self.random.expovariate(1 / self.config.think_time))
+
+    async def _run_family(self, client: httpx.AsyncClient, number: int):
+        run_id = f"{int(time.time())}{number}{self.random.randint(0, 9999)}"
+        auth = await self._request(client, "POST /api/auth/register", "POST", "/api/auth/register",
+                                   json={"email": f"loadtest_{run_id}@example.com", "password": "loadtest123"})
+        if not auth:
+            self.failed_families += 1
+            return
+        headers = {"Authorization": f"Bearer {auth['access_token']}"}
+
+        children = self.random.randint(1, 3)
+        members = [{"name": "Adulto", "age": 40, "member_type": "adult"}] + [
+            {"name": self.random.choice(CHILD_NAMES), "age": self.random.randint(4, 12), "member_type": "child"}
+            for _ in range(children)
+        ]
+        family = await self._request(client, "POST /api/families/", "POST", "/api/families/", headers=headers,
+                                     json={"name": f"Familia {run_id}", "members": members})
+        if not family:
+            self.failed_families += 1
+            return
+        family_id = family["id"]
+
+        for _ in RATON_PEREZ_ROUTE:
+            for _ in range(self.config.messages_per_poi):
+                await self._think()
+                self._record_chat(await self._request(
+                    client, "POST /api/chat/message", "POST", "/api/chat/message", headers=headers,
+                    json={"family_id": family_id, "message": self.random.choice(CHAT_MESSAGES)}))
+            await self._think()
+            advance = await self._request(client, "POST /api/routes/family/{id}/advance", "POST",
+                                          f"/api/routes/family/{family_id}/advance", headers=headers)
+            # Como el front: mensaje de llegada al chat y consulta del destino actual
+            if advance and advance.get("arrival_message"):
+                self._record_chat(await self._request(
+                    client, "POST /api/chat/message (arrival)", "POST", "/api/chat/message",
+                    headers=headers, json={"family_id": family_id, "message": advance["arrival_message"]}))
+                await self._request(client, "GET /api/routes/family/{id}/next", "GET",
+                                    f"/api/routes/family/{family_id}/next", headers=headers)
+        self.completed_families += 1
+
+    def _client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(max_connections=self.config.concurrency)
+        if self.config.base_url:
+            return httpx.AsyncClient(base_url=self.config.base_url, timeout=self.config.request_timeout,
+                                     limits=limits)
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=build_stubbed_app(self.config, self.patcher)),
+                                 base_url="http://loadtest", timeout=self.config.request_timeout)
+
+    async def run(self) -> Dict[str, Any]:
+        semaphore = asyncio.Semaphore(self.config.concurrency)
+        spacing = self.config.ramp_up / self.config.families if self.config.families else 0
+
+        async def _family(number: int):
+            await asyncio.sleep(number * spacing)
+            async with semaphore:
+                await self._run_family(client, number)
+
+        started_at = datetime.utcnow().isoformat()
+        start = time.perf_counter()
+        async with self._client() as client:
+            await asyncio.gather(*(_family(n) for n in range(self.config.families)))
+        return self.report(started_at, time.perf_counter() - start)
+
+    def report(self, started_at: str, duration_s: float) -> Dict[str, Any]:
+        total = sum(len(s.latencies_ms) for s in self.stats.values())
+        report = {
+            "started_at": started_at,
+            "duration_s": round(duration_s, 2),
+            "config": asdict(self.config),
+            "families_completed": self.completed_families,
+            "families_failed": self.failed_families,
+            "requests": total,
+            "throughput_rps": round(total / duration_s, 2) if duration_s else 0.0,
+            "endpoints": {name: s.summary(duration_s) for name, s in sorted(self.stats.items())},
+            "chat": {"responses": self.chat_responses, "fallbacks": self.chat_fallbacks,
+                     "situations": dict(self.chat_situations)},
+        }
+        if not self.config.base_url:
+            from Server.core.services.tracing import stage_histograms
+            report["server_stages"] = {
+                name: {k: v for k, v in data.items() if k != "buckets"}
+                for name, data in stage_histograms.get_stats().items()
+            }
+            from Server.core.services.prefetch_cache import prefetch_cache
+            report["prefetch"] = prefetch_cache.get_stats()
+            from Server.core.agents.raton_perez import groq_service
+            report["llm"] = groq_service.get_stats()
+            from Server.core.services.usage_tracker import usage_tracker
+            report["usage_by_situation"] = usage_tracker.breakdown("situation")
+        return report
+
+
+def build_stubbed_app(config: LoadTestConfig, patcher: Any = None):
+    """
+    App real (routers y middleware) con DB en memoria y servicios externos sustituidos.
+    Los cambios se registran en `patcher` (ver install_stubs) para poder deshacerlos
+    """
+    from Server.main import app
+    from Server.scripts.load_test_stubs import InMemoryDatabase, install_stubs
+    from Server.core.services.llm_backends import StandInProfile
+
+    patcher = install_stubs(llm_profile=StandInProfile(latency_p50=config.llm_latency_p50, seed=config.seed),
+                            patcher=patcher)
+    patcher.setattr(app.state, "db", InMemoryDatabase(query_latency=config.db_latency), raising=False)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga con familias simuladas")
+    parser.add_argument("--families", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--messages-per-poi", type=int, default=2)
+    parser.add_argument("--think-time", type=float, default=5.0)
+    parser.add_argument("--ramp-up", type=float, default=10.0)
+    parser.add_argument("--base-url", default=None, help="Servidor real; por defecto app en proceso con stubs")
+    parser.add_argument("--llm-latency-p50", type=float, default=0.4)
+    parser.add_argument("--db-latency", type=float, default=0.002)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", default=None,
+                        help="Fichero JSON de resultados (por defecto loadtest_<timestamp>.json)")
+    args = parser.parse_args()
+
+    config = LoadTestConfig(
+        families=args.families,
+        concurrency=args.concurrency,
+        messages_per_poi=args.messages_per_poi,
+        think_time=args.think_time,
+        ramp_up=args.ramp_up,
+        base_url=args.base_url,
+        llm_latency_p50=args.llm_latency_p50,
+        db_latency=args.db_latency,
+        seed=args.seed,
+    )
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(LoadTest(config).run())
+    output_path = args.output or f"loadtest_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+
+    for name, data in report["endpoints"].items():
+        print(f"{name:45} n={data['count']:<6} err={data['errors']:<4} "
+              f"p50={data['p50_ms']}ms p95={data['p95_ms']}ms p99={data['p99_ms']}ms")
+    print(f"📊 {report['requests']} requests, {report['throughput_rps']} req/s - resultados en {output_path}")
+
+
+if __name__ == "__main__":
+    main()
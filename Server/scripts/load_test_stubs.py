@@ -0,0 +1,291 @@
+"""
+Stubs para pruebas de carga
+Base de datos en memoria que entiende las consultas de los endpoints, y sustitutos de
+embeddings y Pinecone con latencia configurable. Nada de esto se usa en producción
+"""
+
+import re
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from Server.core.agents.location_helper import RATON_PEREZ_ROUTE
+from Server.core.services.embedding_service import embedding_service
+from Server.core.services.pinecone_service import pinecone_service
+from Server.core.services.poi_content_store import poi_content_store
+from Server.core.services.groq_service import groq_service
+from Server.core.agents.raton_perez import groq_service as agent_groq_service
+from Server.core.services.llm_backends import LocalStandInBackend, StandInProfile
+from Server.core.services.tracing import stage
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIMENSION = 1024
+
+
+def _normalize(query: str) -> str:
+    return re.sub(r"\s+", " ", query).strip()
+
+
+class InMemoryDatabase:
+    """
+    Sustituto de Database con las tablas de la app en memoria. Cada consulta se resuelve
+    por patrón; una consulta desconocida lanza error para que aparezca en el informe
+    """
+
+    def __init__(self, query_latency: float = 0.0):
+        self.query_latency = query_latency
+        self.users: Dict[int, Dict[str, Any]] = {}
+        self.families: Dict[int, Dict[str, Any]] = {}
+        self.members: Dict[int, List[Dict[str, Any]]] = {}
+        self.progress: Dict[int, Dict[str, Any]] = {}
+        self.llm_usage: List[tuple] = []
+        self.query_count = 0
+        self._ids = {"users": 0, "families": 0, "progress": 0}
+        self._lock = threading.Lock()
+        self._handlers = [
+            (r"^SELECT id FROM users WHERE email = %s", self._user_by_email),
+            (r"^INSERT INTO users", self._insert_user),
+            (r"^UPDATE users SET last_login", self._noop),
+            (r"^SELECT id, email, avatar FROM users WHERE id = %s", self._user_by_id),
+            (r"^INSERT INTO families", self._insert_family),
+            (r"^INSERT INTO family_members", self._insert_member),
+            (r"^INSERT INTO family_route_progress \(family_id, current_poi_index, points_earned\) VALUES",
+             self._insert_empty_progress),
+            (r"^INSERT INTO family_route_progress", self._insert_progress),
+            (r"^SELECT f\.id, f\.name, f\.preferred_language, f\.created_at, json_agg", self._family_with_members),
+            (r"^SELECT user_id FROM families WHERE id = %s", self._family_owner),
+            (r"^SELECT id, user_id FROM families WHERE id = ANY", self._families_owners),
+            (r"^SELECT id, name, preferred_language, conversation_context FROM families WHERE id = ANY",
+             self._families_rows),
+            (r"^SELECT id, name, preferred_language, conversation_context FROM families WHERE id = %s",
+             self._family_row),
+            (r"^SELECT family_id, name, age, member_type FROM family_members WHERE family_id = ANY",
+             self._members_many),
+            (r"^SELECT name, age, member_type FROM family_members WHERE family_id = %s", self._members_one),
+            (r"^SELECT family_id, current_poi_index, points_earned, current_location FROM family_route_progress "
+             r"WHERE family_id = ANY", self._progress_many),
+            (r"^SELECT current_poi_index, points_earned, current_location FROM family_route_progress",
+             self._progress_one),
+            (r"^SELECT id FROM family_route_progress WHERE family_id = %s", self._progress_exists),
+            (r"^UPDATE family_route_progress", self._update_progress),
+            (r"^UPDATE families SET conversation_context", self._update_conversation),
+            (r"^CREATE TABLE IF NOT EXISTS llm_usage", self._noop),
+            (r"^INSERT INTO llm_usage", self._insert_usage),
+        ]
+        self._handlers = [(re.compile(pattern), handler) for pattern, handler in self._handlers]
+
+    # ---------- Interfaz de Database ----------
+    def health_check(self) -> bool:
+        return True
+
+    def execute_query(self, query: str, params: tuple = None):
+        if self.query_latency:
+            time.sleep(self.query_latency)
+        sql = _normalize(query)
+        with self._lock:
+            self.query_count += 1
+            for pattern, handler in self._handlers:
+                if pattern.match(sql):
+                    return handler(params or ())
+        raise ValueError(f"Consulta no soportada por InMemoryDatabase: {sql[:80]}")
+
+    def execute_transaction(self, queries: List[tuple]):
+        for query, params in queries:
+            self.execute_query(query, params)
+        return True
+
+    def close(self):
+        pass
+
+    # ---------- Handlers ----------
+    def _next_id(self, table: str) -> int:
+        self._ids[table] += 1
+        return self._ids[table]
+
+    def _noop(self, params):
+        return []
+
+    def _insert_usage(self, params):
+        self.llm_usage.append(params)
+        return None
+
+    def _user_by_email(self, params):
+        return [{"id": u["id"]} for u in self.users.values() if u["email"] == params[0]]
+
+    def _insert_user(self, params):
+        user = {"id": self._next_id("users"), "email": params[0], "hashed_password": params[1],
+                "avatar": params[2], "created_at": params[3], "is_active": True}
+        self.users[user["id"]] = user
+        return [{k: user[k] for k in ("id", "email", "avatar", "created_at")}]
+
+    def _user_by_id(self, params):
+        user = self.users.get(params[0])
+        return [{k: user[k] for k in ("id", "email", "avatar")}] if user and user["is_active"] else []
+
+    def _insert_family(self, params):
+        family = {"id": self._next_id("families"), "user_id": params[0], "name": params[1],
+                  "preferred_language": params[2], "created_at": datetime.utcnow(), "conversation_context": "{}"}
+        self.families[family["id"]] = family
+        self.members[family["id"]] = []
+        return [{k: family[k] for k in ("id", "name", "preferred_language", "created_at")}]
+
+    def _insert_member(self, params):
+        family_id, name, age, member_type = params
+        self.members.setdefault(family_id, []).append({"name": name, "age": age, "member_type": member_type})
+        return []
+
+    def _insert_empty_progress(self, params):
+        return self._insert_progress((params[0], 0, 0, "{}"))
+
+    def _insert_progress(self, params):
+        family_id, index, points, location = params
+        self.progress[family_id] = {"id": self._next_id("progress"), "current_poi_index": index,
+                                    "points_earned": points, "current_location": location}
+        return []
+
+    def _family_with_members(self, params):
+        family = self.families.get(params[0])
+        if not family:
+            return []
+        return [{**{k: family[k] for k in ("id", "name", "preferred_language", "created_at")},
+                 "members": list(self.members.get(family["id"], []))}]
+
+    def _family_owner(self, params):
+        family = self.families.get(params[0])
+        return [{"user_id": family["user_id"]}] if family else []
+
+    def _families_owners(self, params):
+        return [{"id": fid, "user_id": self.families[fid]["user_id"]} for fid in params[0] if fid in self.families]
+
+    def _family_public(self, family_id):
+        family = self.families[family_id]
+        return {k: family[k] for k in ("id", "name", "preferred_language", "conversation_context")}
+
+    def _families_rows(self, params):
+        return [self._family_public(fid) for fid in params[0] if fid in self.families]
+
+    def _family_row(self, params):
+        return [self._family_public(params[0])] if params[0] in self.families else []
+
+    def _members_many(self, params):
+        return [{"family_id": fid, **m} for fid in params[0] for m in self.members.get(fid, [])]
+
+    def _members_one(self, params):
+        return list(self.members.get(params[0], []))
+
+    def _progress_public(self, family_id):
+        progress = self.progress[family_id]
+        return {k: progress[k] for k in ("current_poi_index", "points_earned", "current_location")}
+
+    def _progress_many(self, params):
+        return [{"family_id": fid, **self._progress_public(fid)} for fid in params[0] if fid in self.progress]
+
+    def _progress_one(self, params):
+        return [self._progress_public(params[0])] if params[0] in self.progress else []
+
+    def _progress_exists(self, params):
+        return [{"id": self.progress[params[0]]["id"]}] if params[0] in self.progress else []
+
+    def _update_progress(self, params):
+        index, points, location, family_id = params
+        self.progress[family_id].update(current_poi_index=index, points_earned=points, current_location=location)
+        return []
+
+    def _update_conversation(self, params):
+        context_json, family_id = params
+        if family_id in self.families:
+            self.families[family_id]["conversation_context"] = context_json
+        return []
+
+
+def stub_embedding(text: str) -> np.ndarray:
+    """Vector float32 determinista y normalizado derivado del hash del texto (como el servicio real)"""
+    seed = int(hashlib.md5(text.encode()).hexdigest()[:8], 16)
+    vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIMENSION).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class StubPatches:
+    """
+    Registro de lo que sustituye install_stubs, con la misma interfaz que el monkeypatch de
+    pytest (setattr/undo). undo() deja los singletons como estaban; también sirve con `with`
+    """
+
+    _MISSING = object()
+
+    def __init__(self):
+        self._saved: List[tuple] = []
+
+    def setattr(self, target: Any, name: str, value: Any, raising: bool = True):
+        original = getattr(target, name, self._MISSING)
+        if original is self._MISSING and raising:
+            raise AttributeError(f"{target!r} no tiene el atributo {name!r}")
+        if name not in getattr(target, "__dict__", {}) and hasattr(type(target), name):
+            original = self._MISSING  # método de la clase: al deshacer basta con borrar el de la instancia
+        self._saved.append((target, name, original))
+        setattr(target, name, value)
+
+    def undo(self):
+        for target, name, original in reversed(self._saved):
+            if original is self._MISSING:
+                delattr(target, name)
+            else:
+                setattr(target, name, original)
+        self._saved.clear()
+
+    def __enter__(self) -> "StubPatches":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.undo()
+
+
+def install_stubs(embedding_latency: float = 0.01, pinecone_latency: float = 0.03,
+                  llm_profile: Optional[StandInProfile] = None, patcher: Any = None):
+    """
+    Sustituye en caliente los singletons de embeddings, Pinecone y LLM por versiones
+    locales con latencia simulada, y precarga el contenido de los POIs en memoria.
+    Todo pasa por `patcher` (el monkeypatch de pytest en los tests); sin él se usa un
+    StubPatches. Devuelve el patcher para deshacer los cambios con undo()
+    """
+    patcher = patcher if patcher is not None else StubPatches()
+
+    def generate_embeddings(texts, text_type="passage"):
+        with stage("embed_encode"):
+            time.sleep(embedding_latency)
+        return [stub_embedding(f"{text_type}: {text}") for text in texts]
+
+    def query(vector=None, top_k=3, filter=None, include_metadata=True, **kwargs):
+        with stage("pinecone"):
+            time.sleep(pinecone_latency)
+        matches = [{"id": f"{poi['id']}_basic_info", "score": 0.8,
+                    "metadata": {"poi_id": poi["id"], "text": poi["description"]}}
+                   for poi in RATON_PEREZ_ROUTE[:top_k]]
+        return {"matches": matches}
+
+    patcher.setattr(embedding_service, "generate_embeddings", generate_embeddings)
+    patcher.setattr(embedding_service, "is_available", lambda: True)
+    patcher.setattr(pinecone_service, "query", query)
+    patcher.setattr(pinecone_service, "fetch_vectors", lambda vector_ids, namespace=None: {})
+    patcher.setattr(pinecone_service, "is_available", lambda: True)
+
+    # El contenido precargado va a copias de los diccionarios del store; al deshacer vuelven los originales
+    patcher.setattr(poi_content_store, "_content", dict(poi_content_store._content))
+    patcher.setattr(poi_content_store, "_absent", dict(poi_content_store._absent))
+    for poi in RATON_PEREZ_ROUTE:
+        poi_content_store.put(poi["id"], "basic_info", f"{poi['name']}: {poi['description']}")
+
+    # raton_perez importa el servicio como core.services.groq_service (otra instancia del módulo).
+    # Un sustituto por modelo de la tabla de rutas para que el enrutado funcione igual que en producción
+    for service in {id(groq_service): groq_service, id(agent_groq_service): agent_groq_service}.values():
+        patcher.setattr(service.router, "_entries", service.router._entries)  # guarda el pool real
+        service.use_backends([LocalStandInBackend(model, llm_profile or StandInProfile())
+                              for model in service.router.models])
+    logger.info("🧪 Stubs de carga instalados (embeddings, Pinecone, LLM local)")
+    return patcher
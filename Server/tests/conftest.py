@@ -0,0 +1,11 @@
+import pytest
+
+
+@pytest.fixture
+def load_stubs(monkeypatch):
+    """install_stubs a través de monkeypatch: los singletons vuelven a su estado al terminar el test"""
+    from Server.scripts.load_test_stubs import install_stubs
+
+    def install(**kwargs):
+        return install_stubs(patcher=monkeypatch, **kwargs)
+    return install
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from Server.core.agents import family_context
+from Server.core.agents.location_helper import RATON_PEREZ_ROUTE, arrival_announcement
+from Server.core.agents.raton_perez import RatonPerez, groq_service as agent_groq_service
+from Server.core.services.arrival_narratives import ArrivalNarratives, poi_fingerprint
+from Server.core.services.groq_service import groq_service
+from Server.core.services.llm_backends import LocalStandInBackend, StandInProfile
+from Server.core.services.poi_content_store import poi_content_store
+from Server.scripts.generate_arrival_narratives import generate, plan
+from Server.scripts.load_test_stubs import InMemoryDatabase
+
+
+def _standin():
+    return LocalStandInBackend("standin", StandInProfile(latency_p50=0.001, tokens_per_second=100000, seed=2))
+
+
+@pytest.fixture(autouse=True)
+def restore_singletons(monkeypatch):
+    """Los tests cambian backends LLM y contenido de POIs de singletons globales: se restauran"""
+    pools = {id(service): (service, [entry.backend for entry in service.router.entries])
+             for service in (groq_service, agent_groq_service)}
+    monkeypatch.setattr(poi_content_store, "_content", dict(poi_content_store._content))
+    yield
+    for service, backends in pools.values():
+        service.use_backends(backends)
+
+
+def test_job_builds_full_matrix_with_stable_version():
+    groq_service.use_backend(_standin())
+    for poi in RATON_PEREZ_ROUTE:
+        poi_content_store.put(poi["id"], "basic_info", poi["description"])
+
+    job = plan(variants=2)
+    assert plan(variants=2)["metadata"]["version"] == job["metadata"]["version"]
+    assert plan(variants=3)["metadata"]["version"] != job["metadata"]["version"]
+    assert set(job["metadata"]["poi_versions"]) == {poi["id"] for poi in RATON_PEREZ_ROUTE}
+
+    result = asyncio.run(generate(job, concurrency=8))
+    assert result["failed"] == 0
+    assert set(result["narratives"]) == {poi["id"] for poi in RATON_PEREZ_ROUTE}
+    assert all(len(variants) == 2 for bands in result["narratives"].values() for variants in bands.values())
+
+
+def test_artifact_round_trip_and_name_substitution(tmp_path):
+    path = tmp_path / "arrival_narratives.json"
+    live = {"plaza_oriente": "Plaza frente al Palacio Real"}
+    ArrivalNarratives(str(path)).save({"plaza_oriente": {"pequeños": ["¡Hola {familia}!"]}},
+                                      {"version": "abc", "poi_versions": {"plaza_oriente": poi_fingerprint(live["plaza_oriente"])}})
+
+    store = ArrivalNarratives(str(path), content_source=live.get)
+    assert store.load() == 1
+    assert store.get("plaza_oriente", "pequeños", "Lucía y Hugo") == "¡Hola Lucía y Hugo!"
+    assert store.get("plaza_oriente", "grandes", "Lucía") is None
+    assert store.get_stats()["version"] == "abc"
+
+
+def test_narratives_of_changed_pois_are_not_served(tmp_path):
+    path = tmp_path / "arrival_narratives.json"
+    recorded = {"plaza_oriente": poi_fingerprint("Plaza frente al Palacio Real"),
+                "calle_vergara": poi_fingerprint("Calle junto al Teatro Real")}
+    ArrivalNarratives(str(path)).save({"plaza_oriente": {"pequeños": ["¡Hola {familia}!"]},
+                                       "calle_vergara": {"pequeños": ["¡Hola {familia}!"]},
+                                       "plaza_ramales": {"pequeños": ["¡Hola {familia}!"]}},
+                                      {"version": "abc", "poi_versions": recorded})
+
+    live = {"plaza_oriente": "Plaza frente al Palacio Real", "calle_vergara": "Texto nuevo de la calle"}
+    store = ArrivalNarratives(str(path), content_source=live.get)
+    assert store.load() == 1  # calle_vergara cambió y plaza_ramales no tiene huella: generación en vivo
+    assert store.get("plaza_oriente", "pequeños", "Lucía") == "¡Hola Lucía!"
+    assert store.get("calle_vergara", "pequeños", "Lucía") is None
+    assert store.get_stats()["misses"] == 1
+
+
+def test_arrival_turn_uses_pregenerated_narrative(tmp_path, monkeypatch):
+    store = ArrivalNarratives(str(tmp_path / "narratives.json"))
+    # Con child_age_groups de un .env distinto Lucía (5) podría no caer en "pequeños":
+    # se guardan las dos franjas para que el test no dependa del entorno
+    variants = ["¡Bienvenidos, {familia}!"]
+    store.save({"calle_vergara": {"pequeños": variants, "adultos": variants}}, {"version": "v1"})
+    monkeypatch.setattr("Server.core.agents.raton_perez.arrival_narratives", store)
+    agent_groq_service.use_backend(None)  # sin LLM: la llegada no debe necesitarlo
+
+    db = InMemoryDatabase()
+    db.execute_query("INSERT INTO families (user_id, name, preferred_language) VALUES (%s, %s, %s)", (1, "Ruiz", "es"))
+    db.execute_query("INSERT INTO family_members (family_id, name, age, member_type) VALUES (%s, %s, %s, %s)",
+                     (1, "Lucía", 5, "child"))
+    db.execute_query("INSERT INTO family_route_progress (family_id, current_poi_index, points_earned) "
+                     "VALUES (%s, 0, 0)", (1,))
+    db.progress[1]["current_poi_index"] = 2
+    family_context._context_cache.clear()
+
+    result = asyncio.run(RatonPerez(db).chat(1, arrival_announcement(RATON_PEREZ_ROUTE[2])))
+    assert result["sources"] == ["arrival_narratives"]
+    assert result["response"] == "¡Bienvenidos, Lucía!"
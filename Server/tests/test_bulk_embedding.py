@@ -0,0 +1,99 @@
+import numpy as np
+
+from Server.core.services.bulk_embedding import bulk_encode, length_sorted_batches
+from Server.core.services.embedding_cache import EmbeddingCache
+from Server.core.services.embedding_store import EmbeddingStore
+
+
+class LengthEncoder:
+    """Vector = [longitud del texto, 1]: permite comprobar que cada fila vuelve a su sitio"""
+
+    def encode(self, texts, normalize_embeddings=True):
+        return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+
+
+def length_encoder_factory():
+    return LengthEncoder()
+
+
+TEXTS = ["corto", "un pasaje bastante más largo que todos los demás de la lista", "medio de largo", "x", "otro pasaje mediano"]
+
+
+def test_batches_group_similar_lengths_longest_first():
+    batches = length_sorted_batches(TEXTS, batch_size=2)
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert batches[0][0] == 1 and batches[-1] == [3]
+
+
+def test_in_process_preserves_order_and_reports_progress():
+    calls, progress = [], []
+
+    def encode(texts, text_type):
+        calls.append(list(texts))
+        return LengthEncoder().encode([f"{text_type}: {t}" for t in texts])
+
+    matrix = bulk_encode(TEXTS, workers=1, batch_size=2, encode_fn=encode,
+                         progress=lambda done, total, elapsed: progress.append((done, total)))
+    np.testing.assert_array_equal(matrix[:, 0], [len(f"passage: {t}") for t in TEXTS])
+    assert len(calls) == 3 and calls[0][0] == TEXTS[1]
+    assert progress == [(2, 5), (4, 5), (5, 5)]
+
+
+def test_process_pool_matches_in_process():
+    matrix = bulk_encode(TEXTS, "query", workers=2, batch_size=2,
+                         encoder_factory=length_encoder_factory, start_method="fork")
+    np.testing.assert_array_equal(matrix[:, 0], [len(f"query: {t}") for t in TEXTS])
+
+
+def test_service_bulk_path_skips_lru_and_fills_store(tmp_path, monkeypatch):
+    from Server.core.services.embedding_service import embedding_service
+
+    monkeypatch.setattr(embedding_service, "_model", LengthEncoder())
+    monkeypatch.setattr(embedding_service, "_sidecar", None)
+    monkeypatch.setattr(embedding_service, "_embedding_cache", EmbeddingCache(10))
+    monkeypatch.setattr(embedding_service, "_store", EmbeddingStore(str(tmp_path), "intfloat/e5-large-v2"))
+
+    vectors = embedding_service.generate_embeddings_bulk(TEXTS, batch_size=2)
+    assert [v[0] for v in vectors] == [len(f"passage: {t}") for t in TEXTS]
+    assert len(embedding_service._embedding_cache) == 0
+    assert len(embedding_service._store) == len(TEXTS)
+
+    # Segunda ingesta: todo sale del store, sin codificar
+    monkeypatch.setattr(embedding_service, "_model", None)
+    again = embedding_service.generate_embeddings_bulk(TEXTS)
+    np.testing.assert_array_equal(np.stack(again), np.stack(vectors))
+    assert embedding_service._model is None
+
+
+def test_failed_batch_does_not_abort_the_rest(tmp_path, monkeypatch):
+    from Server.core.services.embedding_service import embedding_service
+
+    def flaky(texts, text_type):
+        if "x" in texts:
+            raise RuntimeError("lote roto")
+        return LengthEncoder().encode(texts)
+
+    matrix = bulk_encode(TEXTS, workers=1, batch_size=2, encode_fn=flaky)
+    assert np.isnan(matrix[3]).all() and not np.isnan(np.delete(matrix, 3, axis=0)).any()
+    assert bulk_encode(["x"], workers=1, encode_fn=flaky).shape == (1, 0)
+
+    # Por el servicio: vector vacío para el fallido, el resto al store
+    monkeypatch.setattr(embedding_service, "_model", None)
+    monkeypatch.setattr(embedding_service, "_sidecar", None)
+    monkeypatch.setattr(embedding_service, "_store", EmbeddingStore(str(tmp_path), "intfloat/e5-large-v2"))
+    monkeypatch.setattr(embedding_service, "_encode", flaky)
+    vectors = embedding_service.generate_embeddings_bulk(TEXTS, batch_size=2)
+    assert [len(v) for v in vectors] == [2, 2, 2, 0, 2]
+    assert len(embedding_service._store) == len(TEXTS) - 1
+
+
+def test_sidecar_keeps_bulk_encoding_in_process(monkeypatch):
+    from Server.core.services.embedding_service import embedding_service
+
+    calls = []
+    monkeypatch.setattr(embedding_service, "_sidecar", object())
+    monkeypatch.setattr(embedding_service, "_store", None)
+    monkeypatch.setattr(embedding_service, "_encode", lambda texts, text_type: calls.append(texts) or
+                        LengthEncoder().encode(texts))
+    vectors = embedding_service.generate_embeddings_bulk(TEXTS, workers=4, batch_size=2)
+    assert len(calls) == 3 and all(len(v) == 2 for v in vectors)
@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+import pytest
+
+from Server.core.agents import family_context
+from Server.core.agents import raton_perez as module
+from Server.core.agents.raton_perez import RatonPerez
+
+
+class MockDB:
+    """DB mínima que cuenta las consultas de carga de contexto"""
+
+    def __init__(self):
+        self.queries = []
+
+    def execute_query(self, query, params=None):
+        self.queries.append(query)
+        if "ANY(%s)" not in query:
+            return []
+        if "FROM families" in query:
+            return [
+                {"id": fid, "name": f"Familia {fid}", "preferred_language": "es", "conversation_context": "{}"}
+                for fid in params[0]
+            ]
+        if "FROM family_members" in query:
+            return [{"family_id": fid, "name": f"Niño {fid}", "age": 8, "member_type": "child"} for fid in params[0]]
+        if "FROM family_route_progress" in query:
+            return [
+                {"family_id": fid, "current_poi_index": 0, "points_earned": 0, "current_location": "{}"}
+                for fid in params[0]
+            ]
+        return []
+
+
+@pytest.mark.asyncio
+async def test_batch_loads_contexts_in_one_round_and_keeps_order(monkeypatch):
+    family_context._context_cache.clear()
+    db = MockDB()
+    agent = RatonPerez(db)
+
+    async def fake_generate(context, message, situation, points_result):
+        return f"{context.family_name}: {message}"
+
+    monkeypatch.setattr(agent, "_generate_contextual_response", fake_generate)
+
+    results = await agent.chat_batch([
+        {"family_id": 1, "message": "Hola"},
+        {"family_id": 2, "message": "¿Qué es esta plaza?"},
+        {"family_id": 1, "message": "¡Qué bonito!"},
+    ])
+
+    load_queries = [q for q in db.queries if "ANY(%s)" in q]
+    assert len(load_queries) == 3
+    assert [r["family_id"] for r in results] == [1, 2, 1]
+    assert [r["response"] for r in results] == ["Familia 1: Hola", "Familia 2: ¿Qué es esta plaza?",
+                                                "Familia 1: ¡Qué bonito!"]
+    assert all(r["success"] for r in results)
+    family_context._context_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_batch_shares_searches_and_only_throttles_the_llm_call(monkeypatch):
+    family_context._context_cache.clear()
+    agent = RatonPerez(MockDB())
+    agent.settings = agent.settings.model_copy(update={"batch_chat_max_concurrency": 1})
+    monkeypatch.setattr(RatonPerez, "_embedding_available", property(lambda self: True))
+    agent._pinecone_available = True
+    searches = []
+
+    def fake_search(query, query_embedding=None):
+        searches.append(query)
+        time.sleep(0.05)
+        return "La plaza se construyó en el siglo XIX"
+
+    async def fake_generate(messages, **kwargs):
+        return "¡Es una plaza muy antigua!"
+
+    async def slow_save(*args):
+        await asyncio.sleep(0.2)
+
+    monkeypatch.setattr(module, "search_madrid_content", fake_search)
+    monkeypatch.setattr(module, "get_location_summary", lambda poi_id: {"name": "Plaza", "basic_info": "Plaza"})
+    monkeypatch.setattr(module.groq_service, "generate_response", fake_generate)
+    monkeypatch.setattr(agent, "_update_context", slow_save)
+
+    start = time.perf_counter()
+    results = await agent.chat_batch([
+        {"family_id": 1, "message": "¿Qué es esta plaza?"},
+        {"family_id": 2, "message": "¿qué es  esta plaza?"},
+    ])
+    elapsed = time.perf_counter() - start
+
+    assert [r["situation"] for r in results] == ["location_question"] * 2
+    assert len(searches) == 1  # misma consulta normalizada en el mismo POI
+    assert elapsed < 0.35  # guardar no ocupa el único hueco del LLM
+    family_context._context_cache.clear()
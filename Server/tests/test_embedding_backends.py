@@ -0,0 +1,42 @@
+import numpy as np
+
+from Server.core.services.embedding_backends import OnnxEncoder, encoder_id
+from Server.core.services.embedding_service import langchain_settings
+
+
+class FakeEncoding:
+    def __init__(self, ids, mask):
+        self.ids, self.attention_mask, self.type_ids = ids, mask, [0] * len(ids)
+
+
+class FakeTokenizer:
+    def encode_batch(self, texts):
+        # Segundo texto más corto: lleva un token de relleno
+        return [FakeEncoding([1, 2, 3], [1, 1, 1]), FakeEncoding([4, 5, 0], [1, 1, 0])]
+
+
+class FakeSession:
+    def run(self, outputs, feeds):
+        assert set(feeds) == {"input_ids", "attention_mask"}
+        hidden = np.zeros((2, 3, 2), dtype=np.float32)
+        hidden[0] = [[1, 0], [1, 0], [1, 0]]
+        hidden[1] = [[0, 3], [0, 1], [100, 100]]  # el relleno no debe contar
+        return [hidden]
+
+
+def test_onnx_encoder_mean_pools_real_tokens_and_normalizes():
+    encoder = object.__new__(OnnxEncoder)
+    encoder._tokenizer, encoder._session = FakeTokenizer(), FakeSession()
+    encoder._input_names = {"input_ids", "attention_mask"}
+
+    vectors = encoder.encode(["query: uno", "query: dos"])
+    assert vectors.dtype == np.float32
+    np.testing.assert_allclose(vectors, [[1.0, 0.0], [0.0, 1.0]], atol=1e-6)
+
+
+def test_quantized_vectors_get_their_own_store_key():
+    model = "intfloat/e5-large-v2"
+    settings = lambda **values: langchain_settings.model_copy(update=values)
+    assert encoder_id(settings(embedding_backend="sentence_transformers"), model) == model
+    assert encoder_id(settings(embedding_backend="onnx"), model) == f"{model}@onnx-int8"
+    assert encoder_id(settings(embedding_backend="onnx", embedding_onnx_quantized=False), model) == f"{model}@onnx"
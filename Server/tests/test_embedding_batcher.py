@@ -0,0 +1,47 @@
+import asyncio
+import threading
+
+import pytest
+
+from Server.core.services.embedding_batcher import EmbeddingBatcher
+
+
+def test_concurrent_requests_share_one_encode_call():
+    calls = []
+    release = threading.Event()
+
+    def encode(texts, text_type):
+        calls.append(list(texts))
+        release.wait(1)
+        return [[float(len(t))] for t in texts]
+
+    batcher = EmbeddingBatcher(encode, max_batch=8, max_wait_ms=50)
+
+    async def scenario():
+        tasks = [asyncio.ensure_future(batcher.aembed(t)) for t in ("a", "bb", "ccc", "bb")]
+        await asyncio.sleep(0.1)
+        release.set()
+        return await asyncio.gather(*tasks)
+
+    assert asyncio.run(scenario()) == [[1.0], [2.0], [3.0], [2.0]]
+    assert calls == [["a", "bb", "ccc"]]
+    stats = batcher.get_stats()
+    assert stats["batches"] == 1 and stats["deduplicated"] == 1
+
+
+def test_batches_are_capped_and_errors_reach_every_caller():
+    sizes = []
+
+    def encode(texts, text_type):
+        sizes.append(len(texts))
+        if "boom" in texts:
+            raise RuntimeError("modelo caído")
+        return [[0.0]] * len(texts)
+
+    batcher = EmbeddingBatcher(encode, max_batch=2, max_wait_ms=20)
+    futures = [batcher.submit(f"q{i}") for i in range(5)]
+    assert [f.result(timeout=2) for f in futures] == [[0.0]] * 5
+    assert max(sizes) <= 2
+
+    with pytest.raises(RuntimeError):
+        batcher.embed("boom", timeout=2)
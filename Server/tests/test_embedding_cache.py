@@ -0,0 +1,77 @@
+import threading
+
+import numpy as np
+
+from Server.core.services.embedding_cache import EmbeddingCache, cache_key, resolve_dtype, to_sdk_values, to_vector
+
+
+def test_lru_evicts_least_recently_used():
+    cache = EmbeddingCache(max_size=2)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    assert cache.get("a") == [1.0]  # "a" pasa a ser la más reciente
+    cache.put("c", [3.0])
+
+    assert "b" not in cache and "a" in cache and "c" in cache
+    assert cache.get("b") is None
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 1, 1)
+
+
+def test_keys_are_normalized_and_typed():
+    assert cache_key("  Plaza  Mayor\n", "query") == cache_key("Plaza Mayor", "query")
+    assert cache_key("Plaza Mayor", "query") != cache_key("Plaza Mayor", "passage")
+
+
+def test_concurrent_writers_respect_the_bound():
+    cache = EmbeddingCache(max_size=100)
+
+    def writer(offset):
+        for i in range(1000):
+            cache.put(offset + i, [float(i)])
+            cache.get(offset + i // 2)
+
+    threads = [threading.Thread(target=writer, args=(n * 10000,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(cache) == 100
+    assert cache.get_stats()["evictions"] == 4000 - 100
+
+
+def test_memory_is_reported_from_array_bytes():
+    cache = EmbeddingCache(max_size=2)
+    cache.put("a", to_vector(np.ones(1024), np.dtype(np.float32)))
+    cache.put("b", to_vector(np.ones(1024), resolve_dtype("float16")))
+    assert cache.get_stats()["memory_bytes"] == 1024 * 4 + 1024 * 2
+
+    cache.put("c", to_vector(np.ones(1024), np.dtype(np.float32)))  # expulsa "a"
+    assert cache.get_stats()["memory_bytes"] == 1024 * 2 + 1024 * 4
+    cache.clear()
+    assert cache.get_stats()["memory_bytes"] == 0
+
+
+def test_vectors_are_read_only_and_listed_only_for_the_sdk():
+    vector = to_vector([0.5, 0.25], resolve_dtype("float16"))
+    assert vector.dtype == np.float16 and not vector.flags.writeable
+    values = to_sdk_values(vector)
+    assert values == [0.5, 0.25] and all(type(v) is float for v in values)
+
+
+def test_service_caches_contiguous_float32_rows(monkeypatch):
+    from Server.core.services.embedding_service import embedding_service
+
+    class FakeModel:
+        def encode(self, texts, normalize_embeddings=True):
+            return np.ones((len(texts), 1024), dtype=np.float32)
+
+    monkeypatch.setattr(embedding_service, "_model", FakeModel())
+    monkeypatch.setattr(embedding_service, "_embedding_cache", EmbeddingCache(10))
+
+    vectors = embedding_service.generate_embeddings(["uno", "dos"], "passage")
+    assert all(isinstance(v, np.ndarray) and v.dtype == np.float32 and v.flags.c_contiguous for v in vectors)
+    # Cada fila es dueña de su memoria: el caché cuenta 4 KB por vector, no el lote entero
+    assert all(v.base is None for v in vectors)
+    assert embedding_service.get_cache_stats()["memory_bytes"] == 2 * 1024 * 4
@@ -0,0 +1,90 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import Server.core.services.embedding_service as module
+from Server.core.services.embedding_cache import EmbeddingCache
+from Server.core.services.embedding_service import embedding_service
+
+
+class FakeModel:
+    backend = "fake"
+
+    def encode(self, texts, normalize_embeddings=True):
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+
+@pytest.fixture
+def cold_service(monkeypatch):
+    monkeypatch.setattr(embedding_service, "_model", None)
+    monkeypatch.setattr(embedding_service, "_state", module.MODEL_COLD)
+    monkeypatch.setattr(embedding_service, "_settled", threading.Event())
+    monkeypatch.setattr(embedding_service, "_load_error", None)
+    monkeypatch.setattr(embedding_service, "_sidecar", None)
+    monkeypatch.setattr(embedding_service, "_store", None)
+    monkeypatch.setattr(embedding_service, "_embedding_cache", EmbeddingCache(10))
+    return embedding_service
+
+
+def test_background_load_never_blocks_requests(cold_service, monkeypatch):
+    release = threading.Event()
+
+    def slow_build(settings, model_name):
+        release.wait(5)
+        return FakeModel()
+
+    monkeypatch.setattr(module, "build_encoder", slow_build)
+    start = time.perf_counter()
+    assert cold_service.start_loading() == module.MODEL_LOADING
+    assert cold_service.start_loading() == module.MODEL_LOADING  # idempotente
+
+    # Mientras carga: nada espera, todo degrada
+    assert not cold_service.is_available()
+    assert len(cold_service.generate_query_embedding("¿Qué es la Plaza Mayor?")) == 0
+    assert cold_service.generate_embeddings(["Plaza Mayor"], "passage") == []
+    assert cold_service.get_readiness()["state"] == module.MODEL_LOADING
+    assert time.perf_counter() - start < 0.5
+
+    release.set()
+    assert cold_service.wait_until_ready(timeout=5)
+    assert cold_service.is_available() and cold_service.get_readiness()["ready"]
+    assert len(cold_service.generate_query_embedding("¿Qué es la Plaza Mayor?")) == 4
+
+
+def test_failed_load_is_reported_and_retried(cold_service, monkeypatch):
+    attempts = []
+
+    def flaky_build(settings, model_name):
+        attempts.append(model_name)
+        if len(attempts) == 1:
+            raise OSError("sin red")
+        return FakeModel()
+
+    monkeypatch.setattr(module, "build_encoder", flaky_build)
+    assert not cold_service.wait_until_ready(timeout=5)
+    readiness = cold_service.get_readiness()
+    assert readiness["state"] == module.MODEL_FAILED and readiness["error"] == "sin red"
+
+    # Dentro del plazo de reintento no se vuelve a intentar; pasado el plazo, sí (en background)
+    assert cold_service.generate_embeddings(["Sol"], "passage") == []
+    assert len(attempts) == 1
+    monkeypatch.setattr(cold_service, "_failed_at", time.monotonic() - 3600)
+    assert cold_service.generate_embeddings(["Sol"], "passage") == []
+    assert cold_service.wait_until_ready(timeout=5) and len(attempts) == 2
+
+
+def test_encode_errors_can_be_propagated(cold_service, monkeypatch):
+    class BrokenModel(FakeModel):
+        def encode(self, texts, normalize_embeddings=True):
+            if any("Sol" in text for text in texts):  # el warm-up de la carga sí funciona
+                raise RuntimeError("CUDA out of memory")
+            return super().encode(texts, normalize_embeddings)
+
+    monkeypatch.setattr(module, "build_encoder", lambda settings, model_name: BrokenModel())
+    assert cold_service.wait_until_ready(timeout=5)
+
+    assert cold_service.generate_embeddings(["Sol"], "passage") == []
+    with pytest.raises(RuntimeError, match="CUDA out of memory"):
+        cold_service.generate_embeddings(["Sol"], "passage", raise_errors=True)
@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from Server.core.services.embedding_sidecar import (
+    EmbeddingSidecarClient, EmbeddingSidecarServer, SidecarError,
+    decode_request, decode_response, encode_request, encode_response,
+)
+
+
+def test_frames_roundtrip():
+    frame = encode_request(1, "query", ["¿Qué es la Plaza Mayor?", ""])
+    assert decode_request(frame[4:]) == (1, "query", ["¿Qué es la Plaza Mayor?", ""])
+
+    vectors = np.arange(6, dtype=np.float16).reshape(2, 3)
+    decoded = decode_response(encode_response(vectors)[4:])
+    assert decoded.dtype == np.float16
+    np.testing.assert_array_equal(decoded, vectors)
+
+
+@pytest.fixture
+def sidecar(tmp_path):
+    calls = []
+
+    def encode(texts, text_type):
+        calls.append(list(texts))
+        if "falla" in texts:
+            raise RuntimeError("modelo caído")
+        time.sleep(0.02)
+        return [np.full(4, len(t), dtype=np.float32) for t in texts]
+
+    path = str(tmp_path / "emb.sock")
+    server = EmbeddingSidecarServer(path, encode, max_batch=32, max_wait_ms=10)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start())
+        ready.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    ready.wait(5)
+    yield path, calls
+    asyncio.run_coroutine_threadsafe(server.close(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+
+
+def test_clients_share_batches_and_get_their_own_rows(sidecar):
+    path, calls = sidecar
+    client = EmbeddingSidecarClient(path)
+    assert client.ping()
+
+    results = {}
+
+    def worker(n):
+        # Un cliente por "worker": conexiones distintas, mismo batcher en el sidecar
+        results[n] = EmbeddingSidecarClient(path).encode(["x" * n, "y" * (n + 10)], "query")
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(1, 7)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for n, vectors in results.items():
+        np.testing.assert_array_equal(vectors[:, 0], [n, n + 10])
+    assert len(calls) < 6  # peticiones de varios clientes codificadas juntas
+
+
+def test_errors_are_propagated_and_dead_sidecar_is_reported(sidecar, tmp_path):
+    path, _ = sidecar
+    with pytest.raises(SidecarError, match="modelo caído"):
+        EmbeddingSidecarClient(path).encode(["falla"], "passage")
+
+    missing = EmbeddingSidecarClient(str(tmp_path / "no-existe.sock"), timeout=1)
+    assert not missing.ping()
+    with pytest.raises(SidecarError):
+        missing.encode(["hola"], "query")
+
+
+def test_service_is_a_thin_client_with_local_cache(sidecar, monkeypatch):
+    from Server.core.services.embedding_cache import EmbeddingCache
+    from Server.core.services.embedding_service import embedding_service
+
+    path, calls = sidecar
+    monkeypatch.setattr(embedding_service, "_sidecar", EmbeddingSidecarClient(path))
+    monkeypatch.setattr(embedding_service, "_model", None)
+    monkeypatch.setattr(embedding_service, "_store", None)
+    monkeypatch.setattr(embedding_service, "_embedding_cache", EmbeddingCache(10))
+
+    first = embedding_service.generate_embeddings(["Plaza  Mayor"], "passage")
+    again = embedding_service.generate_embeddings(["Plaza Mayor"], "passage")
+    assert calls == [["Plaza Mayor"]] and again[0] is first[0]
+    assert embedding_service._model is None and embedding_service.is_available()
+
+
+def test_health_is_cached_and_refreshed_off_the_caller(sidecar, tmp_path, monkeypatch):
+    path, _ = sidecar
+    client = EmbeddingSidecarClient(path, health_ttl=60)
+    client.encode(["hola"], "query")
+    pings = []
+    monkeypatch.setattr(client, "ping", lambda: pings.append(1) or True)
+    assert client.healthy and client.healthy and pings == []  # el resultado del encode basta
+
+    # Sidecar caído: el fallo de una petición lo marca, y healthy no bloquea aunque esté caducado
+    missing = EmbeddingSidecarClient(str(tmp_path / "no-existe.sock"), timeout=1, health_ttl=0)
+    with pytest.raises(SidecarError):
+        missing.encode(["hola"], "query")
+    release = threading.Event()
+    monkeypatch.setattr(missing, "ping", lambda: release.wait(5))
+    start = time.perf_counter()
+    assert not missing.healthy
+    assert time.perf_counter() - start < 0.1
+    release.set()
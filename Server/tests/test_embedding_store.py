@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+
+from Server.core.services.embedding_cache import EmbeddingCache
+from Server.core.services.embedding_store import EmbeddingStore
+
+MODEL = "intfloat/e5-large-v2"
+
+
+def _vector(seed: int, dimension: int = 8) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+
+
+def test_vectors_survive_a_restart_as_zero_copy_views(tmp_path):
+    store = EmbeddingStore(str(tmp_path), MODEL)
+    assert store.put_many("passage", [("Plaza Mayor", _vector(1)), ("Puerta del Sol", _vector(2))]) == 2
+    store.close()
+
+    reopened = EmbeddingStore(str(tmp_path), MODEL)
+    found = reopened.get_many("passage", ["Plaza Mayor", "Puerta del Sol", "Retiro"])
+    assert set(found) == {"Plaza Mayor", "Puerta del Sol"}
+    np.testing.assert_array_equal(found["Plaza Mayor"], _vector(1))
+    assert not found["Plaza Mayor"].flags.writeable and not found["Plaza Mayor"].flags.owndata
+    # El tipo de texto forma parte de la clave
+    assert reopened.get("query", "Plaza Mayor") is None
+
+
+def test_writes_are_append_only_and_deduplicated(tmp_path):
+    store = EmbeddingStore(str(tmp_path), MODEL)
+    store.put_many("passage", [("a", _vector(1))])
+    size = os.path.getsize(store.matrix_path)
+    assert store.put_many("passage", [("a", _vector(9)), ("b", _vector(2))]) == 1
+    assert os.path.getsize(store.matrix_path) == size + 8 * 4
+    np.testing.assert_array_equal(store.get("passage", "a"), _vector(1))
+
+
+def test_workers_see_each_others_rows_and_torn_writes_are_truncated(tmp_path):
+    worker_a = EmbeddingStore(str(tmp_path), MODEL)
+    worker_b = EmbeddingStore(str(tmp_path), MODEL)
+    worker_a.put_many("query", [("hola", _vector(1))])
+    np.testing.assert_array_equal(worker_b.get("query", "hola"), _vector(1))
+
+    with open(worker_a.matrix_path, "ab") as f:
+        f.write(b"\x00" * 5)  # proceso que murió a mitad de una fila
+    worker_b.put_many("query", [("adiós", _vector(2))])
+    np.testing.assert_array_equal(worker_a.get("query", "adiós"), _vector(2))
+    np.testing.assert_array_equal(worker_a.get("query", "hola"), _vector(1))
+
+
+def test_warm_start_skips_the_model(tmp_path, monkeypatch):
+    from Server.core.services.embedding_service import embedding_service
+
+    calls = []
+
+    class FakeModel:
+        def encode(self, texts, normalize_embeddings=True):
+            calls.append(list(texts))
+            return np.ones((len(texts), 8), dtype=np.float32)
+
+    monkeypatch.setattr(embedding_service, "_model", FakeModel())
+    monkeypatch.setattr(embedding_service, "_embedding_cache", EmbeddingCache(10))
+    monkeypatch.setattr(embedding_service, "_store", EmbeddingStore(str(tmp_path), MODEL))
+    embedding_service.generate_embeddings(["Palacio  Real"], "passage")
+    assert calls == [["passage: Palacio Real"]]
+
+    # "Reinicio": caché en memoria vacío, sin modelo cargado; el store responde
+    monkeypatch.setattr(embedding_service, "_model", None)
+    monkeypatch.setattr(embedding_service, "_embedding_cache", EmbeddingCache(10))
+    monkeypatch.setattr(embedding_service, "_store", EmbeddingStore(str(tmp_path), MODEL))
+    vectors = embedding_service.generate_embeddings(["Palacio Real"], "passage")
+    np.testing.assert_array_equal(vectors[0], np.ones(8, dtype=np.float32))
+    assert len(calls) == 1 and embedding_service._model is None
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from Server.core.services.groq_service import GroqService, ERROR_RESPONSE, langchain_settings
+from Server.core.services.llm_backends import (
+    LLMBackendError, LocalStandInBackend, StandInProfile, build_backend,
+)
+from Server.scripts.llm_standin_server import create_app
+
+MESSAGES = [SystemMessage(content="Eres el Ratoncito Pérez"), HumanMessage(content="¿Qué es este lugar?")]
+
+
+def fast_profile(**overrides):
+    return StandInProfile(latency_p50=0.001, latency_sigma=0.1, tokens_per_second=100000, seed=7, **overrides)
+
+
+def test_standin_is_deterministic_and_reports_usage():
+    backend = LocalStandInBackend("openai/gpt-oss-120b", fast_profile())
+    first = asyncio.run(backend.ainvoke(MESSAGES, max_tokens=20))
+    second = backend.invoke(MESSAGES, max_tokens=20)
+
+    assert first.content == second.content
+    assert first.response_metadata["token_usage"]["completion_tokens"] == 20
+    assert first.response_metadata["model_name"] == "openai/gpt-oss-120b"
+
+
+def test_standin_rate_limit_carries_retry_after():
+    backend = LocalStandInBackend("m", fast_profile(requests_per_minute=1))
+    backend.invoke(MESSAGES)
+    with pytest.raises(LLMBackendError) as excinfo:
+        backend.invoke(MESSAGES)
+    assert excinfo.value.status_code == 429
+    assert excinfo.value.retry_after > 0
+
+
+def test_build_backend_selects_local():
+    settings = langchain_settings.model_copy(update={"llm_backend": "local"})
+    assert isinstance(build_backend(settings), LocalStandInBackend)
+
+
+def test_groq_service_uses_backend_and_falls_back_on_errors():
+    service = GroqService()
+    service.use_backend(LocalStandInBackend("m", fast_profile()))
+    assert service.is_available()
+    assert not service.is_fallback_response(asyncio.run(service.generate_response(MESSAGES)))
+
+    service.use_backend(LocalStandInBackend("m", fast_profile(error_rate=1.0)))
+    assert asyncio.run(service.generate_response(MESSAGES)) == ERROR_RESPONSE
+
+
+def test_http_standin_speaks_groq_format():
+    client = TestClient(create_app(fast_profile(rate_limit_rate=0.0)))
+    body = {"model": "m", "messages": [{"role": "user", "content": "hola"}], "max_tokens": 10}
+    response = client.post("/openai/v1/chat/completions", json=body)
+    assert response.status_code == 200
+    assert response.json()["choices"][0]["message"]["content"]
+
+    limited = TestClient(create_app(fast_profile(rate_limit_rate=1.0)))
+    response = limited.post("/openai/v1/chat/completions", json=body)
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "1.0"
+
+
+def test_groq_backend_leaves_retries_to_the_invoker():
+    from Server.core.services.llm_backends import GroqBackend
+
+    backend = GroqBackend(api_key="gsk_test", model="openai/gpt-oss-120b", temperature=0.7, max_tokens=100, timeout=7.5)
+    assert backend.llm.max_retries == 0
+    assert backend.llm.request_timeout == 7.5
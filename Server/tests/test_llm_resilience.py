@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from Server.core.services.llm_backends import LLMBackendError
+from Server.core.services.llm_resilience import LLMDeadlineExceeded, ResilientInvoker, RetryPolicy
+
+
+def _scripted(outcomes):
+    """Cada llamada consume el siguiente resultado: (segundos, valor o excepción)"""
+    calls = []
+
+    async def call():
+        delay, outcome = outcomes[min(len(calls), len(outcomes) - 1)]
+        calls.append(delay)
+        await asyncio.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    return call, calls
+
+
+def test_transient_errors_are_retried():
+    invoker = ResilientInvoker(RetryPolicy(max_attempts=3, backoff_base=0.01))
+    call, calls = _scripted([(0, LLMBackendError("boom", 503)), (0, "ok")])
+
+    assert asyncio.run(invoker.run(call)) == "ok"
+    stats = invoker.get_stats()
+    assert len(calls) == 2
+    assert stats["retries"] == 1 and stats["successes"] == 1
+
+
+def test_client_errors_are_not_retried():
+    invoker = ResilientInvoker(RetryPolicy(max_attempts=3, backoff_base=0.01))
+    call, calls = _scripted([(0, LLMBackendError("bad request", 400))])
+
+    with pytest.raises(LLMBackendError):
+        asyncio.run(invoker.run(call))
+    assert len(calls) == 1
+
+
+def test_retry_after_sets_the_minimum_backoff():
+    invoker = ResilientInvoker(RetryPolicy(backoff_base=0.01))
+    assert invoker.backoff(0, LLMBackendError("slow down", 429, retry_after=2.0)) >= 2.0
+
+
+def test_retry_after_beyond_deadline_fails_fast():
+    invoker = ResilientInvoker(RetryPolicy(deadline=1.0))
+    call, calls = _scripted([(0, LLMBackendError("slow down", 429, retry_after=30))])
+
+    with pytest.raises(LLMDeadlineExceeded):
+        asyncio.run(invoker.run(call))
+    assert len(calls) == 1
+    assert invoker.get_stats()["rate_limited"] == 1
+
+
+def test_overall_deadline_bounds_slow_requests():
+    invoker = ResilientInvoker(RetryPolicy(deadline=0.1))
+    call, _ = _scripted([(5, "late")])
+
+    with pytest.raises(LLMDeadlineExceeded):
+        asyncio.run(invoker.run(call))
+    assert invoker.get_stats()["timeouts"] == 1
+
+
+def test_hedge_wins_over_slow_primary():
+    invoker = ResilientInvoker(RetryPolicy(hedge_enabled=True, hedge_delay=0.05, deadline=2))
+    call, calls = _scripted([(1.0, "primary"), (0.01, "hedge")])
+
+    assert asyncio.run(invoker.run(call)) == "hedge"
+    stats = invoker.get_stats()
+    assert len(calls) == 2
+    assert stats["hedges_fired"] == 1 and stats["hedges_won"] == 1
@@ -0,0 +1,86 @@
+import asyncio
+
+from Server.core.services.groq_service import GroqService
+from Server.core.services.llm_backends import LLMBackendError, LocalStandInBackend, StandInProfile
+from Server.core.services.llm_resilience import ResilientInvoker, RetryPolicy
+from Server.core.services.llm_router import ModelRouter
+
+PRIMARY, SMALL = "openai/gpt-oss-120b", "openai/gpt-oss-20b"
+
+
+def _backend(model, key_id, **profile):
+    backend = LocalStandInBackend(model, StandInProfile(latency_p50=0.001, tokens_per_second=100000, **profile))
+    backend.key_id = key_id
+    return backend
+
+
+def _router(*backends, **kwargs):
+    router = ModelRouter(PRIMARY, routes={"general_conversation": SMALL}, **kwargs)
+    router.set_pool(list(backends))
+    return router
+
+
+def test_routes_by_situation_and_prompt_size():
+    router = _router(_backend(PRIMARY, "key0"), _backend(SMALL, "key0"), large_prompt_tokens=1000)
+
+    assert router.pick("general_conversation").model == SMALL
+    assert router.pick("poi_arrival").model == PRIMARY
+    assert router.pick("general_conversation", prompt_tokens=5000).model == PRIMARY
+
+
+def test_fails_over_to_other_key_and_model():
+    router = _router(_backend(PRIMARY, "key0"), _backend(PRIMARY, "key1"), _backend(SMALL, "key0"),
+                     failure_threshold=2)
+    first = router.pick("poi_arrival")
+    router.record_failure(first, LLMBackendError("slow down", 429, retry_after=30))
+    second = router.pick("poi_arrival")
+    assert second.model == PRIMARY and second.key_id != first.key_id
+
+    # La ruta pequeña, tras fallar seguido, cae al modelo principal
+    for _ in range(2):
+        router.record_failure(router.pick("general_conversation"), LLMBackendError("boom", 503))
+    assert router.pick("general_conversation").model == PRIMARY
+    assert router.get_stats()["failovers"] == 1
+
+
+def test_prefers_the_faster_key():
+    router = _router(_backend(PRIMARY, "key0"), _backend(PRIMARY, "key1"))
+    slow, fast = router.entries
+    router.record_success(slow, 2.0)
+    router.record_success(fast, 0.2)
+
+    assert router.pick("poi_arrival") is fast
+
+
+def test_service_records_latency_and_cost_per_model():
+    service = GroqService()
+    service.router = ModelRouter(PRIMARY, routes={"general_conversation": SMALL})
+    service.use_backends([_backend(PRIMARY, "key0"), _backend(SMALL, "key0")])
+    messages = service.create_messages("Eres el Ratoncito Pérez", "¡Hola!")
+
+    asyncio.run(service.generate_response(messages, priority="general_conversation"))
+    asyncio.run(service.generate_response(messages, priority="poi_arrival"))
+
+    models = service.get_stats()["routing"]["models"]
+    assert models[SMALL]["calls"] == 1 and models[PRIMARY]["calls"] == 1
+    assert models[SMALL]["cost_usd"] > 0 and models[SMALL]["latency_p50_ms"] > 0
+
+
+def test_retry_after_a_5xx_goes_to_the_other_key():
+    service = GroqService()
+    service.router = ModelRouter(PRIMARY)
+    service.invoker = ResilientInvoker(RetryPolicy(backoff_base=0.001))
+    key_a, key_b = _backend(PRIMARY, "keyA"), _backend(PRIMARY, "keyB")
+    service.use_backends([key_a, key_b])
+    first, _ = service.router.entries
+    first.ewma_latency = 0.01  # keyA es la más rápida: la primera elección
+
+    async def bad_gateway(messages, max_tokens=None):
+        raise LLMBackendError("bad gateway", 502)
+    key_a.ainvoke = bad_gateway
+
+    response = asyncio.run(service.generate_response(service.create_messages("Eres el Ratoncito Pérez", "¡Hola!")))
+    assert response and not service.is_fallback_response(response)
+    pool = {entry["name"]: entry for entry in service.router.get_stats()["pool"]}
+    assert service.router.entries[1].counters["calls"] == 1 and first.counters["errors"] == 1
+    assert pool[f"{PRIMARY}@keyA"]["healthy"]  # un solo 5xx no pone la clave en pausa
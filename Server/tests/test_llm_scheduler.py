@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from Server.core.services.llm_scheduler import LLMOverloaded, LLMScheduler
+
+
+async def _hold(scheduler, priority, order, seconds=0.02, tokens=0):
+    async with scheduler.slot(priority, tokens):
+        order.append(priority)
+        await asyncio.sleep(seconds)
+
+
+def test_max_in_flight_and_priority_order():
+    async def scenario():
+        scheduler = LLMScheduler(max_in_flight=1, max_queue_wait=5)
+        order = []
+        first = asyncio.create_task(_hold(scheduler, "general_conversation", order, seconds=0.05))
+        await asyncio.sleep(0.01)
+        # Llegan mientras la primera ocupa el único hueco: la llegada debe adelantar a la charla
+        queued = [asyncio.create_task(_hold(scheduler, p, order))
+                  for p in ("prefetch", "general_conversation", "poi_arrival")]
+        await asyncio.gather(first, *queued)
+        return order, scheduler.get_stats()
+
+    order, stats = asyncio.run(scenario())
+    assert order == ["general_conversation", "poi_arrival", "general_conversation", "prefetch"]
+    assert stats["granted"] == 4 and stats["in_flight"] == 0
+    assert stats["max_queue_depth"] == 3
+
+
+def test_requests_that_would_wait_too_long_are_shed():
+    async def scenario():
+        scheduler = LLMScheduler(max_in_flight=1, max_queue_wait=0.05)
+        busy = asyncio.create_task(_hold(scheduler, "general_conversation", [], seconds=0.3))
+        await asyncio.sleep(0.01)
+        with pytest.raises(LLMOverloaded):
+            await _hold(scheduler, "general_conversation", [])
+        await busy
+        return scheduler.get_stats()
+
+    stats = asyncio.run(scenario())
+    # Se descarta al encolar: la espera estimada ya supera el máximo
+    assert stats["shed"] == 1 and stats["expired"] == 0
+
+
+def test_token_budget_follows_provider_headers():
+    async def scenario():
+        scheduler = LLMScheduler(max_in_flight=4, tokens_per_minute=6000, max_queue_wait=5)
+        scheduler.update_rate_limit({"remaining_tokens": 0})
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        # Sin tokens restantes hay que esperar a que el cubo recupere 100 (100 / 6000 por minuto = 1s)
+        await _hold(scheduler, "poi_arrival", [], seconds=0, tokens=100)
+        return loop.time() - start, scheduler.get_stats()
+
+    waited, stats = asyncio.run(scenario())
+    assert 0.8 <= waited < 2
+    assert stats["provider_rate_limit"]["remaining_tokens"] == 0
@@ -0,0 +1,59 @@
+import asyncio
+import json
+
+import pytest
+
+from Server.core.agents.location_helper import RATON_PEREZ_ROUTE
+from Server.scripts.load_test import LoadTest, LoadTestConfig, percentile
+from Server.core.services.embedding_service import embedding_service
+from Server.core.services.groq_service import groq_service
+from Server.core.services.poi_content_store import poi_content_store
+from Server.scripts.load_test_stubs import InMemoryDatabase, install_stubs
+
+
+def test_percentile_nearest_rank():
+    values = sorted(float(v) for v in range(1, 101))
+    assert percentile(values, 50) == 51.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([], 95) == 0.0
+
+
+def test_in_memory_database_rejects_unknown_queries():
+    db = InMemoryDatabase()
+    with pytest.raises(ValueError, match="no soportada"):
+        db.execute_query("DELETE FROM families WHERE id = %s", (1,))
+
+
+def test_families_walk_the_whole_route_in_process(monkeypatch):
+    config = LoadTestConfig(families=2, concurrency=2, messages_per_poi=1, think_time=0, ramp_up=0,
+                            llm_latency_p50=0.001, db_latency=0, seed=3)
+    report = asyncio.run(LoadTest(config, patcher=monkeypatch).run())
+
+    assert report["families_completed"] == 2
+    chat = report["endpoints"]["POST /api/chat/message"]
+    advance = report["endpoints"]["POST /api/routes/family/{id}/advance"]
+    assert chat["count"] == 2 * len(RATON_PEREZ_ROUTE)
+    assert chat["errors"] == 0 and advance["errors"] == 0
+    assert {"p50_ms", "p95_ms", "p99_ms", "throughput_rps"} <= set(chat)
+    assert "groq" in report["server_stages"]
+    # Las respuestas salen del LLM sustituto, no del mensaje de cortesía de "no disponible"
+    assert report["chat"]["responses"] == chat["count"] + report["endpoints"]["POST /api/chat/message (arrival)"]["count"]
+    assert report["chat"]["fallbacks"] == 0
+    assert report["chat"]["situations"].get("poi_arrival")
+    assert report["llm"]["backend"] == "local" and report["llm"]["successes"] > 0
+    json.dumps(report, default=str)
+
+
+def test_install_stubs_can_be_undone():
+    encode = embedding_service.generate_embeddings
+    backends = [entry.backend for entry in groq_service.router.entries]
+    content = dict(poi_content_store._content)
+
+    with install_stubs(embedding_latency=0, pinecone_latency=0):
+        assert embedding_service.is_available()
+        assert groq_service.router.entries[0].backend.name == "local"
+        assert len(poi_content_store._content) >= len(RATON_PEREZ_ROUTE)
+
+    assert embedding_service.generate_embeddings == encode
+    assert [entry.backend for entry in groq_service.router.entries] == backends
+    assert poi_content_store._content == content
@@ -0,0 +1,59 @@
+import threading
+import time
+
+from Server.core.services.poi_content_store import PoiContentStore
+
+
+def test_miss_is_loaded_once_for_concurrent_callers(tmp_path):
+    store = PoiContentStore(snapshot_path=str(tmp_path / "snapshot.json"))
+    calls = []
+
+    def fake_fetch(vector_ids):
+        calls.append(list(vector_ids))
+        time.sleep(0.1)
+        return {vector_id: "Plaza histórica frente al Palacio Real" for vector_id in vector_ids}
+
+    store._fetch_from_pinecone = fake_fetch
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(store.get("plaza_oriente")))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert calls == [["plaza_oriente_basic_info"]]
+    assert results == ["Plaza histórica frente al Palacio Real"] * 8
+    assert store.get("plaza_oriente") == "Plaza histórica frente al Palacio Real"
+    assert store.get_stats()["hits"] == 1
+
+
+def test_preload_writes_snapshot_for_next_start(tmp_path):
+    snapshot = tmp_path / "snapshot.json"
+    store = PoiContentStore(snapshot_path=str(snapshot))
+    store._fetch_from_pinecone = lambda ids: {vid: f"texto {vid}" for vid in ids}
+
+    assert store.preload(["plaza_oriente", "plaza_ramales"]) == 2
+
+    restarted = PoiContentStore(snapshot_path=str(snapshot))
+    restarted._fetch_from_pinecone = lambda ids: {}
+    assert restarted.load_snapshot() == 2
+    assert restarted.get("plaza_ramales") == "texto plaza_ramales_basic_info"
+
+
+def test_absent_poi_is_not_refetched_until_negative_ttl_expires(tmp_path):
+    store = PoiContentStore(snapshot_path=str(tmp_path / "snapshot.json"), negative_ttl=60)
+    calls = []
+    store._fetch_from_pinecone = lambda ids: calls.append(list(ids)) or {}
+
+    assert store.get("plaza_oriente", "history") is None
+    assert store.get("plaza_oriente", "history") is None
+    assert calls == [["plaza_oriente_history"]] and store.get_stats()["negative_hits"] == 1
+
+    store._absent["plaza_oriente_history"] = time.monotonic() - 1  # caducado: se vuelve a pedir
+    assert store.get("plaza_oriente", "history") is None and len(calls) == 2
+
+    store.put("plaza_oriente", "history", "Antes hubo aquí un barrio entero")
+    assert store.get("plaza_oriente", "history") == "Antes hubo aquí un barrio entero"
@@ -0,0 +1,85 @@
+import asyncio
+
+from Server.core.agents import family_context
+from Server.core.agents.family_context import load_family_context
+from Server.core.agents.location_helper import RATON_PEREZ_ROUTE, arrival_announcement, is_arrival_announcement
+from Server.core.agents.raton_perez import RatonPerez
+from Server.core.services.llm_backends import StandInProfile
+from Server.core.services.prefetch_cache import PrefetchCache, prefetch_cache
+from Server.scripts.load_test_stubs import InMemoryDatabase
+
+
+def test_prefetch_cache_tracks_hits_and_waste():
+    cache = PrefetchCache(ttl=60)
+    cache.put(1, "arrival_draft", "borrador", valid_for="plaza_oriente")
+    assert cache.get(1, "arrival_draft", valid_for="calle_vergara") is None  # otro POI: se descarta
+    cache.put(1, "arrival_draft", "borrador", valid_for="plaza_oriente")
+    assert cache.pop(1, "arrival_draft", valid_for="plaza_oriente") == "borrador"
+    assert cache.pop(1, "arrival_draft", valid_for="plaza_oriente") is None
+
+    stats = cache.get_stats()["kinds"]["arrival_draft"]
+    assert stats["stored"] == 2 and stats["used"] == 1 and stats["wasted"] == 1
+    assert stats["waste_rate"] == 0.5
+
+
+def test_arrival_announcement_detection():
+    poi = RATON_PEREZ_ROUTE[1]
+    assert is_arrival_announcement(arrival_announcement(poi), poi)
+    assert is_arrival_announcement("¡Ya hemos llegado!", poi)
+    assert not is_arrival_announcement("¿Qué es este lugar?", poi)
+    assert not is_arrival_announcement("Hemos llegado, ¿quién construyó este palacio?", poi)
+
+
+def _db_with_family(poi_index: int) -> InMemoryDatabase:
+    db = InMemoryDatabase()
+    db.execute_query("INSERT INTO families (user_id, name, preferred_language) VALUES (%s, %s, %s)",
+                     (1, "García", "es"))
+    db.execute_query("INSERT INTO family_members (family_id, name, age, member_type) VALUES (%s, %s, %s, %s)",
+                     (1, "Lucía", 6, "child"))
+    db.execute_query("INSERT INTO family_route_progress (family_id, current_poi_index, points_earned) "
+                     "VALUES (%s, 0, 0)", (1,))
+    db.progress[1]["current_poi_index"] = poi_index
+    return db
+
+
+def test_arrival_chat_is_served_from_prefetch(load_stubs):
+    load_stubs(embedding_latency=0, pinecone_latency=0,
+                  llm_profile=StandInProfile(latency_p50=0.001, tokens_per_second=100000, seed=1))
+    prefetch_cache.clear()
+    family_context._context_cache.clear()
+    db = _db_with_family(poi_index=2)
+    agent = RatonPerez(db)
+
+    async def scenario():
+        context = await load_family_context(1, db)
+        agent.schedule_prefetch(context)
+        # El mensaje de llegada llega antes de que termine el prefetch: se espera, no se regenera
+        return await agent.chat(1, arrival_announcement(RATON_PEREZ_ROUTE[2]))
+
+    result = asyncio.run(scenario())
+    assert result["situation"] == "poi_arrival"
+    assert result["sources"] == ["prefetch"]
+    assert db.progress[1]["current_poi_index"] == 2  # la llegada por chat no adelanta la ruta
+    assert prefetch_cache.get_stats()["kinds"]["arrival_draft"]["used"] == 1
+
+
+def test_stuck_prefetch_falls_through_to_live_generation(load_stubs):
+    load_stubs(embedding_latency=0, pinecone_latency=0,
+                  llm_profile=StandInProfile(latency_p50=0.001, tokens_per_second=100000, seed=1))
+    prefetch_cache.clear()
+    family_context._context_cache.clear()
+    db = _db_with_family(poi_index=2)
+    agent = RatonPerez(db)
+    agent.settings = agent.settings.model_copy(update={"prefetch_wait_timeout": 0.05})
+
+    async def scenario():
+        stuck = asyncio.get_running_loop().create_future()  # prefetch que nunca termina
+        agent._prefetch_tasks[1] = stuck
+        try:
+            return await asyncio.wait_for(agent.chat(1, arrival_announcement(RATON_PEREZ_ROUTE[2])), timeout=5)
+        finally:
+            stuck.cancel()
+
+    result = asyncio.run(scenario())
+    assert result["situation"] == "poi_arrival"
+    assert result["sources"] != ["prefetch"] and result["response"]
@@ -0,0 +1,77 @@
+from Server.core.agents.family_context import FamilyContext
+from Server.core.agents.prompt_builder import PromptBuilder, PERSONA_PROMPT
+
+
+def _context(family_id, name):
+    return FamilyContext({
+        "id": family_id,
+        "name": name,
+        "members": [{"name": "Luis", "age": 8, "member_type": "child"}],
+        "route_progress": {"current_poi_index": 0, "points_earned": 0},
+    })
+
+
+def test_persona_is_shared_prefix_and_family_block_cached_by_version():
+    builder = PromptBuilder()
+    garcia, lopez = _context(1, "García"), _context(2, "López")
+
+    first = builder.build(garcia, "LLEGADA A: Plaza de Oriente")
+    other = builder.build(lopez, "LLEGADA A: Plaza de Oriente")
+    assert first.system_prompt.startswith(PERSONA_PROMPT)
+    assert other.system_prompt.startswith(PERSONA_PROMPT)
+
+    builder.build(garcia, "CONVERSACIÓN GENERAL")
+    assert builder.get_stats()["family_piece_hits"] == 1
+
+    garcia.total_points += 75
+    updated = builder.build(garcia, "CONVERSACIÓN GENERAL")
+    assert "Puntos mágicos acumulados: 75" in updated.system_prompt
+    assert builder.get_stats()["cached_families"] == 2
+    assert set(updated.sections) == {"persona", "family", "situation", "history", "user"}
+
+
+def test_history_messages_are_reused_between_turns():
+    builder = PromptBuilder()
+    context = _context(1, "García")
+    context.add_conversation("Hola", "¡Hola exploradores!")
+    first = builder.build(context, "CONVERSACIÓN GENERAL").history_messages
+
+    context.add_conversation("¿Qué es esto?", "Una plaza real.")
+    second = builder.build(context, "CONVERSACIÓN GENERAL").history_messages
+
+    assert len(second) == 4
+    assert second[0] is first[0] and second[1] is first[1]
+    assert second[2].content == "¿Qué es esto?"
+
+
+def test_budget_trims_oldest_history_then_situation():
+    builder = PromptBuilder()
+    context = _context(1, "García")
+    for i in range(5):
+        context.add_conversation(f"Pregunta {i} " + "bla " * 40, f"Respuesta {i} " + "bla " * 40)
+
+    unbounded = builder.build(context, "INFORMACIÓN RELEVANTE: " + "dato " * 200, "¿Y esto?")
+    assert unbounded.trimmed == []
+
+    budget = unbounded.tokens - unbounded.sections["history"] + 2 * (unbounded.sections["history"] // 5)
+    fitted = builder.build(context, "INFORMACIÓN RELEVANTE: " + "dato " * 200, "¿Y esto?", budget=budget)
+    assert fitted.tokens <= budget
+    assert fitted.trimmed == ["history:3"]
+    assert fitted.history_messages[-1].content.startswith("Respuesta 4")
+
+    tight = builder.build(context, "INFORMACIÓN RELEVANTE: " + "dato " * 200, "¿Y esto?",
+                          budget=unbounded.sections["persona"] + unbounded.sections["family"] + 60)
+    assert tight.trimmed[0] == "situation"
+    assert tight.history_messages == []
+
+
+def test_long_user_message_is_capped():
+    builder = PromptBuilder()
+    context = _context(2, "López")
+    message = "¿Y esto? " + "bla " * 500
+
+    assembled = builder.build(context, "CONVERSACIÓN GENERAL", message, max_user_tokens=50)
+    assert assembled.sections["user"] <= 51  # el "…" final puede ser un token más
+    assert assembled.trimmed == ["user"]
+    assert assembled.user_message.startswith("¿Y esto?") and len(assembled.user_message) < len(message)
+    assert builder.build(context, "CONVERSACIÓN GENERAL", "¿Y esto?", max_user_tokens=50).user_message == "¿Y esto?"
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from Server.api.endpoints.debug import set_reduced_index
+from Server.core.agents import madrid_knowledge
+from Server.core.services import reduced_index as reduced_index_module
+from Server.core.services.reduced_index import PCAProjection, ReducedIndex
+
+
+def _corpus(n: int = 12, dimension: int = 64, seed: int = 3):
+    rng = np.random.default_rng(seed)
+    # Estructura de baja dimensión + ruido, como un corpus pequeño y temático
+    basis = rng.standard_normal((6, dimension))
+    vectors = rng.standard_normal((n, 6)) @ basis + 0.05 * rng.standard_normal((n, dimension))
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_pca_components_are_capped_by_corpus_rank_and_ordered():
+    projection = PCAProjection.fit(_corpus(n=12))
+    assert projection.max_dimension <= 11
+    assert np.all(np.diff(projection.explained_variance_ratio) <= 1e-6)
+
+
+def test_search_finds_the_passage_and_dimension_switches_at_runtime():
+    vectors = _corpus()
+    index = ReducedIndex(dimension=4)
+    index.load([f"poi_{i}" for i in range(len(vectors))], vectors, [{"poi_id": f"poi_{i}"} for i in range(len(vectors))])
+    query = vectors[5] + 0.01
+
+    assert index.dimension == 4
+    assert index.search(query, top_k=1)[0]["id"] == "poi_5"
+    assert not index.get_stats()["capped"]
+    index.set_dimension(512)  # acotada al rango del corpus, y se avisa
+    assert index.dimension == index.max_dimension
+    assert index.get_stats()["capped"]
+    assert index.search(query, top_k=3)[0]["metadata"] == {"poi_id": "poi_5"}
+    index.set_dimension(0)
+    assert not index.ready
+
+
+def test_truncate_method_uses_leading_coordinates():
+    vectors = _corpus()
+    index = ReducedIndex(dimension=16, method="truncate")
+    index.load([str(i) for i in range(len(vectors))], vectors)
+    assert index.max_dimension == 64
+    assert index.search(vectors[2], top_k=1, dimension=64)[0]["id"] == "2"
+
+
+def test_debug_endpoint_rejects_dimensions_beyond_the_rebuilt_corpus(monkeypatch):
+    vectors = _corpus(n=12)
+    index = ReducedIndex(dimension=4, method="truncate")
+    index.load([f"poi_{i}" for i in range(len(vectors))], vectors)
+    monkeypatch.setattr(reduced_index_module, "reduced_index", index)
+    monkeypatch.setattr(madrid_knowledge, "build_reduced_index",
+                        lambda: index.load([f"poi_{i}" for i in range(len(vectors))], vectors))
+
+    # Con truncate caben 64 dimensiones, pero PCA sobre 12 pasajes no pasa de 11: 400 antes de reconstruir
+    with pytest.raises(HTTPException) as rejected:
+        set_reduced_index(dimension=32, method="pca", admin=None)
+    assert rejected.value.status_code == 400
+    assert index.method == "truncate" and index.dimension == 4
+
+    with pytest.raises(HTTPException) as unknown:
+        set_reduced_index(dimension=8, method="umap", admin=None)
+    assert unknown.value.status_code == 400
+
+    stats = set_reduced_index(dimension=8, method="pca", admin=None)
+    assert stats["method"] == "pca" and stats["dimension"] == 8
+
+    # Sin índice construido la cota solo se conoce tras reconstruir: se rechaza y se deshace
+    index.set_dimension(0, "truncate")  # el cambio de método vacía el índice
+    with pytest.raises(HTTPException) as capped:
+        set_reduced_index(dimension=100, admin=None)
+    assert capped.value.status_code == 400 and index.requested_dimension == 0
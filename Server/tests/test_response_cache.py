@@ -0,0 +1,52 @@
+import math
+
+from Server.core.services.response_cache import SemanticResponseCache
+
+
+def _unit(*values):
+    norm = math.sqrt(sum(v * v for v in values))
+    return [v / norm for v in values]
+
+
+def test_similar_query_hits_and_is_personalized():
+    cache = SemanticResponseCache(threshold=0.9)
+    template = cache.to_template("¡Hola Luis! Esta plaza mira al Palacio Real.", ["Luis", "Familia Test"])
+    cache.store("plaza_oriente", "location_question", "medianos", _unit(1, 0, 0), template)
+
+    hit = cache.lookup("plaza_oriente", "location_question", "medianos", _unit(1, 0.1, 0))
+    assert cache.render(hit, "Ana y Pedro") == "¡Hola Ana y Pedro! Esta plaza mira al Palacio Real."
+
+    assert cache.lookup("plaza_oriente", "location_question", "medianos", _unit(0, 1, 0)) is None
+    assert cache.lookup("plaza_oriente", "location_question", "pequeños", _unit(1, 0, 0)) is None
+    assert cache.get_stats()["hits"] == 1
+    assert cache.get_stats()["misses"] == 2
+
+
+def test_lru_eviction_and_ttl():
+    cache = SemanticResponseCache(threshold=0.9, max_entries=2)
+    cache.store("a", "poi_question", "grandes", _unit(1, 0), "A")
+    cache.store("b", "poi_question", "grandes", _unit(1, 0), "B")
+    assert cache.lookup("a", "poi_question", "grandes", _unit(1, 0)) == "A"
+    cache.store("c", "poi_question", "grandes", _unit(1, 0), "C")
+
+    assert cache.lookup("b", "poi_question", "grandes", _unit(1, 0)) is None
+    assert cache.lookup("a", "poi_question", "grandes", _unit(1, 0)) == "A"
+    assert cache.get_stats()["evictions"] == 1
+
+    cache.ttl = -1
+    assert cache.lookup("a", "poi_question", "grandes", _unit(1, 0)) is None
+    assert cache.get_stats()["expirations"] == 1
+
+
+def test_greeting_is_one_placeholder_and_only_whole_names_are_replaced():
+    cache = SemanticResponseCache()
+    template = cache.to_template(
+        "¡Hola Luis y Marta! Mariana vivía junto a la Plaza de Santa Ana. ¿Verdad, Luis?",
+        ["Luis", "Marta", "García"])
+    assert template == "¡Hola {familia}! Mariana vivía junto a la Plaza de Santa Ana. ¿Verdad, {familia}?"
+    assert cache.render(template, "Ana y Pedro") == (
+        "¡Hola Ana y Pedro! Mariana vivía junto a la Plaza de Santa Ana. ¿Verdad, Ana y Pedro?")
+
+    # Sin nombres el saludo ya lleva "familia"
+    template = cache.to_template("¡Bienvenida, familia García!", ["García"])
+    assert cache.render(template, "familia López") == "¡Bienvenida, familia López!"
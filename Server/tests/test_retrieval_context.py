@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from Server.core.agents import retrieval_context
+from Server.core.agents.retrieval_context import IntentClassifier, RetrievalContext
+
+
+@pytest.mark.asyncio
+async def test_query_embedding_is_computed_once_per_turn(monkeypatch):
+    calls = []
+
+    async def fake_embed(query):
+        calls.append(query)
+        return [1.0, 0.0]
+
+    monkeypatch.setattr(retrieval_context.embedding_service, "agenerate_query_embedding", fake_embed)
+    retrieval = RetrievalContext("¿Qué es esta plaza?")
+
+    results = await asyncio.gather(*(retrieval.get_embedding() for _ in range(3)))
+    await retrieval.get_embedding()
+
+    assert calls == ["¿Qué es esta plaza?"]
+    assert results == [[1.0, 0.0]] * 3
+    assert await RetrievalContext("hola", enabled=False).get_embedding() is None
+
+
+def test_intent_classifier_uses_nearest_prototype(monkeypatch):
+    def fake_embeddings(texts, text_type):
+        if texts == retrieval_context.LOCATION_PROTOTYPES:
+            return [[1.0, 0.0]] * len(texts)
+        return [[0.0, 1.0]] * len(texts)
+
+    monkeypatch.setattr(retrieval_context.embedding_service, "generate_embeddings", fake_embeddings)
+    classifier = IntentClassifier(min_similarity=0.5)
+
+    assert classifier.is_location_question([0.95, 0.31]) is True
+    assert classifier.is_location_question([0.31, 0.95]) is False
+
+
+def test_intent_classifier_defers_to_keywords_without_model(monkeypatch):
+    monkeypatch.setattr(retrieval_context.embedding_service, "generate_embeddings", lambda texts, text_type: [])
+    assert IntentClassifier().is_location_question([1.0, 0.0]) is None
+
+
+def test_intent_classifier_remembers_failure_until_model_state_changes(monkeypatch):
+    calls = []
+
+    def no_model(texts, text_type):
+        calls.append(text_type)
+        return []
+
+    monkeypatch.setattr(retrieval_context.embedding_service, "generate_embeddings", no_model)
+    monkeypatch.setattr(retrieval_context.embedding_service, "is_available", lambda: False)
+    classifier = IntentClassifier()
+    assert classifier.is_location_question([1.0, 0.0]) is None
+    assert classifier.is_location_question([1.0, 0.0]) is None
+    assert len(calls) == 1
+
+    # El modelo pasa a estar listo: se vuelve a intentar
+    monkeypatch.setattr(retrieval_context.embedding_service, "is_available", lambda: True)
+    monkeypatch.setattr(retrieval_context.embedding_service, "generate_embeddings",
+                        lambda texts, text_type: [[1.0, 0.0]] * len(texts))
+    assert classifier.is_location_question([1.0, 0.0]) is not None
+
+
+@pytest.mark.asyncio
+async def test_keywords_decide_until_the_classifier_is_enabled(monkeypatch):
+    from Server.core.agents import raton_perez
+    from Server.core.agents.family_context import FamilyContext
+
+    class AlwaysLocation:
+        def is_location_question(self, query_embedding):
+            return True
+
+    async def fake_embed(query):
+        return [1.0, 0.0]
+
+    monkeypatch.setattr(retrieval_context.embedding_service, "agenerate_query_embedding", fake_embed)
+    monkeypatch.setattr(raton_perez, "intent_classifier", AlwaysLocation())
+    agent = raton_perez.RatonPerez(db=None)
+    context = FamilyContext({"id": 1, "name": "Gil", "members": [],
+                             "route_progress": {"current_poi_index": 0, "points_earned": 0}})
+
+    situation = await agent._analyze_situation("Tengo sed", None, context, RetrievalContext("Tengo sed"))
+    assert situation["type"] == "general_conversation"
+
+    agent.settings = agent.settings.model_copy(update={"intent_classifier_enabled": True})
+    situation = await agent._analyze_situation("Tengo sed", None, context, RetrievalContext("Tengo sed"))
+    assert situation["type"] == "location_question"
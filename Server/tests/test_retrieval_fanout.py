@@ -0,0 +1,42 @@
+import time
+import pytest
+
+from Server.core.agents.raton_perez import RatonPerez
+
+
+def _slow(value, delay):
+    def step():
+        time.sleep(delay)
+        return value
+    return step
+
+
+def _failing():
+    raise RuntimeError("pinecone caído")
+
+
+@pytest.mark.asyncio
+async def test_retrieval_runs_concurrently():
+    agent = RatonPerez(db=None)
+    start = time.perf_counter()
+    results = await agent._run_retrieval({
+        "madrid_search": _slow("búsqueda", 0.2),
+        "poi_info": _slow("info", 0.2),
+    })
+    elapsed = time.perf_counter() - start
+
+    assert results == {"madrid_search": "búsqueda", "poi_info": "info"}
+    assert elapsed < 0.35
+
+
+@pytest.mark.asyncio
+async def test_retrieval_drops_late_and_failed_steps():
+    agent = RatonPerez(db=None)
+    agent.settings = agent.settings.model_copy(update={"retrieval_deadline": 0.1})
+    results = await agent._run_retrieval({
+        "madrid_search": _slow("búsqueda", 0.5),
+        "poi_info": _slow("info", 0.01),
+        "broken": _failing,
+    })
+
+    assert list(results) == ["poi_info"]
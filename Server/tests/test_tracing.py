@@ -0,0 +1,40 @@
+import asyncio
+import time
+
+import pytest
+
+from Server.core.services.tracing import StageHistograms, stage, start_trace, stage_histograms
+
+
+@pytest.mark.asyncio
+async def test_stages_recorded_across_threads_and_merged_in_header():
+    trace = start_trace()
+    with stage("context_load"):
+        time.sleep(0.01)
+
+    def encode():
+        with stage("embed_encode"):
+            time.sleep(0.01)
+
+    await asyncio.gather(asyncio.to_thread(encode), asyncio.to_thread(encode))
+
+    totals = trace.totals()
+    assert list(totals) == ["context_load", "embed_encode"]
+    assert totals["embed_encode"] >= 20
+    header = trace.server_timing_header()
+    assert header.startswith("context_load;dur=")
+    assert "embed_encode;dur=" in header and header.split(", ")[-1].startswith("total;dur=")
+    assert stage_histograms.get_stats()["embed_encode"]["count"] >= 2
+
+
+def test_histogram_percentiles_and_buckets():
+    histograms = StageHistograms()
+    for duration in range(1, 101):
+        histograms.observe("groq", float(duration))
+
+    stats = histograms.get_stats()["groq"]
+    assert stats["count"] == 100
+    assert stats["p50_ms"] == 51.0
+    assert stats["p95_ms"] == 95.0
+    assert stats["buckets"]["le_5ms"] == 5
+    assert stats["buckets"]["le_inf"] == 0
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from Server.core.security.dependencies import AuthenticatedUser, langchain_settings, require_admin
+from Server.core.services.groq_service import GroqService
+from Server.core.services.llm_backends import LocalStandInBackend, StandInProfile
+from Server.core.services.usage_tracker import UsageTracker, usage_tracker
+from Server.scripts.load_test_stubs import InMemoryDatabase
+
+
+def _record(tracker, family_id, situation, model="m", prompt=100, completion=20, cost=0.001):
+    tracker.record(model, {"prompt_tokens": prompt, "completion_tokens": completion,
+                           "prompt_tokens_details": {"cached_tokens": 40}},
+                   0.5, cost, situation=situation, family_id=family_id, poi_id="plaza_mayor")
+
+
+def test_breakdown_by_dimension_sorted_by_cost():
+    tracker = UsageTracker()
+    _record(tracker, 1, "poi_arrival", cost=0.002)
+    _record(tracker, 1, "general_conversation")
+    _record(tracker, 2, "general_conversation")
+
+    by_family = tracker.breakdown("family")
+    assert [row["family"] for row in by_family] == [1, 2]
+    assert by_family[0]["calls"] == 2 and by_family[0]["cached_tokens"] == 80
+    assert by_family[0]["avg_latency_ms"] == 500.0
+    assert {row["situation"]: row["calls"] for row in tracker.breakdown("situation")} == {
+        "general_conversation": 2, "poi_arrival": 1}
+
+
+def test_flush_writes_batches_and_keeps_rows_on_error():
+    tracker = UsageTracker(batch_size=2)
+    for family_id in range(5):
+        _record(tracker, family_id, "poi_question")
+
+    class FailingDatabase:
+        def execute_query(self, query, params=None):
+            raise RuntimeError("sin conexión")
+
+    assert tracker.flush(FailingDatabase()) == 0
+    assert tracker.get_stats()["pending"] == 5
+
+    db = InMemoryDatabase()
+    assert tracker.flush(db) == 5
+    assert len(db.llm_usage) == 3  # un INSERT multi-fila por lote
+    assert tracker.get_stats()["flushed"] == 5 and tracker.get_stats()["pending"] == 0
+
+
+def test_generate_response_records_usage_with_tags():
+    service = GroqService()
+    service.use_backend(LocalStandInBackend("standin", StandInProfile(latency_p50=0.001, tokens_per_second=100000)))
+    usage_tracker.clear()
+
+    messages = service.create_messages("Eres el Ratoncito Pérez", "¡Hola!")
+    asyncio.run(service.generate_response(messages, priority="poi_question",
+                                          tags={"family_id": 7, "poi_id": "plaza_mayor"}))
+
+    [row] = usage_tracker.breakdown("family")
+    assert row["family"] == 7 and row["calls"] == 1 and row["completion_tokens"] > 0
+    assert usage_tracker.breakdown("poi")[0]["poi"] == "plaza_mayor"
+
+
+def test_background_flush_uses_its_own_connection_and_flushes_on_stop():
+    tracker = UsageTracker(flush_interval=3600)
+    connections = []
+
+    queries = []
+
+    class RecordingDatabase(InMemoryDatabase):
+        def execute_query(self, query, params=None):
+            queries.append(" ".join(query.split()[:3]))
+            return super().execute_query(query, params)
+
+    def connect():
+        db = RecordingDatabase()
+        connections.append(db)
+        return db
+
+    tracker.start_background_flush(connect)
+    _record(tracker, 1, "poi_question")
+    tracker.stop_background_flush()
+
+    assert len(connections) == 1 and len(connections[0].llm_usage) == 1
+    assert queries == ["CREATE TABLE IF", "INSERT INTO llm_usage"]  # la tabla se crea antes del primer volcado
+    assert tracker.get_stats()["pending"] == 0
+
+
+def test_usage_stats_require_an_admin(monkeypatch):
+    monkeypatch.setattr(langchain_settings, "admin_emails", "Ops@raton.es, otra@raton.es")
+    admin = AuthenticatedUser(1, "ops@raton.es")
+    assert asyncio.run(require_admin(admin)) is admin
+    with pytest.raises(HTTPException) as denied:
+        asyncio.run(require_admin(AuthenticatedUser(2, "familia@correo.es")))
+    assert denied.value.status_code == 403